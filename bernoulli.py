@@ -1,5 +1,9 @@
+import array
+import bisect
+import collections
 import math
 import random
+import samplerstats
 from fractions import Fraction
 
 class Bernoulli:
@@ -130,22 +134,37 @@ class Bernoulli:
             return 0
         if maxInclusive == 1:
             return self.randbit()
-        # Lumbroso's fast dice roller method
+        # Lumbroso's fast dice roller method, but reading at once
+        # all the bits the method would read one at a time
+        # before its next comparison
+        m = maxInclusive + 1
+        mbits = m.bit_length()
         x = 1
         y = 0
         while True:
-            x = x * 2
-            y = y * 2 + self.randbit()
-            if x > maxInclusive:
-                if y <= maxInclusive:
-                    return y
-                x = x - maxInclusive - 1
-                y = y - maxInclusive - 1
+            k = mbits - x.bit_length()
+            if (x << k) < m:
+                k += 1
+            x <<= k
+            y = (y << k) | self._randbits(k)
+            if y < m:
+                return y
+            x -= m
+            y -= m
 
     def _randbits(self, count):
         ret = 0
-        for i in range(count):
-            ret = (ret << 1) + self.randbit()
+        shift = 0
+        self.totalbits += count
+        while count > 0:
+            if self.rbit < 0 or self.rbit >= 32:
+                self.rbit = 0
+                self.rvalue = self.r.randint(0, (1 << 32) - 1)
+            take = min(count, 32 - self.rbit)
+            ret |= ((self.rvalue >> self.rbit) & ((1 << take) - 1)) << shift
+            self.rbit += take
+            shift += take
+            count -= take
         return ret
 
     def fill_geometric_bag(self, bag, precision=53):
@@ -490,19 +509,7 @@ class Bernoulli:
         """Returns a random integer in [0, maxexc)."""
         if maxexc <= 0:
             raise ValueError
-        if maxexc == 1:
-            return 0
-        maxinc = maxexc - 1
-        x = 1
-        y = 0
-        while True:
-            x *= 2
-            y = y * 2 + self.randbit()
-            if x > maxinc:
-                if y <= maxinc:
-                    return y
-                x = x - maxinc - 1
-                y = y - maxinc - 1
+        return self.rndint(maxexc - 1)
 
     def probgenfunc(self, f, rng):
         """Probability generating function Bernoulli factory: B(p) => B(E[p^x]), where x is rng()
@@ -1136,19 +1143,9 @@ class Bernoulli:
         c = beta * c / (beta - 1)
         return self.linear(f, c, eps=Fraction(1) - m)
 
-    def _fb2(self, fbelow, a, b, v=1):
-        if b > a:
-            raise ValueError
-        return Fraction(int(Fraction(fbelow(a, b)) * v), v)
-
-    def _fa2(self, fabove, a, b, v=1):
-        if b > a:
-            raise ValueError
-        mv = Fraction(fabove(a, b)) * v
-        imv = int(mv)
-        return Fraction(imv, v) if mv == imv else Fraction(imv + 1, v)
-
-    def simulate(self, coin, fbelow, fabove, fbound, nextdegree=None):
+    def simulate(
+        self, coin, fbelow, fabove, fbound, nextdegree=None, cache=True, scaled=False
+    ):
         """Simulates a general factory function defined by two
         sequences of polynomials that converge from above and below.
         - coin(): Function that returns 1 or 0 with a fixed probability.
@@ -1162,12 +1159,22 @@ class Bernoulli:
            must return an integer greater than n.
            Optional.  If not given, the first degree is 1 and the next degree is n*2
            (so that for each power of 2 as well as 1, a polynomial of that degree
-           must be specified)."""
+           must be specified).
+        - cache: If True (the default), the coefficients found by fbelow and fabove,
+          and the bounds calculated from them, are kept between calls to this
+          method with the same fbelow and fabove, so that simulating the same
+          factory function many times is much faster.  fbelow and fabove must
+          then always return the same value for the same arguments.  If False,
+          nothing is cached.
+        - scaled: If True, the bounds found at each degree are kept as integers
+          over a common denominator, rather than as Fractions, which avoids
+          reducing Fractions and is much faster when the degree grows large
+          (such as when the probability of heads is close to a point where
+          the polynomials converge slowly).  The result is exact either way.
+          Default is False."""
         ones = 0
         lastdegree = 0
-        l = Fraction(0)
         lt = Fraction(0)
-        u = Fraction(1)
         ut = Fraction(1)
         degree = nextdegree(0) if nextdegree != None else 1
         while True:
@@ -1175,77 +1182,217 @@ class Bernoulli:
             if fb[0] >= 0 and fb[1] <= 1:
                 break
             degree = nextdegree(degree) if nextdegree != None else degree * 2
-        startdegree = degree
-        fba = {}
-        faa = {}
+        fc = _simulatecache(fbelow, fabove, _fractionlow, _fractionhigh, cache)
         ret = []
+        if scaled:
+            return self._simulate_scaled(coin, fc, ret, degree, nextdegree)
         while True:
+            if samplerstats.active != None:
+                samplerstats.active.add("Bernoulli.simulate", "iterations")
             for i in range(degree - lastdegree):
                 if coin() == 1:
                     ones += 1
-            c = math.comb(degree, ones)
-            md = degree
-            l = self._fb2(fbelow, degree, ones, c << md)
-            u = self._fa2(fabove, degree, ones, c << md)
-            if False:
-                fba[(degree, ones)] = l
-                faa[(degree, ones)] = u
-            ls = Fraction(0)
-            us = Fraction(1)
-            if degree > startdegree:
-                nh = math.comb(degree, ones)
-                md = lastdegree
-                combs = [
-                    Fraction(
-                        math.comb(degree - lastdegree, ones - j)
-                        * math.comb(lastdegree, j),
-                        nh,
-                    )
-                    for j in range(0, min(lastdegree, ones) + 1)
-                ]
-                if False:  # Correctness check
-                    for j in range(0, min(lastdegree, ones) + 1):
-                        fb = self._fb2(
-                            fbelow, lastdegree, j, math.comb(lastdegree, j) << md
-                        )
-                        if (lastdegree, j) in fba:
-                            # print(fb)
-                            if fba[(lastdegree, j)] != fb:
-                                raise ValueError
-                        fa = self._fa2(
-                            fabove, lastdegree, j, math.comb(lastdegree, j) << md
-                        )
-                        if (lastdegree, j) in faa:
-                            # print(fa)
-                            if faa[(lastdegree, j)] != fa:
-                                raise ValueError
-                ls = sum(
-                    self._fb2(fbelow, lastdegree, j, math.comb(lastdegree, j) << md)
-                    * combs[j]
-                    for j in range(0, min(lastdegree, ones) + 1)
-                )
-                us = sum(
-                    self._fa2(fabove, lastdegree, j, math.comb(lastdegree, j) << md)
-                    * combs[j]
-                    for j in range(0, min(lastdegree, ones) + 1)
-                )
-                if ls > l:
-                    # print([lastdegree,degree,ones,"ls",float(ls),"l",float(l)])
-                    raise ValueError
-                if us < u:
-                    # print([lastdegree,degree,ones,"us",float(us),"u",float(u)])
-                    raise ValueError
+            l, u, ls, us = fc.bounds(lastdegree, degree, ones)
             m = (ut - lt) / (us - ls)
             lt = lt + (l - ls) * m
             ut = ut - (us - u) * m
             # print([ret,"lt",float(lt),"ut",float(ut),"l",float(l),"u",float(u)])
             if self._uniform_less(ret, lt):
                 return 1
-            if not self.uniform_less(ret, ut):
+            if not self._uniform_less(ret, ut):
+                return 0
+            lastdegree = degree
+            degree = nextdegree(degree) if nextdegree != None else degree * 2
+
+    def _simulate_scaled(self, coin, fc, ret, degree, nextdegree):
+        # Same as the loop in 'simulate', but lt and ut are kept as
+        # numerators 'a' and 'b' over a common denominator 'q'.  With
+        # l, u, ls, us scaled to a common denominator, the update
+        # lt += (l - ls) * (ut - lt) / (us - ls) (and likewise for ut)
+        # only multiplies integers, and 'q' is multiplied by us - ls.
+        ones = 0
+        lastdegree = 0
+        a = 0
+        b = 1
+        q = 1
+        while True:
+            if samplerstats.active != None:
+                samplerstats.active.add("Bernoulli.simulate", "iterations")
+            for i in range(degree - lastdegree):
+                if coin() == 1:
+                    ones += 1
+            l, u, ls, us, den = fc.scaledbounds(lastdegree, degree, ones)
+            w = us - ls
+            g = b - a
+            a = a * w + (l - ls) * g
+            b = b * w - (us - u) * g
+            q *= w
+            if self._uniform_less_nd(ret, a, q):
+                return 1
+            if not self._uniform_less_nd(ret, b, q):
                 return 0
             lastdegree = degree
             degree = nextdegree(degree) if nextdegree != None else degree * 2
 
+def _ceil(x):
+    ix = int(x)
+    return ix if x == ix else ix + 1
+
+def _fractionlow(f, n, k, v):
+    return int(Fraction(f(n, k)) * v)
+
+def _fractionhigh(f, n, k, v):
+    return _ceil(Fraction(f(n, k)) * v)
+
+# Number of factory functions, and of entries per factory function,
+# for which _simulatecache keeps coefficients and bounds
+SIMULATE_CACHE_FACTORIES = 32
+SIMULATE_CACHE_ENTRIES = 1 << 16
+
+_simulatecaches = collections.OrderedDict()
+
+def _simulatecache(fbelow, fabove, lownum, highnum, cache=True):
+    # Returns the _FactoryCache for the factory function given by
+    # fbelow and fabove, with coefficients rounded by lownum and highnum,
+    # creating it if necessary; the least recently used cache is dropped
+    # once there are too many of them.  lownum and highnum are part of
+    # the key, since callers that round coefficients differently must
+    # not share bounds; they should be module-level functions rather
+    # than new lambdas on each call.  If 'cache' is False, returns a new
+    # _FactoryCache that keeps nothing.
+    if not cache:
+        return _FactoryCache(fbelow, fabove, lownum, highnum, 0)
+    key = (fbelow, fabove, lownum, highnum)
+    fc = _simulatecaches.get(key)
+    if fc != None:
+        _simulatecaches.move_to_end(key)
+        return fc
+    fc = _FactoryCache(fbelow, fabove, lownum, highnum, SIMULATE_CACHE_ENTRIES)
+    _simulatecaches[key] = fc
+    while len(_simulatecaches) > SIMULATE_CACHE_FACTORIES:
+        _simulatecaches.popitem(last=False)
+    return fc
+
+class _FactoryCache:
+    """Keeps the work that simulating a factory function (Bernoulli.simulate)
+    repeats on each call for the same function: the Bernstein coefficients of
+    the lower and upper polynomials, as integers scaled by comb(n, k)*2^n;
+    the hypergeometric weights that express a degree-lastdegree polynomial
+    in degree-n form; and the bounds calculated from both.
+    - fbelow, fabove: Calculate the lower and upper coefficients, as in
+      Bernoulli.simulate.
+    - lownum(f, n, k, v), highnum(f, n, k, v): Return f(n, k) times v,
+      rounded down and up, respectively.
+    - maxentries: Maximum number of coefficients, weights and bounds kept.
+      Once reached, new entries are calculated but not kept; the entries
+      kept first, for the lowest degrees, are also the most often used."""
+
+    def __init__(self, fbelow, fabove, lownum, highnum, maxentries):
+        self.fbelow = fbelow
+        self.fabove = fabove
+        self.lownum = lownum
+        self.highnum = highnum
+        self.maxentries = maxentries
+        self.entries = 0
+        self.coeffs = {}
+        self.weights = {}
+        self.boundtable = {}
+        self.scaledtable = {}
+
+    def _keep(self, table, key, value, size=1):
+        if self.entries + size <= self.maxentries:
+            table[key] = value
+            self.entries += size
+        return value
+
+    def coeff(self, n, k):
+        """Returns the kth lower and upper coefficients of degree n, times
+        comb(n, k)*2^n and rounded down and up, respectively."""
+        key = (n, k)
+        ret = self.coeffs.get(key)
+        if ret == None:
+            if k > n:
+                raise ValueError
+            v = math.comb(n, k) << n
+            ret = self._keep(
+                self.coeffs,
+                key,
+                (
+                    self.lownum(self.fbelow, n, k, v),
+                    self.highnum(self.fabove, n, k, v),
+                ),
+            )
+        return ret
+
+    def weightrow(self, lastdegree, degree):
+        """Returns a list whose mth item is comb(degree - lastdegree, m)."""
+        key = (lastdegree, degree)
+        ret = self.weights.get(key)
+        if ret == None:
+            d = degree - lastdegree
+            ret = [1] * (d + 1)
+            for m in range(1, d + 1):
+                ret[m] = ret[m - 1] * (d - m + 1) // m
+            ret = self._keep(self.weights, key, ret, len(ret))
+        return ret
+
+    def _scaledbounds(self, lastdegree, degree, ones):
+        den = math.comb(degree, ones) << degree
+        lo, hi = self.coeff(degree, ones)
+        if lastdegree == 0:
+            return [lo, hi, 0, den, den]
+        # The scaled coefficient of degree lastdegree for j, divided
+        # by comb(lastdegree, j)*2^lastdegree, times the hypergeometric
+        # weight comb(lastdegree, j)*comb(degree-lastdegree, ones-j)/
+        # comb(degree, ones): the factors comb(lastdegree, j) cancel.
+        w = self.weightrow(lastdegree, degree)
+        slo = 0
+        shi = 0
+        jmin = max(0, ones - (degree - lastdegree))
+        for j in range(jmin, min(lastdegree, ones) + 1):
+            clo, chi = self.coeff(lastdegree, j)
+            slo += clo * w[ones - j]
+            shi += chi * w[ones - j]
+        slo <<= degree - lastdegree
+        shi <<= degree - lastdegree
+        if slo > lo:
+            # print([lastdegree,degree,ones,"ls",slo/den,"l",lo/den])
+            raise ValueError
+        if shi < hi:
+            # print([lastdegree,degree,ones,"us",shi/den,"u",hi/den])
+            raise ValueError
+        return [lo, hi, slo, shi, den]
+
+    def bounds(self, lastdegree, degree, ones):
+        """Returns the lower and upper coefficients for 'ones' of the
+        degree-'degree' polynomials, and of the degree-'lastdegree'
+        polynomials written in degree-'degree' form (0 and 1 if
+        lastdegree is 0), as Fractions in a list [l, u, ls, us]."""
+        key = (lastdegree, degree, ones)
+        ret = self.boundtable.get(key)
+        if ret != None:
+            return ret
+        lo, hi, slo, shi, den = self._scaledbounds(lastdegree, degree, ones)
+        ret = [
+            Fraction(lo, den),
+            Fraction(hi, den),
+            Fraction(slo, den),
+            Fraction(shi, den),
+        ]
+        return self._keep(self.boundtable, key, ret)
+
+    def scaledbounds(self, lastdegree, degree, ones):
+        """Same as 'bounds', but returns the four bounds as integers
+        scaled by comb(degree, ones)*2^degree, followed by that
+        scale, in a list [l, u, ls, us, scale]."""
+        key = (lastdegree, degree, ones)
+        ret = self.scaledtable.get(key)
+        if ret == None:
+            ret = self._keep(
+                self.scaledtable, key, self._scaledbounds(lastdegree, degree, ones)
+            )
+        return ret
+
 def _multinom(n, x):
     # Use "ymulticoeff" algorithm found in https://github.com/leolca/bincoeff#multicoeff
     num = 1
@@ -1284,34 +1431,28 @@ class _FastLoadedDiceRoller:
         if self.n == 1:
             return
         weights = self._toWeights(weights)
-        weightBits = 0
         totalWeights = sum(weights)
         if totalWeights < 0:
             raise ValueError("Sum of weights is negative")
         if totalWeights == 0:
             raise ValueError("Sum of weights is zero")
-        tmp = totalWeights - 1
-        while tmp > 0:
-            tmp >>= 1
-            weightBits += 1
+        if min(weights) < 0:
+            raise ValueError
+        import randomgen
+
+        weightBits = max(1, (totalWeights - 1).bit_length())
         lasta = (1 << weightBits) - totalWeights
-        self.leavesAndLabels = [
-            [0 for i in range(weightBits)] for j in range(self.n + 2)
-        ]
-        shift = weightBits - 1
+        # Store the labels level by level, as randomgen's
+        # FastLoadedDiceRoller does; the labels (starting at 1)
+        # of the leaves at level j are
+        # labels[offsets[j]:offsets[j]+leaves[j]].
+        levels = randomgen._fldrLevels(weights, lasta, weightBits)
+        self.leaves = array.array("q", [len(lv) for lv in levels])
+        self.offsets = array.array("q", [0] * weightBits)
+        self.labels = array.array("q")
         for j in range(weightBits):
-            level = 1
-            for i in range(self.n + 1):
-                ai = lasta if i == self.n else weights[i]
-                if ai < 0:
-                    raise ValueError
-                leaf = (ai >> shift) & 1
-                if leaf > 0:
-                    # NOTE: Labels start at 1
-                    self.leavesAndLabels[0][j] += leaf
-                    self.leavesAndLabels[level][j] = i + 1
-                    level += 1
-            shift -= 1
+            self.offsets[j] = len(self.labels)
+            self.labels.extend(levels[j])
 
     def next(self, randgen):
         if self.n == 1:
@@ -1320,9 +1461,9 @@ class _FastLoadedDiceRoller:
         y = 0
         while True:
             x = randgen.randbit() | (x << 1)
-            leaves = self.leavesAndLabels[0][y]
+            leaves = self.leaves[y]
             if x < leaves:
-                label = self.leavesAndLabels[x + 1][y]
+                label = self.labels[self.offsets[y] + x]
                 if label <= self.n:
                     return label - 1
                 x = 0
@@ -1505,6 +1646,10 @@ class DiceEnterprise:
     def __init__(self):
         self.ladder = []
         self.optladder = []
+        self.transitions = []
+        self.fasttransitions = []
+        self.ubuf = 0
+        self.ubufcount = 0
         self.bern = Bernoulli()
         self.vmatrix = None
         self._dirty = True
@@ -1720,7 +1865,13 @@ class DiceEnterprise:
                 v[j][i] = ri / s[i][b]
                 n[j][c].remove(i)
                 w[j][c] += v[j][i]
-                s[j][c] = sum(sum(self.ladder[jj][0]) for jj in n[j][c]) / (1 - w[j][c])
+                if len(n[j][c]) == 0:
+                    # No neighbors left in this direction
+                    s[j][c] = 0
+                else:
+                    s[j][c] = sum(sum(self.ladder[jj][0]) for jj in n[j][c]) / (
+                        1 - w[j][c]
+                    )
                 n_count -= 2
             s[i][b] = 0
         self.vmatrix = v
@@ -1798,6 +1949,47 @@ class DiceEnterprise:
                     ret += rtv
         return float(ret / rtot)
 
+    def next_n(self, coin, n, processes=None):
+        """Returns a list of 'n' independent results of the flip from
+        a coin or die, as in the "next" method, but with less overhead per
+        result.
+        coin - Input coin or die; see the "next" method.
+        n - Number of results to generate.
+        processes - If given and greater than 1, the results are
+          generated in that many worker processes (using Python's
+          'multiprocessing' module), each with its own copy of this object.
+          In that case, 'coin' must be picklable (for example, a function
+          defined at module level rather than a lambda), and the copies
+          of 'coin' must flip independently of each other; this is so
+          if 'coin' draws its randomness from the 'random' module, which
+          is reseeded in each worker.  Default is None."""
+        if len(self.ladder) == 0:
+            return [0 for i in range(n)]
+        if self._dirty:
+            self._dirty = False
+            self._autoaugment()
+            self._compile_ladder()
+        if processes != None and processes > 1 and n > 1:
+            import multiprocessing
+
+            chunks = [
+                n // processes + (1 if i < n % processes else 0)
+                for i in range(processes)
+            ]
+            jobs = [
+                (self, coin, c, self.bern._randbits(128)) for c in chunks if c > 0
+            ]
+            with multiprocessing.Pool(len(jobs)) as pool:
+                parts = pool.map(_dicenextn, jobs)
+            return [x for part in parts for x in part]
+        cftp = self._monotoniccftp if self._is_univariate() else self._cftp
+        bern = self.bern
+        ret = [0 for i in range(n)]
+        for i in range(n):
+            s = cftp(coin)
+            ret[i] = s[1][0] if s[0] == None else s[1][s[0].next(bern)]
+        return ret
+
     def next(self, coin):
         """Returns the next result of the flip from a coin or die
         that is transformed from the specified input coin or die by the function
@@ -1827,6 +2019,81 @@ class DiceEnterprise:
             # which result to return
             return s[1][s[0].next(self.bern)]
 
+    def codegen(self, name="dice_enterprise"):
+        """Generates standalone Python code for a function that
+        takes an input coin or die, as in the "next" method, and returns
+        the result of the output coin or die, using the transition
+        tables compiled for this object.
+        - name: Function name. Default: 'dice_enterprise'."""
+        if len(self.ladder) == 0:
+            return "def " + name + "(coin):\n  return 0\n"
+        if self._dirty:
+            self._dirty = False
+            self._autoaugment()
+            self._compile_ladder()
+        weights = []
+        for st in self.ladder:
+            if len(st[0]) == 1:
+                weights.append(None)
+                continue
+            den = 1
+            for c in st[0]:
+                den = den * c.denominator // math.gcd(den, c.denominator)
+            cw = []
+            total = 0
+            for c in st[0]:
+                total += c.numerator * (den // c.denominator)
+                cw.append(total)
+            weights.append(cw)
+        if self._is_univariate():
+            # Updates preserve the order of states, so only the chains
+            # started at the lowest and highest states are run
+            starts = [0, len(self.ladder) - 1]
+        else:
+            starts = list(range(len(self.ladder)))
+        tables = self.transitions
+        ret = "import bisect\nimport random\n\n"
+        ret += "DEN_" + name + " = %s\n" % (str([[t[0] for t in tb] for tb in tables]),)
+        ret += "CUM_" + name + " = %s\n" % (str([[t[1] for t in tb] for tb in tables]),)
+        ret += "TARGETS_" + name + " = %s\n" % (
+            str([[t[2] for t in tb] for tb in tables]),
+        )
+        ret += "RESULTS_" + name + " = %s\n" % (str([st[2] for st in self.ladder]),)
+        ret += "WEIGHTS_" + name + " = %s\n" % (str(weights),)
+        ret += "STARTS_" + name + " = %s\n\n" % (str(starts),)
+        ret += "def _update_" + name + "(i, b, u):\n"
+        ret += "  den = DEN_" + name + "[i][b]\n"
+        ret += "  cum = CUM_" + name + "[i][b]\n"
+        ret += "  while True:\n"
+        ret += "    v, k = u\n"
+        ret += "    x = bisect.bisect_right(cum, (v * den) >> k)\n"
+        ret += "    if x == bisect.bisect_right(cum, ((v + 1) * den - 1) >> k):\n"
+        ret += "      return TARGETS_" + name + "[i][b][x] if x < len(cum) else i\n"
+        ret += "    u[0] = (v << 8) | random.getrandbits(8)\n"
+        ret += "    u[1] = k + 8\n\n"
+        ret += "def " + name + "(coin):\n"
+        ret += "  bs = []\n"
+        ret += "  us = []\n"
+        ret += "  horizon = 1\n"
+        ret += "  while True:\n"
+        ret += "    while len(bs) < horizon:\n"
+        ret += "      bs.append(coin())\n"
+        ret += "      us.append([random.getrandbits(8), 8])\n"
+        ret += "    states = set(STARTS_" + name + ")\n"
+        ret += "    for t in range(horizon - 1, -1, -1):\n"
+        ret += "      b = bs[t]\n"
+        ret += "      u = us[t]\n"
+        ret += "      states = {_update_" + name + "(s, b, u) for s in states}\n"
+        ret += "    if len(states) == 1:\n"
+        ret += "      s = states.pop()\n"
+        ret += "      w = WEIGHTS_" + name + "[s]\n"
+        ret += "      if w == None:\n"
+        ret += "        return RESULTS_" + name + "[s][0]\n"
+        ret += "      r = random.randrange(w[-1])\n"
+        ret += "      return RESULTS_" + name + "[s][bisect.bisect_right(w, r)]\n"
+        ret += "    horizon *= 2\n"
+        return ret
+
     def _is_univariate(self):
         return len(self.ladder[0][1]) == 2
 
@@ -1880,29 +2147,85 @@ class DiceEnterprise:
                 fr1 = n
             self.optladder[i] = [fr1, fr2, fr3]
             # print(self.optladder)
+        self._compile_transitions()
         return self
 
-    def _monotonicladderupdate(self, i, b, u):
-        # Update function for univariate ladders (coins-to-dice)
-        # Heads case
-        if i > 0 and b == 1 and self.bern._uniform_less(u, self.optladder[i][0]):
-            return i - 1
-        # Tails case
-        if (
-            i < len(self.ladder) - 1
-            and b == 0
-            and self.bern._uniform_less(u, self.optladder[i][1])
-        ):
-            return i + 1
-        return i
+    def _compile_transitions(self):
+        # Builds, for each state and each face of the input die, a
+        # transition table (den, cum, targets) in integers: given a
+        # uniform random number u, the chain moves from the state to
+        # targets[x] for the smallest x with u*den < cum[x], or stays
+        # if there is no such x.  This way, a state update is a table
+        # lookup and integer comparisons, with no Fraction arithmetic.
+        # Also builds 'fasttransitions', which maps the first 8 bits of
+        # u to the next state, or to -1 if those bits don't decide it.
+        self.transitions = []
+        self.fasttransitions = []
+        for i in range(len(self.ladder)):
+            if self._is_univariate():
+                # Tails moves up the ladder, heads moves down
+                tails = []
+                heads = []
+                if i < len(self.ladder) - 1:
+                    tails = [[min(self.optladder[i][1], 1), i + 1]]
+                if i > 0:
+                    heads = [[self.optladder[i][0], i - 1]]
+                faces = [tails, heads]
+            else:
+                faces = [
+                    [[Fraction(v[0], v[1]), j] for v, j in zip(vs, n)]
+                    for vs, n in zip(self.optladder[i][0], self.neighbors[i])
+                ]
+            table = []
+            for moves in faces:
+                den = 1
+                for p, j in moves:
+                    den = den * p.denominator // math.gcd(den, p.denominator)
+                cum = [p.numerator * (den // p.denominator) for p, j in moves]
+                table.append((den, cum, [j for p, j in moves]))
+            self.transitions.append(table)
+            fast = []
+            for den, cum, targets in table:
+                row = array.array("q", [-1]) * 256
+                for w in range(256):
+                    x = bisect.bisect_right(cum, (w * den) >> 8)
+                    if x == bisect.bisect_right(cum, ((w + 1) * den - 1) >> 8):
+                        row[w] = targets[x] if x < len(targets) else i
+                fast.append(row)
+            self.fasttransitions.append(fast)
+        return self
+
+    def _newuniform(self):
+        # Uniform random number for _ladderupdate, with its
+        # first 8 bits sampled; these bits are taken from a buffer
+        # filled 512 bits at a time
+        if self.ubufcount == 0:
+            self.ubuf = self.bern._randbits(512)
+            self.ubufcount = 64
+        ret = [self.ubuf & 255, 8]
+        self.ubuf >>= 8
+        self.ubufcount -= 1
+        return ret
 
     def _ladderupdate(self, i, b, u):
-        vs = self.optladder[i][0][b]
-        n = self.neighbors[i][b]
-        for v, j in zip(vs, n):
-            if self.bern._uniform_less_nd(u, v[0], v[1]):
-                return j
-        return i
+        # Update function for ladders; 'u' is a list [v, k] holding a
+        # uniform random number known to lie in [v/2^k, (v+1)/2^k),
+        # whose bits are sampled 8 at a time as needed
+        j = self.fasttransitions[i][b][u[0] >> (u[1] - 8)]
+        return j if j >= 0 else self._ladderupdateslow(i, b, u)
+
+    def _ladderupdateslow(self, i, b, u):
+        # Rest of _ladderupdate, for when the first 8 bits of 'u' don't
+        # decide the next state ('fasttransitions' gives -1).  Then 'cum'
+        # is nonempty, since a state without moves always stays put.
+        den, cum, targets = self.transitions[i][b]
+        while True:
+            v, k = u
+            x = bisect.bisect_right(cum, (v * den) >> k)
+            if x == bisect.bisect_right(cum, ((v + 1) * den - 1) >> k):
+                return targets[x] if x < len(targets) else i
+            u[0] = (v << 8) | self.bern.rndint(255)
+            u[1] = k + 8
 
     def _allsame(self, states):
         for i in range(len(states) - 1):
@@ -1911,42 +2234,61 @@ class DiceEnterprise:
         return True
 
     def _cftp(self, coin):
-        states = [x for x in range(len(self.ladder))]
+        # Coupling from the past with a doubling horizon.  The inputs for
+        # times -1, -2, ..., -T are kept in 'bs' and 'us' (bs[t] is the
+        # input for time -(t+1)), so that each doubling of the horizon T
+        # reuses them.  Each run from time -T updates only the distinct
+        # states that remain, since chains that meet stay together.
         bs = []
         us = []
-        while not self._allsame(states):
-            bs.append(coin())
-            us.append([])  # Uniform random number to be filled on demand
-            states = [x for x in range(len(self.ladder))]
-            i = 0
-            while i < len(bs):
-                for j in range(len(states)):
-                    states[j] = self._ladderupdate(
-                        states[j], bs[len(bs) - 1 - i], us[len(bs) - 1 - i]
-                    )
-                i += 1
-        return [self.optladder[states[0]][2], self.ladder[states[0]][2]]
+        horizon = 1
+        while True:
+            if samplerstats.active != None:
+                samplerstats.active.add("DiceEnterprise.next", "iterations")
+            while len(bs) < horizon:
+                bs.append(coin())
+                us.append(self._newuniform())
+            # Same as _ladderupdate, with its table lookup inlined
+            fast = self.fasttransitions
+            states = set(range(len(self.ladder)))
+            for t in range(horizon - 1, -1, -1):
+                b = bs[t]
+                u = us[t]
+                w = u[0] >> (u[1] - 8)
+                newstates = set()
+                for s in states:
+                    j = fast[s][b][w]
+                    newstates.add(j if j >= 0 else self._ladderupdateslow(s, b, u))
+                states = newstates
+            if len(states) == 1:
+                state = states.pop()
+                return [self.optladder[state][2], self.ladder[state][2]]
+            horizon *= 2
 
     def _monotoniccftp(self, coin):
-        state1 = 0
-        state2 = len(self.ladder) - 1
+        # Same as _cftp, but for univariate ladders, where updates
+        # preserve the order of states, so that only the chains
+        # started at the lowest and highest states need to be run.
         bs = []
         us = []
-        while state1 != state2:
-            bs.append(coin())
-            us.append([])  # Uniform random number to be filled on demand
+        horizon = 1
+        while True:
+            if samplerstats.active != None:
+                samplerstats.active.add("DiceEnterprise.next", "iterations")
+            while len(bs) < horizon:
+                bs.append(coin())
+                us.append(self._newuniform())
             state1 = 0
             state2 = len(self.ladder) - 1
-            i = 0
-            while i < len(bs):
-                state1 = self._monotonicladderupdate(
-                    state1, bs[len(bs) - 1 - i], us[len(bs) - 1 - i]
-                )
-                state2 = self._monotonicladderupdate(
-                    state2, bs[len(bs) - 1 - i], us[len(bs) - 1 - i]
-                )
-                i += 1
-        return [self.optladder[state1][2], self.ladder[state1][2]]
+            for t in range(horizon - 1, -1, -1):
+                if state1 == state2:
+                    state1 = state2 = self._ladderupdate(state1, bs[t], us[t])
+                else:
+                    state1 = self._ladderupdate(state1, bs[t], us[t])
+                    state2 = self._ladderupdate(state2, bs[t], us[t])
+            if state1 == state2:
+                return [self.optladder[state1][2], self.ladder[state1][2]]
+            horizon *= 2
 
     def _simplex(self, d, m):
         # Enumerates the points of a d-scaled m-dimensional simplex
@@ -2034,6 +2376,20 @@ class DiceEnterprise:
             if ret != 0:
                 newladder.append([[ret], n, [result]])
 
+def _dicenextn(job):
+    # Worker for DiceEnterprise.next_n with several processes
+    ent, coin, n, seed = job
+    random.seed(seed)
+    ent.bern.r.seed(seed + 1)
+    ent.bern.rbit = -1
+    ent.ubufcount = 0
+    return ent.next_n(coin, n)
+
+# Samplers timed and counted while a samplerstats.SamplerStats is active
+samplerstats.register(Bernoulli, exclude=("randbit", "rndint"))
+samplerstats.register(PolynomialSim)
+samplerstats.register(DiceEnterprise)
+
 # Examples of use
 if __name__ == "__main__":
 
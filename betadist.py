@@ -6,12 +6,10 @@
 
 import random
 
-try:
-    import bernoulli
-    import randomgen
-except:
-    pass
+import collections
+import decimal
 import math
+import samplerstats
 from fractions import Fraction
 
 def betabin(k, psi, rho, cpsi, m=5):
@@ -213,6 +211,184 @@ def psrn_complement(x):
 def psrn_new_01():
     return [1, 0, []]
 
+class PSRN:
+    """A partially-sampled random number (PSRN) with base-2 fractional
+    digits, stored compactly.  The sampled digits are packed into one
+    integer, 'bits', whose most significant of 'length' bits is the first
+    digit after the point; 'unsampled' is a mask, laid out the same way,
+    whose 1 bits mark digits not yet sampled (and are 0 in 'bits').
+    Indexing a PSRN as psrn[0], psrn[1], psrn[2] gives its sign,
+    integer part, and a list-like view of its digits (with None for
+    unsampled digits), so that it can be passed to the psrn_* functions
+    that take the list form [sign, intpart, digits].
+    - sign: 1 or -1.  Default is 1.
+    - intpart: Integer part, 0 or greater.  Default is 0.
+    """
+
+    __slots__ = ("sign", "intpart", "bits", "length", "unsampled")
+
+    def __init__(self, sign=1, intpart=0):
+        self.sign = sign
+        self.intpart = intpart
+        self.bits = 0
+        self.length = 0
+        self.unsampled = 0
+
+    @staticmethod
+    def fromlist(psrn):
+        """Creates a PSRN from the list form [sign, intpart, digits]."""
+        ret = PSRN(psrn[0], psrn[1])
+        for d in psrn[2]:
+            ret.append(d)
+        return ret
+
+    def tolist(self):
+        """Returns this PSRN in the list form [sign, intpart, digits]."""
+        return [self.sign, self.intpart, [self.digit(i) for i in range(self.length)]]
+
+    def copy(self):
+        ret = PSRN(self.sign, self.intpart)
+        ret.bits = self.bits
+        ret.length = self.length
+        ret.unsampled = self.unsampled
+        return ret
+
+    def __repr__(self):
+        return "PSRN(%s)" % (self.tolist(),)
+
+    def __len__(self):
+        return 3
+
+    def __getitem__(self, i):
+        if i == 0:
+            return self.sign
+        if i == 1:
+            return self.intpart
+        if i == 2:
+            return _PSRNDigits(self)
+        raise IndexError
+
+    def __setitem__(self, i, v):
+        if i == 0:
+            self.sign = v
+        elif i == 1:
+            self.intpart = v
+        elif i == 2:
+            self.bits = 0
+            self.length = 0
+            self.unsampled = 0
+            for d in v:
+                self.append(d)
+        else:
+            raise IndexError
+
+    def digit(self, i):
+        """Gets the digit at position 'i' (0 is the first digit after the
+        point), or None if that digit wasn't sampled yet."""
+        if i >= self.length:
+            return None
+        pos = self.length - 1 - i
+        if (self.unsampled >> pos) & 1:
+            return None
+        return (self.bits >> pos) & 1
+
+    def setdigit(self, i, d):
+        """Sets the digit at position 'i' to 'd' (0, 1, or None)."""
+        if i >= self.length:
+            self.appendbits(0, i + 1 - self.length, unsampled=True)
+        bit = 1 << (self.length - 1 - i)
+        if d == None:
+            self.bits &= ~bit
+            self.unsampled |= bit
+        else:
+            self.unsampled &= ~bit
+            self.bits = (self.bits | bit) if d else (self.bits & ~bit)
+
+    def append(self, d):
+        """Appends a digit (0, 1, or None)."""
+        if d == None:
+            self.appendbits(0, 1, unsampled=True)
+        else:
+            self.appendbits(d, 1)
+
+    def appendbits(self, value, k, unsampled=False):
+        """Appends 'k' digits given by the 'k'-bit integer 'value' (whose
+        most significant bit is the first of those digits), or 'k'
+        unsampled digits if 'unsampled' is True."""
+        self.bits <<= k
+        self.unsampled <<= k
+        if unsampled:
+            self.unsampled |= (1 << k) - 1
+        else:
+            self.bits |= value
+        self.length += k
+
+    def fill(self, rg, k):
+        """Appends 'k' random digits, drawn from 'rg' at once."""
+        self.appendbits(rg.rndint((1 << k) - 1), k)
+
+    def prefix(self, rg, n):
+        """Returns the first 'n' digits as an 'n'-bit integer, sampling
+        any of them that were not sampled yet (using 'rg')."""
+        if n > self.length:
+            self.fill(rg, n - self.length)
+        shift = self.length - n
+        if (self.unsampled >> shift) != 0:
+            self._sampleunsampled(rg, shift)
+        return self.bits >> shift
+
+    def _sampleunsampled(self, rg, shift):
+        # Samples the unsampled digits at or above bit position 'shift'
+        m = (self.unsampled >> shift) << shift
+        r = rg.rndint((1 << _popcount(m)) - 1)
+        while m != 0:
+            low = m & -m
+            if r & 1:
+                self.bits |= low
+            r >>= 1
+            m ^= low
+        self.unsampled &= (1 << shift) - 1
+
+    def isfullysampled(self):
+        return self.unsampled == 0
+
+def _popcount(x):
+    return bin(x).count("1")
+
+class _PSRNDigits:
+    # List-like view of the digits of a PSRN object
+    __slots__ = ("psrn",)
+
+    def __init__(self, psrn):
+        self.psrn = psrn
+
+    def __len__(self):
+        return self.psrn.length
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.psrn.digit(j) for j in range(*i.indices(self.psrn.length))]
+        if i < 0:
+            i += self.psrn.length
+        if i < 0 or i >= self.psrn.length:
+            raise IndexError
+        return self.psrn.digit(i)
+
+    def __setitem__(self, i, d):
+        if i < 0:
+            i += self.psrn.length
+        if i < 0 or i >= self.psrn.length:
+            raise IndexError
+        self.psrn.setdigit(i, d)
+
+    def __iter__(self):
+        for i in range(self.psrn.length):
+            yield self.psrn.digit(i)
+
+    def append(self, d):
+        self.psrn.append(d)
+
+
 def psrn_fill(rg, psrn, precision=53, digits=2):
     af = 0
     afrac = psrn[2]
@@ -252,6 +428,109 @@ def psrn_fill(rg, psrn, precision=53, digits=2):
             asign * ((af // digits) + (aint * digits**precision)) / (digits**precision)
         )
 
+# Translation tables between binary digits 0/1 and the characters "0"/"1"
+_DIGITCHARS = bytes(range(48, 50)) + bytes(range(2, 256))
+_CHARDIGITS = bytes(range(48)) + bytes([0, 1]) + bytes(range(50, 256))
+
+def _psrnleadingzeros(rg, psrn):
+    # Returns the number of zero digits after the point before the
+    # first 1 digit of a PSRN whose integer part is 0, sampling
+    # digits (using 'rg') up to that 1 digit as necessary
+    i = 0
+    while True:
+        if i < len(psrn[2]):
+            d = psrn[2][i]
+            if d == None:
+                d = rg.randbit()
+                psrn[2][i] = d
+        else:
+            d = rg.randbit()
+            psrn[2].append(d)
+        if d == 1:
+            return i
+        i += 1
+
+def psrn_fill_many(
+    rg, psrns, precision=53, output="float", batchbits=1 << 16, significant=False
+):
+    """Fills each PSRN in a list with random digits to the given precision
+    and returns a list of the resulting numbers, rounded the same
+    way as psrn_fill.  Base 2 only.  The new digits for many PSRNs
+    are drawn with one call to rg.rndint, taking up to about 'batchbits'
+    random bits at a time.
+    psrns: List of PSRNs, each either a PSRN object or in the list form
+       [sign, intpart, digits].
+    precision: Number of binary digits after the point.  Default is 53.
+    output: "float" for correctly rounded floats (the default),
+       "fraction" for Fractions, or "pair" for pairs (n, e)
+       giving the number n*2^e.
+    significant: If True, 'precision' is instead the number of significant
+       binary digits, counted from each PSRN's first nonzero digit, so that
+       small numbers keep full precision as floats.  Default is False."""
+    if output != "float" and output != "fraction" and output != "pair":
+        raise ValueError
+    count = len(psrns)
+    ret = [None for i in range(count)]
+    precs = [precision for i in range(count)]
+    if significant:
+        for i in range(count):
+            psrn = psrns[i]
+            if psrn[1] > 0:
+                precs[i] = max(0, precision - psrn[1].bit_length())
+            else:
+                precs[i] = precision + _psrnleadingzeros(rg, psrn)
+    start = 0
+    while start < count:
+        # Gather a batch of PSRNs and the digits they still need
+        end = start
+        total = 0
+        needs = []
+        while end < count and (end == start or total < batchbits):
+            psrn = psrns[end]
+            if psrn[0] != -1 and psrn[0] != 1:
+                raise ValueError
+            k = max(0, precs[end] + 1 - len(psrn[2]))
+            needs.append(k)
+            total += k
+            end += 1
+        rest = rg.rndint((1 << total) - 1) if total > 0 else 0
+        for i in range(start, end):
+            psrn = psrns[i]
+            prec = precs[i]
+            p1 = prec + 1
+            k = needs[i - start]
+            chunk = rest & ((1 << k) - 1)
+            rest >>= k
+            if isinstance(psrn, PSRN):
+                if k > 0:
+                    psrn.appendbits(chunk, k)
+                af = psrn.prefix(rg, p1)
+            else:
+                afrac = psrn[2]
+                af = 0
+                if k < p1:
+                    if None in afrac:
+                        for j in range(min(p1, len(afrac))):
+                            if afrac[j] == None:
+                                afrac[j] = rg.randbit()
+                    af = int(bytes(afrac[:p1]).translate(_DIGITCHARS), 2)
+                if k > 0:
+                    afrac.extend(
+                        format(chunk, "0%db" % (k)).encode().translate(_CHARDIGITS)
+                    )
+                    af = (af << k) | chunk
+            # Round half up using the last digit
+            n = (af >> 1) + (af & 1) + (psrn[1] << prec)
+            n = n if psrn[0] > 0 else -n
+            if output == "float":
+                ret[i] = n / (1 << prec)
+            elif output == "fraction":
+                ret[i] = Fraction(n, 1 << prec)
+            else:
+                ret[i] = (n, -prec)
+        start = end
+    return ret
+
 def psrn_in_range(rg, bmin, bmax, digits=2):
     if bmin >= bmax:
         raise ValueError
@@ -408,6 +687,29 @@ def psrn_less(rg, psrn1, psrn2, digits=2):
             return 0
         if psrn1[1] > psrn2[1]:
             return 1
+    if digits == 2:
+        d1 = psrn1[2]
+        d2 = psrn2[2]
+        if (
+            type(d1) == list
+            and type(d2) == list
+            and len(d1) == len(d2)
+            and None not in d1
+            and None not in d2
+        ):
+            # Same as _psrn_less_words for this case, but on the lists
+            # directly: list comparison finds the first differing digit
+            if d1 != d2:
+                return 1 if d1 < d2 else 0
+            return _psrn_less_newlists(rg, d1, d2)
+        w1 = _psrnwords(psrn1)
+        w2 = _psrnwords(psrn2)
+        old1 = w1[:]
+        old2 = w2[:]
+        ret = _psrn_less_words(rg, w1, w2)
+        _psrnsetwords(psrn1, w1, old1)
+        _psrnsetwords(psrn2, w2, old2)
+        return ret
     index = 0
     psrn1len = len(psrn1[2])
     psrn2len = len(psrn2[2])
@@ -468,6 +770,18 @@ def psrn_less_than_fraction(rg, psrn, rat, digits=2):
     if num == 0:
         # Is an integer
         return 0 if psrn[0] > 0 else 1
+    if digits == 2:
+        d = psrn[2]
+        if type(d) == list and None not in d:
+            # Same as _psrn_less_than_fraction_words for this case, but
+            # on the list directly
+            ret = _psrn_less_than_fraction_list(rg, d, num, den)
+            return ret if psrn[0] > 0 else 1 - ret
+        w = _psrnwords(psrn)
+        old = w[:]
+        ret = _psrn_less_than_fraction_words(rg, w, num, den)
+        _psrnsetwords(psrn, w, old)
+        return ret if psrn[0] > 0 else 1 - ret
     pt = digits
     index = 0
     psrnlen = len(psrn[2])
@@ -495,6 +809,243 @@ def psrn_less_than_fraction(rg, psrn, rat, digits=2):
         pt *= digits
         index += 1
 
+# Number of new random digits appended at a time by psrn_less and
+# psrn_less_than_fraction (base 2) once the digits already there
+# don't decide the comparison; psrn_less draws them for both PSRNs
+# in one call.  Only about two new digits are needed on average, and
+# the cost of a call to rg.rndint and of appending the digits grows
+# with the chunk size, so the chunk is small.
+_PSRNCHUNK = 8
+# Digits of each _PSRNCHUNK-bit integer, for appending to the list form
+_CHUNKDIGITS = [
+    tuple((x >> (_PSRNCHUNK - 1 - i)) & 1 for i in range(_PSRNCHUNK))
+    for x in range(1 << _PSRNCHUNK)
+]
+
+def _psrnwords(psrn):
+    # Gets the digits of a PSRN, either a PSRN object or in the list
+    # form, as a list [bits, unsampled, length] laid out as in the PSRN
+    # class
+    if isinstance(psrn, PSRN):
+        return [psrn.bits, psrn.unsampled, psrn.length]
+    digits = psrn[2]
+    length = len(digits)
+    if length == 0:
+        return [0, 0, 0]
+    if isinstance(digits, _PSRNDigits):
+        return [digits.psrn.bits, digits.psrn.unsampled, length]
+    if None not in digits:
+        return [int(bytes(digits).translate(_DIGITCHARS), 2), 0, length]
+    bits = 0
+    unsampled = 0
+    for d in digits:
+        bits = (bits << 1) | (1 if d == 1 else 0)
+        unsampled = (unsampled << 1) | (1 if d == None else 0)
+    return [bits, unsampled, length]
+
+def _psrnsetwords(psrn, w, old):
+    # Stores digits given as [bits, unsampled, length] back into a PSRN,
+    # either a PSRN object or in the list form, where 'old' is what
+    # _psrnwords returned for it.  Digits are only ever sampled or
+    # appended, so for the list form, only those digits are written.
+    bits, unsampled, length = w
+    if isinstance(psrn, PSRN):
+        psrn.bits = bits
+        psrn.unsampled = unsampled
+        psrn.length = length
+        return
+    digits = psrn[2]
+    if isinstance(digits, _PSRNDigits):
+        digits.psrn.bits = bits
+        digits.psrn.unsampled = unsampled
+        digits.psrn.length = length
+        return
+    k = length - old[2]
+    sampled = (old[1] & ~(unsampled >> k)) if old[1] != 0 else 0
+    while sampled != 0:
+        low = sampled & -sampled
+        pos = low.bit_length() - 1
+        digits[old[2] - 1 - pos] = (bits >> (pos + k)) & 1
+        sampled ^= low
+    if k == _PSRNCHUNK:
+        digits.extend(_CHUNKDIGITS[bits & ((1 << k) - 1)])
+    elif k > 0:
+        digits.extend(
+            format(bits & ((1 << k) - 1), "0%db" % (k)).encode().translate(_CHARDIGITS)
+        )
+
+def _psrn_samplefirst(rg, w, shift, a, u):
+    # Samples the first unsampled digit of the digits 'w' (as
+    # [bits, unsampled, length]) among the digits a and u (digits and
+    # unsampled mask shifted right by 'shift'); returns the updated a and u
+    bit = 1 << (u.bit_length() - 1)
+    if rg.randbit():
+        a |= bit
+        w[0] |= bit << shift
+    w[1] &= ~(bit << shift)
+    return a, u & ~bit
+
+def _psrn_extend(rg, w, end, r):
+    # Makes the digits 'w' (as [bits, unsampled, length]) 'end' digits
+    # long, if shorter, by appending the low bits of the random integer
+    # 'r', then samples any unsampled digits among the last _PSRNCHUNK
+    # of them; returns those last _PSRNCHUNK digits as an integer and
+    # the bits of 'r' not used
+    k = end - w[2]
+    if k > 0:
+        w[0] = (w[0] << k) | (r & ((1 << k) - 1))
+        w[1] <<= k
+        w[2] = end
+        r >>= k
+    shift = w[2] - end
+    mask = ((1 << _PSRNCHUNK) - 1) << shift
+    if w[1] & mask:
+        m = w[1] & mask
+        u = rg.rndint((1 << _popcount(m)) - 1)
+        while m != 0:
+            low = m & -m
+            if u & 1:
+                w[0] |= low
+            u >>= 1
+            m ^= low
+        w[1] &= ~mask
+    return (w[0] & mask) >> shift, r
+
+def _psrn_less_words(rg, w1, w2):
+    # Base-2 version of the digit loop in psrn_less, for digits given as
+    # [bits, unsampled, length].  Digits already there on both sides are
+    # compared a word at a time, sampling unsampled ones only as needed;
+    # after that, random digits are appended _PSRNCHUNK at a time to
+    # both sides and compared as integers.
+    n = min(w1[2], w2[2])
+    if n > 0:
+        s1 = w1[2] - n
+        s2 = w2[2] - n
+        a = w1[0] >> s1
+        b = w2[0] >> s2
+        u1 = w1[1] >> s1
+        u2 = w2[1] >> s2
+        while True:
+            d = (a ^ b) | u1 | u2
+            if d == 0:
+                break
+            bitlen = d.bit_length()
+            if (u1 >> (bitlen - 1)) & 1:
+                a, u1 = _psrn_samplefirst(rg, w1, s1, a, u1)
+            if (u2 >> (bitlen - 1)) & 1:
+                b, u2 = _psrn_samplefirst(rg, w2, s2, b, u2)
+            if ((a ^ b) >> (bitlen - 1)) & 1:
+                return (b >> (bitlen - 1)) & 1
+    index = n
+    while index < w1[2] or index < w2[2]:
+        # Compare the rest of the longer side's digits with new ones
+        index += _PSRNCHUNK
+        k = max(0, index - w1[2]) + max(0, index - w2[2])
+        r = rg.rndint((1 << k) - 1) if k > 0 else 0
+        a, r = _psrn_extend(rg, w1, index, r)
+        b, r = _psrn_extend(rg, w2, index, r)
+        if a != b:
+            return 1 if a < b else 0
+    # Both sides now have the same number of digits, all of them
+    # sampled and equal, so only new digits are left to compare; draw
+    # the new digits for both sides at once
+    chunk = _PSRNCHUNK
+    mask = (1 << chunk) - 1
+    while True:
+        r = rg.rndint((1 << (chunk * 2)) - 1)
+        a = r >> chunk
+        b = r & mask
+        w1[0] = (w1[0] << chunk) | a
+        w1[1] <<= chunk
+        w1[2] += chunk
+        w2[0] = (w2[0] << chunk) | b
+        w2[1] <<= chunk
+        w2[2] += chunk
+        if a != b:
+            return 1 if a < b else 0
+
+def _psrn_less_newlists(rg, d1, d2):
+    # Appends new random digits to the equal digit lists d1 and d2 until
+    # they differ, drawing them as _psrn_less_words does; returns 1 if
+    # d1 is then less than d2, or 0 otherwise
+    chunk = _PSRNCHUNK
+    mask = (1 << chunk) - 1
+    while True:
+        r = rg.rndint((1 << (chunk * 2)) - 1)
+        a = r >> chunk
+        b = r & mask
+        d1.extend(_CHUNKDIGITS[a])
+        d2.extend(_CHUNKDIGITS[b])
+        if a != b:
+            return 1 if a < b else 0
+
+def _psrn_less_than_fraction_list(rg, d, num, den):
+    # Version of _psrn_less_than_fraction_words for a list of digits
+    # with no unsampled digits
+    n = len(d)
+    if n > 0:
+        f = (num << n) // den
+        num = (num << n) - f * den
+        a = int(bytes(d).translate(_DIGITCHARS), 2)
+        if a != f:
+            return 1 if a < f else 0
+        if num == 0:
+            return 0
+    chunk = _PSRNCHUNK
+    while True:
+        a = rg.rndint((1 << chunk) - 1)
+        d.extend(_CHUNKDIGITS[a])
+        num <<= chunk
+        f = num // den
+        num -= f * den
+        if a != f:
+            return 1 if a < f else 0
+        if num == 0:
+            return 0
+
+def _psrn_less_than_fraction_words(rg, w, num, den):
+    # Base-2 version of the digit loop in psrn_less_than_fraction, for
+    # digits given as [bits, unsampled, length]; returns 1 if the
+    # fractional part is less than num/den (which is in (0, 1)), or 0
+    # otherwise.  Compares the digits already there against as many
+    # binary digits of num/den at once, then appends random digits
+    # _PSRNCHUNK at a time and compares them with the next _PSRNCHUNK
+    # binary digits of num/den.
+    n = w[2]
+    if n > 0:
+        f = (num << n) // den
+        rem = (num << n) - f * den
+        # If num/den ends within these n digits, compare only up to its
+        # last digit
+        shift = ((f & -f).bit_length() - 1) if rem == 0 else 0
+        a = w[0] >> shift
+        u = w[1] >> shift
+        f >>= shift
+        while True:
+            d = (a ^ f) | u
+            if d == 0:
+                break
+            bitlen = d.bit_length()
+            if (u >> (bitlen - 1)) & 1:
+                a, u = _psrn_samplefirst(rg, w, shift, a, u)
+            if ((a ^ f) >> (bitlen - 1)) & 1:
+                return (f >> (bitlen - 1)) & 1
+        if rem == 0:
+            return 0
+        num = rem
+    index = n
+    while True:
+        index += _PSRNCHUNK
+        k = index - w[2]
+        a, r = _psrn_extend(rg, w, index, rg.rndint((1 << k) - 1) if k > 0 else 0)
+        num <<= _PSRNCHUNK
+        f = num // den
+        num -= f * den
+        if a != f:
+            return 1 if a < f else 0
+        if num == 0:
+            return 0
+
 def psrn_reciprocal(rg, psrn1, digits=2):
     """Generates the reciprocal of a partially-sampled random number.
     psrn1: List containing the sign, integer part, and fractional part
@@ -607,6 +1158,60 @@ def proddist2(x, a, b, c, d):
         r = [Fraction(b * d, x), Fraction(b, a)]
     return r
 
+def _psrn_fillto(rg, psrn, count, digits=2):
+    # Samples the unsampled digits of 'psrn', appends random digits
+    # until it has at least 'count' digits, and returns its integer part
+    # and digits as one integer.  New binary digits are drawn in
+    # bulk, with one call to 'rg.rndint'.
+    if digits == 2 and isinstance(psrn, PSRN):
+        return (psrn.intpart << max(count, psrn.length)) | psrn.prefix(
+            rg, max(count, psrn.length)
+        )
+    afrac = psrn[2]
+    if None in afrac:
+        for i in range(len(afrac)):
+            if afrac[i] == None:
+                afrac[i] = rg.rndint(digits - 1)
+    k = count - len(afrac)
+    if digits == 2:
+        ret = psrn[1]
+        if len(afrac) > 0:
+            ret = (ret << len(afrac)) | int(bytes(afrac).translate(_DIGITCHARS), 2)
+        if k > 0:
+            rest = rg.rndint((1 << k) - 1)
+            afrac.extend(format(rest, "0%db" % (k)).encode().translate(_CHARDIGITS))
+            ret = (ret << k) | rest
+        return ret
+    for i in range(k):
+        afrac.append(rg.rndint(digits - 1))
+    ret = psrn[1]
+    for d in afrac:
+        ret = ret * digits + d
+    return ret
+
+def _psrn_new(like, sign, value, count, digits=2):
+    # Creates a PSRN with the given sign whose integer part and 'count'
+    # digits are given by the nonnegative integer 'value'.  The PSRN
+    # is a PSRN object if 'like' is one, or in the list form otherwise.
+    if digits == 2:
+        mask = (1 << count) - 1
+        if isinstance(like, PSRN):
+            ret = PSRN(sign, value >> count)
+            ret.appendbits(value & mask, count)
+            return ret
+        afrac = []
+        if count > 0:
+            afrac = list(
+                format(value & mask, "0%db" % (count)).encode().translate(_CHARDIGITS)
+            )
+        return [sign, value >> count, afrac]
+    afrac = [0 for i in range(count)]
+    for i in range(count):
+        afrac[count - 1 - i] = value % digits
+        value //= digits
+    return [sign, value, afrac]
+
+@samplerstats.function("psrn_multiply")
 def psrn_multiply(rg, psrn1, psrn2, digits=2):
     """Multiplies two uniform partially-sampled random numbers.
     psrn1: List containing the sign, integer part, and fractional part
@@ -717,27 +1322,14 @@ if False:
     _log_xyzy_test(0, 16, 14)
     exit()
 
+@samplerstats.function("psrn_multiply_b")
 def psrn_multiply_b(rg, psrn1, psrn2, digits=2, testing=False):
     if psrn1[0] == None or psrn1[1] == None or psrn2[0] == None or psrn2[1] == None:
         raise ValueError
-    for i in range(len(psrn1[2])):
-        psrn1[2][i] = rg.rndint(digits - 1) if psrn1[2][i] == None else psrn1[2][i]
-    for i in range(len(psrn2[2])):
-        psrn2[2][i] = rg.rndint(digits - 1) if psrn2[2][i] == None else psrn2[2][i]
-    while len(psrn1[2]) < len(psrn2[2]):
-        psrn1[2].append(rg.rndint(digits - 1))
-    while len(psrn1[2]) > len(psrn2[2]):
-        psrn2[2].append(rg.rndint(digits - 1))
-    digitcount = len(psrn1[2])
-    if len(psrn2[2]) != digitcount:
-        raise ValueError
+    digitcount = max(len(psrn1[2]), len(psrn2[2]))
     # Perform multiplication
-    frac1 = psrn1[1]
-    frac2 = psrn2[1]
-    for i in range(digitcount):
-        frac1 = frac1 * digits + psrn1[2][i]
-    for i in range(digitcount):
-        frac2 = frac2 * digits + psrn2[2][i]
+    frac1 = _psrn_fillto(rg, psrn1, digitcount, digits)
+    frac2 = _psrn_fillto(rg, psrn2, digitcount, digits)
     zero = False  # (frac1 == 0 and frac2 != 0) or (frac2 == 0 and frac1 != 0)
     # print(["before",frac1,frac2,zero])
     while frac1 == 0 or frac2 == 0:
@@ -757,8 +1349,7 @@ def psrn_multiply_b(rg, psrn1, psrn2, digits=2, testing=False):
     midmin = min(mid1, mid2)
     midmax = max(mid1, mid2)
     dc2 = digitcount * 2
-    cpsrn = [1, 0, [0 for i in range(dc2)]]
-    cpsrn[0] = psrn1[0] * psrn2[0]
+    sign = psrn1[0] * psrn2[0]
     iters = 0
     while True:
         iters += 1
@@ -776,19 +1367,9 @@ def psrn_multiply_b(rg, psrn1, psrn2, digits=2, testing=False):
                 succ = _log_xyzy(rg, psrn, large, midmax, digits=digits) == 1
             if succ:
                 # Success
-                sret = ru
-                for i in range(dc2):
-                    idx = (dc2) - 1 - i
-                    while idx >= len(cpsrn[2]):
-                        cpsrn[2].append(None)
-                    cpsrn[2][idx] = sret % digits
-                    sret //= digits
-                for i in range(len(psrn[2])):
-                    idx = dc2 + i
-                    while idx >= len(cpsrn[2]):
-                        cpsrn[2].append(None)
-                    cpsrn[2][idx] = psrn[2][i]
-                cpsrn[1] = sret
+                cpsrn = _psrn_new(psrn1, sign, ru, dc2, digits)
+                for d in psrn[2]:
+                    cpsrn[2].append(d)
                 # if iters>100:print(iters)
                 return cpsrn
         else:
@@ -800,14 +1381,10 @@ def psrn_multiply_b(rg, psrn1, psrn2, digits=2, testing=False):
                 else:
                     if _log_1n(rg, frac2) == 0:
                         continue
-            sret = small + rv
-            for i in range(dc2):
-                cpsrn[2][dc2 - 1 - i] = sret % digits
-                sret //= digits
-            cpsrn[1] = sret
             # if iters>100:print(iters)
-            return cpsrn
+            return _psrn_new(psrn1, sign, small + rv, dc2, digits)
 
+@samplerstats.function("psrn_multiply_by_fraction")
 def psrn_multiply_by_fraction(rg, psrn1, fraction, digits=2):
     """Multiplies a partially-sampled random number by a fraction.
     psrn1: List containing the sign, integer part, and fractional part
@@ -818,42 +1395,35 @@ def psrn_multiply_by_fraction(rg, psrn1, fraction, digits=2):
     if psrn1[0] == None or psrn1[1] == None:
         raise ValueError
     fraction = Fraction(fraction)
-    for i in range(len(psrn1[2])):
-        psrn1[2][i] = rg.rndint(digits - 1) if psrn1[2][i] == None else psrn1[2][i]
     digitcount = len(psrn1[2])
     # Perform multiplication
-    frac1 = psrn1[1]
+    frac1 = _psrn_fillto(rg, psrn1, digitcount, digits)
     fracsign = -1 if fraction < 0 else 1
-    absfrac = abs(fraction)
-    for i in range(digitcount):
-        frac1 = frac1 * digits + psrn1[2][i]
+    fn = abs(fraction.numerator)
+    fd = fraction.denominator
     while True:
         dcount = digitcount
-        ddc = digits**dcount
-        small = Fraction(frac1, ddc) * absfrac
-        large = Fraction(frac1 + 1, ddc) * absfrac
-        dc = int(small * ddc)
-        dc2 = int(large * ddc) + 1
+        # The product is in [small, large]/(fd*digits^dcount), where
+        # small = frac1*fn and large = (frac1+1)*fn at first
+        small = frac1 * fn
+        large = small + fn
+        dc = small // fd
+        dc2 = large // fd + 1
         rv = dc + rg.rndint(dc2 - 1 - dc)
         while True:
-            rvsmall = Fraction(rv, ddc)
-            rvlarge = Fraction(rv + 1, ddc)
+            rvsmall = rv * fd
+            rvlarge = rvsmall + fd
             if rvsmall >= small and rvlarge < large:
-                cpsrn = [1, 0, [0 for i in range(dcount)]]
-                cpsrn[0] = psrn1[0] * fracsign
-                sret = rv
-                for i in range(dcount):
-                    cpsrn[2][dcount - 1 - i] = sret % digits
-                    sret //= digits
-                cpsrn[1] = sret
-                return cpsrn
+                return _psrn_new(psrn1, psrn1[0] * fracsign, rv, dcount, digits)
             elif rvsmall > large or rvlarge < small:
                 break
             else:
                 rv = rv * digits + rg.rndint(digits - 1)
                 dcount += 1
-                ddc *= digits
+                small *= digits
+                large *= digits
 
+@samplerstats.function("psrn_add")
 def psrn_add(rg, psrn1, psrn2, digits=2):
     """Adds two uniform partially-sampled random numbers.
     psrn1: List containing the sign, integer part, and fractional part
@@ -864,24 +1434,10 @@ def psrn_add(rg, psrn1, psrn2, digits=2):
     digits: Digit base of PSRNs' digits.  Default is 2, or binary."""
     if psrn1[0] == None or psrn1[1] == None or psrn2[0] == None or psrn2[1] == None:
         raise ValueError
-    for i in range(len(psrn1[2])):
-        psrn1[2][i] = rg.rndint(digits - 1) if psrn1[2][i] == None else psrn1[2][i]
-    for i in range(len(psrn2[2])):
-        psrn2[2][i] = rg.rndint(digits - 1) if psrn2[2][i] == None else psrn2[2][i]
-    while len(psrn1[2]) < len(psrn2[2]):
-        psrn1[2].append(rg.rndint(digits - 1))
-    while len(psrn1[2]) > len(psrn2[2]):
-        psrn2[2].append(rg.rndint(digits - 1))
-    digitcount = len(psrn1[2])
-    if len(psrn2[2]) != digitcount:
-        raise ValueError
+    digitcount = max(len(psrn1[2]), len(psrn2[2]))
     # Perform addition
-    frac1 = psrn1[1]
-    frac2 = psrn2[1]
-    for i in range(digitcount):
-        frac1 = frac1 * digits + psrn1[2][i]
-    for i in range(digitcount):
-        frac2 = frac2 * digits + psrn2[2][i]
+    frac1 = _psrn_fillto(rg, psrn1, digitcount, digits)
+    frac2 = _psrn_fillto(rg, psrn2, digitcount, digits)
     small = frac1 * psrn1[0] + frac2 * psrn2[0]
     mid1 = frac1 * psrn1[0] + (frac2 + 1) * psrn2[0]
     mid2 = (frac1 + 1) * psrn1[0] + frac2 * psrn2[0]
@@ -912,16 +1468,9 @@ def psrn_add(rg, psrn1, psrn2, digits=2):
         else:
             # Middle, or uniform, part of sum density
             sret = minv + rv
-            cpsrn = [1, 0, [0 for i in range(digitcount)]]
             if sret < 0:
-                sret += 1
-                cpsrn[0] = -1
-            sret = abs(sret)
-            for i in range(digitcount):
-                cpsrn[2][digitcount - 1 - i] = sret % digits
-                sret //= digits
-            cpsrn[1] = sret
-            return cpsrn
+                return _psrn_new(psrn1, -1, -(sret + 1), digitcount, digits)
+            return _psrn_new(psrn1, 1, sret, digitcount, digits)
         if side == 0:  # Left side
             pw = rv
             b = midmin - minv
@@ -935,19 +1484,10 @@ def psrn_add(rg, psrn1, psrn2, digits=2):
             if y < lowerbound:
                 # Success
                 sret = start * (digits**newdigits) + pw
-                cpsrn = [1, 0, [0 for i in range(digitcount + newdigits)]]
+                dcount = digitcount + newdigits
                 if sret < 0:
-                    sret += 1
-                    cpsrn[0] = -1
-                sret = abs(sret)
-                for i in range(digitcount + newdigits):
-                    idx = (digitcount + newdigits) - 1 - i
-                    while idx >= len(cpsrn[2]):
-                        cpsrn[2].append(None)
-                    cpsrn[2][idx] = sret % digits
-                    sret //= digits
-                cpsrn[1] = sret
-                return cpsrn
+                    return _psrn_new(psrn1, -1, -(sret + 1), dcount, digits)
+                return _psrn_new(psrn1, 1, sret, dcount, digits)
             elif y > lowerbound + 1:  # Greater than upper bound
                 # Rejected
                 break
@@ -956,18 +1496,22 @@ def psrn_add(rg, psrn1, psrn2, digits=2):
             b *= digits
             newdigits += 1
 
+def _truncdiv(a, b):
+    # a/b rounded toward zero, where b > 0
+    return a // b if a >= 0 else -(-a // b)
+
+@samplerstats.function("psrn_add_fraction")
 def psrn_add_fraction(rg, psrn, fraction, digits=2):
     if psrn[0] == None or psrn[1] == None:
         raise ValueError
     fraction = Fraction(fraction)
     fracsign = -1 if fraction < 0 else 1
     absfrac = abs(fraction)
-    origfrac = fraction
     isinteger = absfrac.denominator == 1
     # Special cases
     # positive+pos. integer or negative+neg. integer
     if ((fracsign < 0) == (psrn[0] < 0)) and isinteger and len(psrn[2]) == 0:
-        return [fracsign, psrn[1] + int(absfrac), []]
+        return _psrn_new(psrn, fracsign, psrn[1] + int(absfrac), 0, digits)
     # PSRN has no fractional part, fraction is integer
     if (
         isinteger
@@ -976,7 +1520,7 @@ def psrn_add_fraction(rg, psrn, fraction, digits=2):
         and len(psrn[2]) == 0
         and fracsign < 0
     ):
-        return [fracsign, int(absfrac) - 1, []]
+        return _psrn_new(psrn, fracsign, int(absfrac) - 1, 0, digits)
     if (
         isinteger
         and psrn[0] == 1
@@ -984,34 +1528,29 @@ def psrn_add_fraction(rg, psrn, fraction, digits=2):
         and len(psrn[2]) == 0
         and fracsign > 0
     ):
-        return [fracsign, int(absfrac), []]
+        return _psrn_new(psrn, fracsign, int(absfrac), 0, digits)
     if fraction == 0:  # Special case of 0
+        if isinstance(psrn, PSRN):
+            return psrn.copy()
         return [psrn[0], psrn[1], [x for x in psrn[2]]]
     # End special cases
-    for i in range(len(psrn[2])):
-        psrn[2][i] = rg.rndint(digits - 1) if psrn[2][i] == None else psrn[2][i]
     digitcount = len(psrn[2])
     # Perform addition
-    frac1 = psrn[1]
-    frac2 = int(absfrac)
-    fraction = absfrac - frac2
-    for i in range(digitcount):
-        frac1 = frac1 * digits + psrn[2][i]
-    for i in range(digitcount):
-        digit = int(fraction * digits)
-        fraction = (fraction * digits) - digit
-        frac2 = frac2 * digits + digit
+    frac1 = _psrn_fillto(rg, psrn, digitcount, digits)
+    fn = fraction.numerator
+    fd = fraction.denominator
     ddc = digits**digitcount
-    small = Fraction(frac1 * psrn[0], ddc) + origfrac
-    large = Fraction((frac1 + 1) * psrn[0], ddc) + origfrac
+    # The sum is in [minv, maxv]/(fd*digits^digitcount)
+    small = frac1 * psrn[0] * fd + fn * ddc
+    large = (frac1 + 1) * psrn[0] * fd + fn * ddc
     minv = min(small, large)
     maxv = max(small, large)
     while True:
         newdigits = 0
-        b = 1
-        ddc = digits**digitcount
-        mind = int(minv * ddc)
-        maxd = int(maxv * ddc)
+        mn = minv
+        mx = maxv
+        mind = _truncdiv(mn, fd)
+        maxd = _truncdiv(mx, fd)
         rvstart = mind - 1 if minv < 0 else mind
         rvend = maxd if maxv < 0 else maxd + 1
         rv = rg.rndint(rvend - rvstart - 1)
@@ -1022,47 +1561,26 @@ def psrn_add_fraction(rg, psrn, fraction, digits=2):
             rvstartbound = mind if minv < 0 else mind + 1
             rvendbound = maxd - 1 if maxv < 0 else maxd
             if rvs > rvstartbound and rvs < rvendbound:
-                sret = rvs
-                cpsrn = [1, 0, [0 for i in range(digitcount + newdigits)]]
-                if sret < 0:
-                    sret += 1
-                    cpsrn[0] = -1
-                sret = abs(sret)
-                for i in range(digitcount + newdigits):
-                    idx = (digitcount + newdigits) - 1 - i
-                    cpsrn[2][idx] = sret % digits
-                    sret //= digits
-                cpsrn[1] = sret
-                return cpsrn
+                dcount = digitcount + newdigits
+                if rvs < 0:
+                    return _psrn_new(psrn, -1, -(rvs + 1), dcount, digits)
+                return _psrn_new(psrn, 1, rvs, dcount, digits)
             elif rvs <= rvstartbound:
-                rvd = Fraction(rvs + 1, ddc)
-                if rvd <= minv:
-                    # Rejected
-                    break
-                else:
-                    # print(["rvd",rv+rvstart,float(rvd),float(minv)])
-                    newdigits += 1
-                    ddc *= digits
-                    rvstart *= digits
-                    rvend *= digits
-                    mind = int(minv * ddc)
-                    maxd = int(maxv * ddc)
-                    rv = rv * digits + rg.rndint(digits - 1)
-                    rvs = rv + rvstart
-            else:
-                rvd = Fraction(rvs, ddc)
-                if rvd >= maxv:
+                if (rvs + 1) * fd <= mn:
                     # Rejected
                     break
-                else:
-                    newdigits += 1
-                    ddc *= digits
-                    rvstart *= digits
-                    rvend *= digits
-                    mind = int(minv * ddc)
-                    maxd = int(maxv * ddc)
-                    rv = rv * digits + rg.rndint(digits - 1)
-                    rvs = rv + rvstart
+            elif rvs * fd >= mx:
+                # Rejected
+                break
+            newdigits += 1
+            rvstart *= digits
+            rvend *= digits
+            mn *= digits
+            mx *= digits
+            mind = _truncdiv(mn, fd)
+            maxd = _truncdiv(mx, fd)
+            rv = rv * digits + rg.rndint(digits - 1)
+            rvs = rv + rvstart
 
 def psrnexpo(rg):
     count = 0
@@ -1991,10 +2509,95 @@ def lah(n, k):
 # shared with other tasks).
 #
 
+def _cachedev(ev):
+    # Wraps a constructive real's 'ev' method so that the highest-precision
+    # approximation calculated so far is remembered, and any lower-precision
+    # request is answered by rounding that approximation rather than
+    # evaluating the expression again.  If ev(m) is strictly within 1 ulp
+    # of the exact result, then so is ev(m) rounded to n < m bits, since
+    # rounding adds an error of at most 1/2 ulp at n bits and the
+    # error from ev(m) shrinks to 2^(n-m) ulp at n bits.
+    def cachedev(self, n):
+        cn = self.__dict__.get("_evcache_n", -1)
+        if n == cn:
+            return self._evcache_v
+        if n < cn:
+            shift = cn - n
+            return (self._evcache_v + (1 << (shift - 1))) >> shift
+        v = ev(self, n)
+        self._evcache_n = n
+        self._evcache_v = v
+        if samplerstats.active != None:
+            samplerstats.active.add(type(self).__name__ + ".ev", "refinements")
+        return v
+
+    cachedev.__doc__ = ev.__doc__
+    return cachedev
+
+def _cachedfloatinterval(fi):
+    # Wraps a constructive real's '_floatinterval' method so that its
+    # result is remembered until a RandUniform samples new bits (which
+    # can narrow the bounds), so that a long chain of operations, such
+    # as an argument reduction, isn't walked again for each comparison.
+    def cachedfloatinterval(self):
+        d = self.__dict__
+        if d.get("_ficache_bits", -1) == _realbits:
+            return self._ficache_v
+        v = fi(self)
+        self._ficache_bits = _realbits
+        self._ficache_v = v
+        return v
+
+    return cachedfloatinterval
+
+# Maximum number of constructive reals kept by _sharedReal
+_SHARED_REALS_MAX = 4096
+_sharedReals = collections.OrderedDict()
+
+def _sharedReal(cls, arg):
+    # Returns cls(arg), reusing an object previously created
+    # for the same class and argument if it was used recently, so that
+    # expressions that contain the same subexpression, such as logbinco(n, k)
+    # for different k, share its cached approximations.
+    key = (cls, arg)
+    ret = _sharedReals.get(key)
+    if ret != None:
+        _sharedReals.move_to_end(key)
+        return ret
+    ret = cls(arg)
+    _sharedReals[key] = ret
+    if len(_sharedReals) > _SHARED_REALS_MAX:
+        _sharedReals.popitem(last=False)
+    return ret
+
 class Real:
+    # Whether 'ev' results of subclasses are cached; see _cachedev.
+    # Subclasses whose 'ev' is trivial can set this to False, and
+    # lazily sampled reals (RandUniform and the like) must, since
+    # they keep their own digits and answer lower-precision requests
+    # by truncating them rather than by rounding.
+    _evcache = True
+    # Likewise for '_floatinterval' results; see _cachedfloatinterval.
+    _ficache = True
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.__dict__.get("_evcache", True) and "ev" in cls.__dict__:
+            cls.ev = _cachedev(cls.__dict__["ev"])
+        if cls.__dict__.get("_ficache", True) and "_floatinterval" in cls.__dict__:
+            cls._floatinterval = _cachedfloatinterval(cls.__dict__["_floatinterval"])
+
     def ev(self, n):
         raise NotImplementedError
 
+    def _floatinterval(self):
+        # Returns a pair of floats (lo, hi) with lo <= self <= hi,
+        # found with floating-point arithmetic and outward rounding
+        # and without sampling any new random bits, or None if
+        # no such bounds are readily available.  Used by 'realIsLess'
+        # to decide comparisons before any call to 'ev'.
+        return None
+
     def __abs__(a):
         return -a if a.isNegative() else a
 
@@ -2094,6 +2697,12 @@ class RealPi(Real):
     def __repr__(self):
         return "RealPi(%s)" % (self.fraction)
 
+    def _floatinterval(self):
+        # math.pi is pi correctly rounded, and float(self.fraction)
+        # and the product are correctly rounded too, so the result
+        # is off by at most about 2 ulps.
+        return _floatwiden(float(self.fraction) * math.pi)
+
     def ev(self, n):
         if self.fraction == 0:
             return 0
@@ -2309,11 +2918,11 @@ class RealLogGammaInt(Real):
             # Schumacher's convergent series converges
             # slowly for small 'a'; just use ln((a-1)!) instead
             # (subtraction by 1 already happened above)
-            self.r = RealLn(math.factorial(a))
+            self.r = _sharedReal(RealLn, math.factorial(a))
         else:
             if RealLogGammaInt._logPi == None:
                 RealLogGammaInt._logPi = RealLn(RealPi(2))
-            logn = RealLn(a)
+            logn = _sharedReal(RealLn, a)
             self.r = (
                 a * logn
                 - a
@@ -2372,19 +2981,19 @@ class _RealLogGammaIntHelper(Real):
 def logbinco(n, k):
     # Log binomial coefficient.
     if k + 1 == (n - k) + 1:
-        r = RealLogGammaInt(n + 1) - RealLogGammaInt(k + 1) * 2
+        r = _sharedReal(RealLogGammaInt, n + 1) - _sharedReal(RealLogGammaInt, k + 1) * 2
     else:
         r = (
-            RealLogGammaInt(n + 1)
-            - RealLogGammaInt(k + 1)
-            - RealLogGammaInt((n - k) + 1)
+            _sharedReal(RealLogGammaInt, n + 1)
+            - _sharedReal(RealLogGammaInt, k + 1)
+            - _sharedReal(RealLogGammaInt, (n - k) + 1)
         )
     return r
 
 def logbinprob(n, k):
     # Log of binomial probability, that is, the log of the probability
     # that exactly k zeros occur among n unbiased random bits.
-    divisor = RealLn(2) * n  # ln(2)*n = ln(2**n)
+    divisor = _sharedReal(RealLn, 2) * n  # ln(2)*n = ln(2**n)
     return logbinco(n, k) - divisor
 
 def logpoisson(lamda, n):
@@ -2790,6 +3399,12 @@ class RealExp(Real):
     def __repr__(self):
         return "RealExp(%s)" % (self.a)
 
+    def _floatinterval(self):
+        ia = self.a._floatinterval()
+        if ia is None:
+            return None
+        return _floatwiden(_floatexp(ia[0]), _floatexp(ia[1]))
+
     def isNegative():
         return False
 
@@ -2955,6 +3570,33 @@ class RealPow(Real):
         else:
             return "RealPow(%s,%s)" % (self.a, self.b)
 
+    def _floatinterval(self):
+        if self.r != None:
+            return self.r._floatinterval()
+        if self.powint == None and not self.is_sqrt:
+            return None
+        ia = self.a._floatinterval()
+        if ia is None:
+            return None
+        lo, hi = ia
+        if self.is_sqrt:
+            if lo < 0:
+                return None
+            return _floatwiden(math.sqrt(lo), math.sqrt(hi))
+        # Float '**' is not correctly rounded, so take the power
+        # exactly and round once (for moderate powers only, since
+        # the exact power grows with k).
+        k = self.powint
+        if k > 1024:
+            return None
+        plo = float(Fraction(lo) ** k)
+        phi = float(Fraction(hi) ** k)
+        if k % 2 == 1 or lo >= 0:
+            return _floatwiden(plo, phi)
+        if hi <= 0:
+            return _floatwiden(phi, plo)
+        return _floatwiden(0.0, max(plo, phi))
+
     def ev(self, n):
         if self.is_sqrt:
             # Square root special case
@@ -3047,6 +3689,16 @@ class RealDivide(Real):
     def __repr__(self):
         return "RealDivide(%s,%s)" % (self.a, self.b)
 
+    def _floatinterval(self):
+        ia = self.a._floatinterval()
+        if ia is None:
+            return None
+        ib = self.b._floatinterval()
+        if ib is None or ib[0] <= 0 <= ib[1]:
+            return None
+        q = (ia[0] / ib[0], ia[0] / ib[1], ia[1] / ib[0], ia[1] / ib[1])
+        return _floatwiden(min(q), max(q))
+
     def ev(self, n):
         # Use best approximation calculated so far
         # to save time when n is no greater than that
@@ -3118,6 +3770,8 @@ class RandPSRN(Real):
     # Constructive real operation
     # that takes a positive uniform PSRN with base-2
     # fractional digits as input.
+    _evcache = False
+
     def __init__(self, a):
         self.psrn = a
 
@@ -3145,9 +3799,16 @@ _realbits = 0
 
 class RandUniform(Real):
     # Random uniform real number in the interval (0, 1).
-    def __init__(self):
+    # 'rg', if given, is an object with a 'randbits(k)' method (such
+    # as RandomGen) that supplies the random bits; otherwise they come
+    # from the 'random' module.
+    _evcache = False
+    _ficache = False
+
+    def __init__(self, rg=None):
         self.bits = 0
         self.count = 0
+        self.rg = rg
 
     def isNegative(self):  # NOTE: Negative with probability 1
         return False
@@ -3155,6 +3816,17 @@ class RandUniform(Real):
     def __repr__(self):
         return "RandUniform(%s,%s)" % (self.bits, self.count)
 
+    def _floatinterval(self):
+        # Bounds from the bits sampled so far; both are exact
+        # since they have no more than 53 significant bits.
+        # With no bits sampled yet, the bounds (0, 1) rarely decide
+        # a comparison, so don't bother.
+        if self.count == 0:
+            return None
+        k = min(self.count, 53)
+        t = self.bits >> (self.count - k)
+        return (math.ldexp(t, -k), math.ldexp(t + 1, -k))
+
     def ev(self, n):
         # NOTE: Strictly within 1 ulp with probability 1,
         # rather than always
@@ -3163,7 +3835,13 @@ class RandUniform(Real):
         if n1 > self.count:
             diff = n1 - self.count
             _realbits += diff
-            self.bits = (self.bits << diff) + random.randint(0, (1 << diff) - 1)
+            if samplerstats.active != None:
+                samplerstats.active.add("RandUniform.ev", "bits", diff)
+            self.bits = (self.bits << diff) + (
+                random.randint(0, (1 << diff) - 1)
+                if self.rg == None
+                else self.rg.randbits(diff)
+            )
             self.count = n1
         ret = self.bits >> (self.count - n)
         # At this point, with probability one, ret/2^n is accurate
@@ -3171,6 +3849,8 @@ class RandUniform(Real):
         return ret
 
 class RealFraction(Real):
+    _evcache = False
+
     def __init__(self, a, b=None):
         if isinstance(a, Real):
             raise ValueError
@@ -3195,6 +3875,10 @@ class RealFraction(Real):
     def toFraction(self):
         return Fraction(self.num, self.den)
 
+    def _floatinterval(self):
+        # NOTE: Division of two integers is correctly rounded
+        return _floatwiden(self.num / self.den)
+
     def isDefinitelyZero(self):
         return self.num == 0
 
@@ -3304,12 +3988,18 @@ class RealFraction(Real):
         return fracEV(self.num, self.den, n)
 
 class RealNegate(Real):
+    _evcache = False
+
     def __init__(self, a):
         self.a = a if isinstance(a, Real) else RealFraction(a)
 
     def __repr__(self):
         return "RealNegate(%s)" % (self.a)
 
+    def _floatinterval(self):
+        ia = self.a._floatinterval()
+        return None if ia is None else (-ia[1], -ia[0])
+
     def ev(self, n):
         return -self.a.ev(n)
 
@@ -3321,6 +4011,15 @@ class RealSubtract(Real):
     def __repr__(self):
         return "RealSubtract(%s,%s)" % (self.a, self.b)
 
+    def _floatinterval(self):
+        ia = self.a._floatinterval()
+        if ia is None:
+            return None
+        ib = self.b._floatinterval()
+        if ib is None:
+            return None
+        return _floatwiden(ia[0] - ib[1], ia[1] - ib[0])
+
     def ev(self, n):
         r = self.a.ev(n + 2) - self.b.ev(n + 2)
         return (r // 4) + 1 if r % 4 >= 2 else (r // 4)
@@ -3335,6 +4034,15 @@ class RealAdd(Real):
     def __repr__(self):
         return "RealAdd(%s,%s)" % (self.a, self.b)
 
+    def _floatinterval(self):
+        ia = self.a._floatinterval()
+        if ia is None:
+            return None
+        ib = self.b._floatinterval()
+        if ib is None:
+            return None
+        return _floatwiden(ia[0] + ib[0], ia[1] + ib[1])
+
     def ev(self, n):
         # Use best approximation calculated so far
         # to save time when n is no greater than that
@@ -3687,6 +4395,12 @@ class RealLn(Real):
     def __repr__(self):
         return "RealLn(%s)" % (self.a)
 
+    def _floatinterval(self):
+        ia = self.a._floatinterval()
+        if ia is None or ia[0] <= 0:
+            return None
+        return _floatwiden(_floatlog(ia[0]), _floatlog(ia[1]))
+
     def _log(infnum, infden, supnum, supden, bits):
         inf = RealLn._logbounds(infnum, infden, bits)
         sup = RealLn._logbounds(supnum, supden, bits)
@@ -3907,6 +4621,46 @@ def realIsLessOrEqual(a, b):
         return Fraction(a.num, a.den) <= Fraction(b.num, b.den)
     return realIsLess(a, b)
 
+def _floatwiden(lo, hi=None):
+    # Widens the interval [lo, hi] outward to cover the rounding
+    # error of the floating-point operations that produced it.
+    # Each bound must come from a correctly rounded operation
+    # (+, -, *, /, sqrt, int or Fraction to float, or the
+    # Decimal-based _floatexp and _floatlog), or a short chain
+    # of them on exact inputs, so it is off by at most a couple
+    # of ulps; the slack is at least 4 ulps, and at least the
+    # smallest subnormal number near 0.  Returns None if either
+    # bound is not finite.
+    if hi is None:
+        hi = lo
+    lo -= abs(lo) * _FLOATSLACK + _FLOATTINY
+    hi += abs(hi) * _FLOATSLACK + _FLOATTINY
+    if math.isfinite(lo) and math.isfinite(hi):
+        return (lo, hi)
+    return None
+
+_FLOATSLACK = 2.0**-50
+_FLOATTINY = math.ulp(0.0)
+_FLOATCONTEXT = decimal.Context(prec=20)
+
+def _floatexp(x):
+    # exp(x) correctly rounded to a float, apart from a
+    # relative error of 10^-19 or less.  Unlike math.exp, whose
+    # accuracy depends on the platform's C library, Decimal's
+    # exp is correctly rounded.  Raises decimal.Overflow if
+    # the result is too big.
+    return float(_FLOATCONTEXT.exp(decimal.Decimal(x)))
+
+def _floatlog(x):
+    # ln(x) for x > 0, with the same accuracy as _floatexp.
+    return float(_FLOATCONTEXT.ln(decimal.Decimal(x)))
+
+def _realfloatinterval(a):
+    try:
+        return a._floatinterval()
+    except (ArithmeticError, ValueError):
+        return None
+
 def realIsLess(a, b):
     if isinstance(a, int):
         a = Fraction(a)
@@ -3923,10 +4677,29 @@ def realIsLess(a, b):
     a = a if isinstance(a, Real) else RealFraction(a)
     b = b if isinstance(b, Real) else RealFraction(b)
     n = 3
+    # First try to decide the comparison with floating-point
+    # bounds on both numbers, which cost no 'ev' calls and
+    # no new random bits.
+    ia = _realfloatinterval(a)
+    ib = None if ia is None else _realfloatinterval(b)
+    if ib is not None:
+        if ia[1] < ib[0] or ib[1] < ia[0]:
+            if samplerstats.active != None:
+                samplerstats.active.add("realIsLess", "floatdecided")
+            return ia[1] < ib[0]
+        # The bounds overlap, so a and b differ by no more
+        # than the widths of their bounds; the comparison
+        # can't be decided with fewer bits than that, so
+        # start there.
+        width = max(ia[1] - ia[0], ib[1] - ib[0])
+        if width > 0:
+            n = max(n, -math.frexp(width)[1])
     # print(["a",a])
     # print(["b",b])
     # print([a.disp(),b.disp()])
     while True:
+        if samplerstats.active != None:
+            samplerstats.active.add("realIsLess", "iterations")
         aa = a.ev(n)
         bb = b.ev(n)
         # print([n,a,b,aa,bb])
@@ -3934,7 +4707,9 @@ def realIsLess(a, b):
             return False
         if bb - 2 >= aa:
             return True
-        n += 3
+        # Step by 3 bits at first, then geometrically, since
+        # comparisons not decided by then are between close numbers
+        n += max(3, n // 4)
 
 def realIsGreater(a, b):
     return realIsLess(b, a)
@@ -3961,6 +4736,9 @@ class RealSqrt(Real):
     def __repr__(self):
         return "RealSqrt(%s)" % (self.a)
 
+    def _floatinterval(self):
+        return self.a._floatinterval()
+
     def ev(self, n):
         return self.a.ev(n)
 
@@ -3987,6 +4765,16 @@ class RealMultiply(Real):
     def __repr__(self):
         return "RealMultiply(%s,%s)" % (self.a, self.b)
 
+    def _floatinterval(self):
+        ia = self.a._floatinterval()
+        if ia is None:
+            return None
+        ib = self.b._floatinterval()
+        if ib is None:
+            return None
+        p = (ia[0] * ib[0], ia[0] * ib[1], ia[1] * ib[0], ia[1] * ib[1])
+        return _floatwiden(min(p), max(p))
+
     def mul(a, b):
         # if isinstance(a,RealMultiply):
         #   print([type(a.a),type(a.b)])
@@ -4215,6 +5003,8 @@ def realGamma(ml):
     return ret
 
 class RandUniformIntFrac(Real):
+    _evcache = False
+
     def __init__(self, i, f):
         if i < 0:
             raise ValueError
@@ -4224,10 +5014,18 @@ class RandUniformIntFrac(Real):
     def __repr__(self):
         return "RandUniformIntFrac(%s,%s)" % (self.i, self.f)
 
+    def _floatinterval(self):
+        f = self.f._floatinterval()
+        if f is None:
+            return None
+        return _floatwiden(self.i + f[0], self.i + f[1])
+
     def ev(self, n):
         return (self.i << n) + self.f.ev(n)
 
 class RandUniformNegIntFrac(Real):
+    _evcache = False
+
     def __init__(self, i, f):
         if i < 0:
             raise ValueError
@@ -4237,6 +5035,12 @@ class RandUniformNegIntFrac(Real):
     def __repr__(self):
         return "RandUniformNegIntFrac(%s,%s)" % (self.i, self.f)
 
+    def _floatinterval(self):
+        f = self.f._floatinterval()
+        if f is None:
+            return None
+        return _floatwiden(-self.i - f[1], -self.i - f[0])
+
     def ev(self, n):
         return -((self.i << n) + self.f.ev(n))
 
@@ -4791,7 +5595,7 @@ class PiecewiseBernstein:
             raise ValueError
         return poly.diff(point, d=d)
 
-def approxCoefficients(pwp, tol=Fraction(1,1024):
+def approxCoefficients(pwp, tol=Fraction(1,1024)):
   # Compute approximate Bernstein coefficients
   # for a piecewise polynomial, with the specified
   # error tolerance.  The piecewise polynomial must
@@ -4855,6 +5659,15 @@ def iteratedPolyExample():
 
 ######################
 
+# Imported last: randomgen imports this module's names with
+# 'from betadist import *', so they must all exist by the time
+# importing this module leads to importing randomgen
+try:
+    import bernoulli
+    import randomgen
+except:
+    pass
+
 if __name__ == "__main__":
     # The following code tests some of the methods in this module.
 
@@ -1,6 +1,7 @@
 import random
 import randomgen
 import math
+import collections
 from fractions import Fraction
 from betadist import (
     logbinco,
@@ -13,13 +14,152 @@ from betadist import (
     realIsLess,
 )
 
+# Number of bits of a uniform random variate examined in throughput mode
+# before falling back to exact arithmetic
+_UNIFORMBITS = 64
+# Number of fractional bits of the fixed-point logarithm bounds used
+# in throughput mode
+_LNBITS = 80
+
+def _atanhfixed(num, den):
+    # Returns integers (lo, hi) such that lo <= atanh(num/den)*2^_LNBITS <= hi,
+    # where 0 <= num/den <= 1/3, using the series
+    # atanh(z) = z + z^3/3 + z^5/5 + ...  The lower bound rounds every
+    # step down.  The upper bound rounds every step up, and adds 1 for
+    # the terms not summed, each at most 1/9 of the one before.
+    z = (num << _LNBITS) // den
+    z2 = (z * z) >> _LNBITS
+    lo = z
+    p = z
+    i = 1
+    while p > 0:
+        i += 2
+        p = (p * z2) >> _LNBITS
+        lo += p // i
+    z += 1
+    z2 = -((-z * z) >> _LNBITS)
+    hi = z
+    p = z
+    i = 1
+    while p > 1:
+        i += 2
+        p = -((-p * z2) >> _LNBITS)
+        hi += -(-p // i)
+    return (lo, hi + 1)
+
+def _lnfixed(x):
+    # Returns integers (lo, hi) such that lo <= ln(x)*2^_LNBITS <= hi,
+    # where x is a positive integer, using ln(x) = e*ln(2) + ln(c) + ln(y),
+    # where c = 1 + j/32 is x/2^e rounded down to five fractional bits
+    # and y = x/(c*2^e) is in [1, 1 + 1/32], and ln(y) = 2*atanh((y-1)/(y+1)).
+    e = x.bit_length() - 1
+    c = (x << 5) >> e
+    ce = c << e
+    alo, ahi = _atanhfixed((x << 5) - ce, (x << 5) + ce)
+    clo, chi = _LNTABLE[c - 32]
+    return (
+        e * _LN2FIXED[0] + clo + 2 * alo,
+        e * _LN2FIXED[1] + chi + 2 * ahi,
+    )
+
+_LN2FIXED = tuple(2 * v for v in _atanhfixed(1, 3))
+# Bounds on ln(1 + j/32)*2^_LNBITS for each j in [0, 32), from
+# ln(1 + j/32) = 2*atanh(j/(64 + j))
+_LNTABLE = [tuple(2 * v for v in _atanhfixed(j, 64 + j)) for j in range(32)]
+
+def _lnratiofixed(a, b):
+    # Bounds on ln(a/b)*2^_LNBITS for positive integers a and b
+    alo, ahi = _lnfixed(a)
+    blo, bhi = _lnfixed(b)
+    return (alo - bhi, ahi - blo)
+
+def _expfixed(lo, hi):
+    # Returns integers (elo, ehi) such that elo <= exp(x)*2^_LNBITS <= ehi,
+    # where lo <= x*2^_LNBITS <= hi, using exp(x) = 2^-q * exp(x + q*ln(2))
+    # with q chosen so that 0 <= x + q*ln(2) < 1, and the series
+    # exp(r) = 1 + r + r^2/2! + ...  The lower bound rounds every step
+    # down; the upper bound rounds every step up and adds 1 for the terms
+    # not summed, each at most half the one before.
+    ln2lo, ln2hi = _LN2FIXED
+    if lo < 0:
+        q = -(lo // ln2lo)
+        r = lo + q * ln2lo
+    else:
+        q = -(lo // ln2hi)
+        r = lo + q * ln2hi
+    elo = p = 1 << _LNBITS
+    i = 0
+    while p > 0:
+        i += 1
+        p = ((p * r) >> _LNBITS) // i
+        elo += p
+    elo = elo >> q if q >= 0 else elo << -q
+    if hi < 0:
+        q = -(hi // ln2hi)
+        r = hi + q * ln2hi
+    else:
+        q = -(hi // ln2lo)
+        r = hi + q * ln2lo
+    ehi = p = 1 << _LNBITS
+    i = 0
+    while p > 1:
+        i += 1
+        p = -((-p * r) >> _LNBITS)
+        p = -(-p // i)
+        ehi += p
+    ehi += 1
+    ehi = -(-ehi >> q) if q >= 0 else ehi << -q
+    return (elo, ehi)
+
+# Bounds on ln(2*pi)*2^_LNBITS, from pi's first 36 digits
+_PI35 = 314159265358979323846264338327950288
+_LN2PIFIXED = (
+    _LN2FIXED[0] + _lnratiofixed(_PI35, 10**35)[0],
+    _LN2FIXED[1] + _lnratiofixed(_PI35 + 1, 10**35)[1],
+)
+
+def _lnfactfixed(n):
+    # Returns integers (lo, hi) such that lo <= ln(n!)*2^_LNBITS <= hi,
+    # using ln(n!) = ln(2*pi)/2 + (n+1/2)*ln(n) - n + r, where
+    # 1/(12*n+1) < r < 1/(12*n) (H. Robbins, "A Remark on Stirling's
+    # Formula", American Mathematical Monthly 62, 1955).  For small n,
+    # where those bounds on r are far apart, n! is found exactly instead.
+    if n <= 1:
+        return (0, 0)
+    if n < 256:
+        return _lnfixed(math.factorial(n))
+    lo, hi = _lnfixed(n)
+    nn = n << _LNBITS
+    rlo = (1 << _LNBITS) // (12 * n + 1)
+    rhi = -(-(1 << _LNBITS) // (12 * n))
+    return (
+        ((_LN2PIFIXED[0] + (2 * n + 1) * lo) >> 1) - nn + rlo,
+        -((-_LN2PIFIXED[1] - (2 * n + 1) * hi) >> 1) - nn + rhi,
+    )
+
 class BinomialSampler:
-    def __init__(self, rg=None):
+    def __init__(self, rg=None, throughput=False, cachesize=65536):
+        """Creates a sampler of binomial(n, 1/2) random variates.
+        - rg: RandomGen object to draw random bits from.  Default is a
+          new RandomGen object.
+        - throughput: If True, first compares the acceptance probability
+          with a uniform random variate using fixed-point integer bounds
+          (cached for each n and candidate value) whose rounding errors
+          are accounted for, and uses constructive-real arithmetic, with the
+          same uniform variate, only when those bounds can't decide the
+          comparison.  Default is False.
+        - cachesize: Maximum number of such bounds to cache in throughput
+          mode, discarding the least recently used first.  Default is 65536.
+        """
         self.rg = randomgen.RandomGen() if rg == None else rg
         self.logcache = {}
         self.binomialinfo = {}
         self.bits = 0
         self.curbit = -1
+        self.throughput = throughput
+        self.cachesize = cachesize
+        self.boundcache = collections.OrderedDict()
+        self.fastinfo = {}
 
     def _logint(self, n):
         if not n in self.logcache:
@@ -92,15 +232,89 @@ class BinomialSampler:
             if rv >= 0 and rv <= n2:
                 # psrn = psrnexpo(self.rg)
                 # psrn[0] = -1  # Negate
+                if self.throughput:
+                    if self._acceptfast(n2, rv, m, k):
+                        return rv
+                    continue
                 if not (rv in bincos):
                     bincos[rv] = None
                 if bincos[rv] == None:
-                    # Calculate log of acceptance probability on demand
-                    bincos[rv] = (
-                        logbinco(n2, rv)
-                        + self._logint(m)
-                        + self._logint(2) * (k - n2 - 2)
-                    )
-                h = RealLn(RandUniform())
-                if realIsLess(h, bincos[rv]):
+                    bincos[rv] = self._logaccept(n2, rv, m)
+                h = RealLn(RandUniform(self.rg))
+                if realIsLess(h, bincos[rv] + self._logint(2) * k):
                     return rv
+
+    def _logaccept(self, n2, rv, m):
+        # Log of acceptance probability, except for the
+        # term ln(2)*k, which depends on the sampled 'k'
+        return logbinco(n2, rv) + self._logint(m) + self._logint(2) * (-n2 - 2)
+
+    def _acceptfast(self, n2, rv, m, k):
+        # Throughput mode: decides whether ln(U) < L + ln(2)*k, or
+        # U < exp(L)*2^k, where U is uniform and L is the log acceptance
+        # probability.  Bounds on exp(L) are found with fixed-point
+        # integer arithmetic whose rounding errors are accounted for,
+        # so they are valid on any platform.
+        key = (n2, rv)
+        bounds = self.boundcache.get(key)
+        if bounds == None:
+            # L = ln(n2!) - ln(rv!) - ln((n2-rv)!) + ln(m) - ln(2)*(n2+2),
+            # where the terms not depending on rv are kept per n2
+            fn = self.fastinfo.get(n2)
+            if fn == None:
+                fn = _lnfactfixed(n2)
+                lm = _lnfixed(m)
+                fn = (
+                    fn[0] + lm[0] - _LN2FIXED[1] * (n2 + 2),
+                    fn[1] + lm[1] - _LN2FIXED[0] * (n2 + 2),
+                )
+                self.fastinfo[n2] = fn
+            fk = _lnfactfixed(rv)
+            fnk = _lnfactfixed(n2 - rv)
+            bounds = _expfixed(fn[0] - fk[1] - fnk[1], fn[1] - fk[0] - fnk[0])
+            self.boundcache[key] = bounds
+            if len(self.boundcache) > self.cachesize:
+                self.boundcache.popitem(last=False)
+        else:
+            self.boundcache.move_to_end(key)
+        u = self.rg.randbits(_UNIFORMBITS)
+        # U lies in [u/2^64, (u+1)/2^64]; compare both ends with
+        # exp(L)*2^k, all scaled by 2^(_LNBITS+64)
+        sh = k + _UNIFORMBITS
+        if ((u + 1) << _LNBITS) <= (bounds[0] << sh):
+            return True
+        if (u << _LNBITS) >= (bounds[1] << sh):
+            return False
+        # Ambiguous; compare exactly, with U's first bits already known
+        h = RandUniform(self.rg)
+        h.bits = u
+        h.count = _UNIFORMBITS
+        return realIsLess(RealLn(h), self._logaccept(n2, rv, m) + self._logint(2) * k)
+
+    def sample_rational(self, n, p):
+        """Draws a binomial(n, p) random variate, where 'p' is a rational
+        number in [0, 1] (an int, a Fraction, or a 'float', which is converted
+        exactly to a Fraction).  Each trial succeeds if a uniform random
+        variate is less than p; this method splits the trials according to
+        the binary digits of those uniform variates, using a binomial(m, 1/2)
+        variate (from 'sample') to count the trials whose next digit is 0
+        among the m trials still undecided.  This takes
+        O(log n) calls to 'sample' on average, each taking constant
+        expected time in n, so the result is exact for every p and
+        the cost grows only logarithmically in n.
+
+        Reference:
+        M. Farach-Colton and M.-T. Tsai, "Exact Sublinear Binomial Sampling",
+        Algorithmica 73(4), 2015 (proof of Theorem 2).
+        """
+        p = Fraction(p)
+        if p < 0 or p > 1 or n < 0:
+            raise ValueError
+        if p == 1:
+            return n
+        return randomgen._binomialrational(self.sample, n, p)
+
+    def sample_n(self, n, count):
+        """Draws 'count' binomial(n, 1/2) random variates and returns them
+        in a list."""
+        return [self.sample(n) for _ in range(count)]
@@ -1,5 +1,6 @@
 from fractions import Fraction
 from betadist import *
+import bernoulli
 import time
 import math
 import random
@@ -434,19 +435,13 @@ class C4Function:
         """- coin(): Function that returns 1 or 0 with a fixed probability."""
         return simulate(coin, self.fbelow, self.fabove, self.fbound, self.nextdegree)
 
-def _fb2(fbelow, a, b, v=1):
-    if b > a:
-        raise ValueError
-    return Fraction(realFloor(fbelow(a, b) * v), v)
+def _reallow(f, n, k, v):
+    return realFloor(f(n, k) * v)
 
-def _fa2(fabove, a, b, v=1):
-    if b > a:
-        raise ValueError
-    mv = realFloor(fabove(a, b) * v)
-    imv = int(mv)
-    return Fraction(imv, v) if mv == imv else Fraction(imv + 1, v)
+def _realhigh(f, n, k, v):
+    return realCeiling(f(n, k) * v)
 
-def simulate(coin, fbelow, fabove, fbound, nextdegree=None):
+def simulate(coin, fbelow, fabove, fbound, nextdegree=None, cache=True):
     """A Bernoulli factory for a continuous function f(x) that maps [0, 1]
      to [0, 1] (and where f(x) is polynomially bounded).  Returns either 1
      with probability f(x) (where x is the probability that the specified coin
@@ -464,12 +459,14 @@ def simulate(coin, fbelow, fabove, fbound, nextdegree=None):
        must return an integer greater than n.
        Optional.  If not given, the first degree is 1 and the next degree is n*2
        (so that for each power of 2 as well as 1, a polynomial of that degree
-       must be specified)."""
+       must be specified).
+    - cache: If True (the default), the coefficients found by fbelow and fabove
+      are kept between calls with the same fbelow and fabove, as in
+      Bernoulli.simulate in bernoulli.py.  fbelow and fabove must then always
+      return the same value for the same arguments."""
     ones = 0
     lastdegree = 0
-    l = Fraction(0)
     lt = Fraction(0)
-    u = Fraction(1)
     ut = Fraction(1)
     degree = nextdegree(0) if nextdegree != None else 1
     while True:
@@ -477,65 +474,13 @@ def simulate(coin, fbelow, fabove, fbound, nextdegree=None):
         if fb[0] >= 0 and fb[1] <= 1:
             break
         degree = nextdegree(degree) if nextdegree != None else degree * 2
-    startdegree = degree
+    fc = bernoulli._simulatecache(fbelow, fabove, _reallow, _realhigh, cache)
     ret = RandUniform()
-    correctness = False
-    if correctness:
-        fba = {}
-        faa = {}
     while True:
         for i in range(degree - lastdegree):
             if coin() == 1:
                 ones += 1
-        c = math.comb(degree, ones)
-        md = degree
-        l = _fb2(fbelow, degree, ones, c << md)
-        u = _fa2(fabove, degree, ones, c << md)
-        if correctness:
-            fba[(degree, ones)] = l
-            faa[(degree, ones)] = u
-        ls = Fraction(0)
-        us = Fraction(1)
-        if degree > startdegree:
-            nh = math.comb(degree, ones)
-            md = lastdegree
-            combs = [
-                Fraction(
-                    math.comb(degree - lastdegree, ones - j) * math.comb(lastdegree, j),
-                    nh,
-                )
-                for j in range(0, min(lastdegree, ones) + 1)
-            ]
-            if correctness:  # Correctness check
-                for j in range(0, min(lastdegree, ones) + 1):
-                    fb = _fb2(
-                        fbelow, lastdegree, j, (1 * math.comb(lastdegree, j)) << md
-                    )
-                    if (lastdegree, j) in fba:
-                        # print(fb)
-                        if fba[(lastdegree, j)] != fb:
-                            raise ValueError
-                    fa = _fa2(
-                        fabove, lastdegree, j, (1 * math.comb(lastdegree, j)) << md
-                    )
-                    if (lastdegree, j) in faa:
-                        # print(fa)
-                        if faa[(lastdegree, j)] != fa:
-                            raise ValueError
-            ls = sum(
-                _fb2(fbelow, lastdegree, j, (1 * math.comb(lastdegree, j)) << md)
-                * combs[j]
-                for j in range(0, min(lastdegree, ones) + 1)
-            )
-            us = sum(
-                _fa2(fabove, lastdegree, j, (1 * math.comb(lastdegree, j)) << md)
-                * combs[j]
-                for j in range(0, min(lastdegree, ones) + 1)
-            )
-            if l < ls:
-                raise ValueError
-            if us < u:
-                raise ValueError
+        l, u, ls, us = fc.bounds(lastdegree, degree, ones)
         m = (ut - lt) / (us - ls)
         lt = lt + (l - ls) * m
         ut = ut - (us - u) * m
@@ -11,6 +11,7 @@ import math
 from randomgen import RandomGen, FastLoadedDiceRoller
 from fractions import Fraction
 from interval import FInterval
+import samplerstats
 
 class MooreSampler:
     """
@@ -254,6 +255,10 @@ class MooreSampler:
             s = self._sample(trials)
             self.accepts += 1
             self.totaltrials += s[1]
+            if samplerstats.active != None:
+                samplerstats.active.add(
+                    "MooreSampler.sample", "rejections", s[1] - (s[0] != None)
+                )
             if (s[0] == None or s[1] >= 5) and len(self.boxes) < 100000:
                 # print(["accept",self.acceptRate()])
                 for i in range(10):
@@ -320,6 +325,8 @@ class MooreSampler:
                     break
         return [None, trials]
 
+samplerstats.register(MooreSampler)
+
 if __name__ == "__main__":
 
     def bucket(v, ls, buckets):
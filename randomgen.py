@@ -11,13 +11,66 @@ creativecommons.org/publicdomain/zero/1.0/
 
 # TODO: Use betadist's PSRN methods here somehow
 
+import array
+import bisect
+import collections
+import hashlib
+import itertools
 import math
+import mmap
+import os
 import random
+import struct
+import sys
 from fractions import Fraction
 from betadist import *
+import samplerstats
 
 _SIGBITS = 53
 _FLOAT_MAX = 1.7976931348623157e308
+# Maximum number of samplers cached by RandomGen.weighted_sampler
+_WEIGHTED_SAMPLER_CACHE_SIZE = 64
+# Minimum number of trials for which binomial_int uses binomial.BinomialSampler
+_BINOMIAL_SAMPLER_TRIALS = 1 << 12
+_weightedSamplerCache = collections.OrderedDict()
+# Default maximum total size, in bytes, of the binomial(n, 1/2)
+# alias tables cached by RandomGen._getaliastable
+_BINOMIAL_TABLE_CACHE_BYTES = 32 << 20
+# Largest number of trials for which a binomial alias table keeps the
+# rows it builds when sampling from its failure distribution; each row
+# has about n entries of n bits each
+_BINOMIAL_FAILURE_CACHE_TRIALS = 2048
+# Number of binary digits chosen at once by the layer tables of
+# RandomGen.exponential_psrn; there are 2^_ZIG_LAYERBITS layers
+_ZIG_LAYERBITS = 8
+_zigTables = None
+# Array type codes for each supported word width in RandomBitPool
+_WORDTYPECODES = {}
+for _tc in "BHILQ":
+    _WORDTYPECODES.setdefault(array.array(_tc).itemsize * 8, _tc)
+
+def _binomialrational(half, n, p):
+    # Draws a binomial(n, p) random variate, where 'p' is a Fraction
+    # in [0, 1), given a function 'half(m)' that draws a binomial(m, 1/2)
+    # variate.  Each trial succeeds if a uniform random variate is less
+    # than p; the trials are split according to the binary digits of
+    # those variates, with half(m) counting the trials whose next digit
+    # is 0 among the m trials still undecided, as in the proof of
+    # Theorem 2 in Farach-Colton and Tsai, "Exact Sublinear Binomial
+    # Sampling", Algorithmica 73(4), 2015.
+    count = 0
+    while n > 0 and p > 0:
+        c = half(n)
+        p *= 2
+        if p >= 1:
+            # Uniform digit 0 and p's digit 1: those 'c' trials succeed
+            count += c
+            n -= c
+            p -= 1
+        else:
+            # Uniform digit 1 and p's digit 0: the other trials fail
+            n = c
+    return count
 
 def _mean(list):
     if len(list) <= 1:
@@ -73,7 +126,233 @@ def numericalTable(func, x, y, n=100):
     ret = [x + (y - x) * (i * 1.0 / n) for i in range(n + 1)]
     return [[func(b), b] for b in ret]
 
-class VoseAlias:
+def _randbitsfunc(randgen):
+    # Returns a function that takes 'k' and returns a 'k'-bit random
+    # integer from 'randgen', for batch samplers that read bits a word
+    # at a time rather than calling 'randbit' once per bit
+    if hasattr(randgen, "randbits"):
+        return randgen.randbits
+    return lambda k: randgen.rndint((1 << k) - 1)
+
+_SAMPLER_MAGIC = b"RGSAMPL1"
+
+def _encodevalue(out, v):
+    # Appends a tagged binary form of 'v' to the bytearray 'out'.
+    # Arrays are stored raw at 8-byte-aligned offsets so that they can be
+    # read back as views of a memory-mapped file.
+    if v is None:
+        out += b"N"
+    elif v is True or v is False:
+        out += b"T" if v else b"F"
+    elif isinstance(v, int):
+        if -(1 << 63) <= v < (1 << 63):
+            out += b"q" + struct.pack("<q", v)
+        else:
+            b = v.to_bytes(v.bit_length() // 8 + 1, "little", signed=True)
+            out += b"I" + struct.pack("<Q", len(b)) + b
+    elif isinstance(v, float):
+        out += b"d" + struct.pack("<d", v)
+    elif isinstance(v, Fraction):
+        out += b"r"
+        _encodevalue(out, v.numerator)
+        _encodevalue(out, v.denominator)
+    elif isinstance(v, str):
+        b = v.encode("utf-8")
+        out += b"s" + struct.pack("<Q", len(b)) + b
+    elif isinstance(v, (array.array, memoryview)):
+        tc = v.typecode if isinstance(v, array.array) else v.format
+        _encodearray(out, b"a", tc, v)
+    elif isinstance(v, (list, tuple)):
+        # Store long lists of machine integers or of floats as arrays
+        tc = None
+        if len(v) >= 8 and all(type(x) == int for x in v):
+            if min(v) >= -(1 << 63) and max(v) < (1 << 63):
+                tc = "q"
+        elif len(v) >= 8 and all(type(x) == float for x in v):
+            tc = "d"
+        if tc != None:
+            _encodearray(out, b"L", tc, array.array(tc, v))
+        else:
+            out += b"l" + struct.pack("<Q", len(v))
+            for x in v:
+                _encodevalue(out, x)
+    else:
+        raise ValueError("can't store a value of type %s" % (type(v).__name__))
+
+def _encodearray(out, tag, typecode, v):
+    out += tag + typecode.encode("ascii") + struct.pack("<Q", len(v))
+    out += b"\0" * (-len(out) % 8)
+    out += memoryview(v).cast("B")
+
+def _decodevalue(buf, pos, views):
+    # Reads a value written by _encodevalue from 'buf' at 'pos'; returns
+    # the value and the position after it.  If 'views' is True, arrays
+    # are returned as memoryviews of 'buf' rather than copied.
+    tag = buf[pos : pos + 1]
+    pos += 1
+    if tag == b"N":
+        return None, pos
+    if tag == b"T" or tag == b"F":
+        return tag == b"T", pos
+    if tag == b"q":
+        return struct.unpack_from("<q", buf, pos)[0], pos + 8
+    if tag == b"d":
+        return struct.unpack_from("<d", buf, pos)[0], pos + 8
+    if tag == b"I" or tag == b"s":
+        size = struct.unpack_from("<Q", buf, pos)[0]
+        pos += 8
+        b = bytes(buf[pos : pos + size])
+        if tag == b"s":
+            return b.decode("utf-8"), pos + size
+        return int.from_bytes(b, "little", signed=True), pos + size
+    if tag == b"r":
+        num, pos = _decodevalue(buf, pos, views)
+        den, pos = _decodevalue(buf, pos, views)
+        return Fraction(num, den), pos
+    if tag == b"l":
+        count = struct.unpack_from("<Q", buf, pos)[0]
+        pos += 8
+        ret = []
+        for i in range(count):
+            v, pos = _decodevalue(buf, pos, views)
+            ret.append(v)
+        return ret, pos
+    if tag == b"a" or tag == b"L":
+        typecode = bytes(buf[pos : pos + 1]).decode("ascii")
+        count = struct.unpack_from("<Q", buf, pos + 1)[0]
+        pos += 9
+        pos += -pos % 8
+        size = count * array.array(typecode).itemsize
+        data = memoryview(buf)[pos : pos + size]
+        if tag == b"L":
+            return data.cast(typecode).tolist(), pos + size
+        if views:
+            return data.cast(typecode), pos + size
+        return array.array(typecode, data.cast(typecode)), pos + size
+    raise ValueError("corrupt sampler data")
+
+def _tablesheader(name):
+    # Starts the binary form of the tables of the sampler (or
+    # sampler cache) named 'name': the magic number, the byte order
+    # of the arrays that follow, and the name
+    out = bytearray(_SAMPLER_MAGIC)
+    out += sys.byteorder[0].encode("ascii")
+    _encodevalue(out, name)
+    return out
+
+def _readtablesheader(data, name):
+    # Checks the header written by _tablesheader(name) at the start
+    # of 'data' and returns the position after it
+    if bytes(data[: len(_SAMPLER_MAGIC)]) != _SAMPLER_MAGIC:
+        raise ValueError("not sampler data")
+    pos = len(_SAMPLER_MAGIC)
+    if bytes(data[pos : pos + 1]).decode("ascii") != sys.byteorder[0]:
+        raise ValueError("sampler data has a different byte order")
+    dataname, pos = _decodevalue(data, pos + 1, False)
+    if dataname != name:
+        raise ValueError("data is for a %s, not a %s" % (dataname, name))
+    return pos
+
+def _savetables(path, data):
+    # Write to a temporary file first, so that other processes
+    # never see a partly written file
+    tmp = "%s.%d.tmp" % (path, os.getpid())
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def _maptables(path):
+    # Maps a file written by _savetables into memory, read-only
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+class _SavedTables:
+    """Lets a sampler write its tables in a compact binary form and read
+    them back.  Subclasses name the attributes to store in
+    _STATEFIELDS."""
+
+    _STATEFIELDS = ()
+    # Whether the sampler keeps its PDF in 'pdf' to evaluate it while
+    # sampling; if so, from_bytes sets 'pdf' to the PDF given to it.
+    _KEEPSPDF = False
+
+    def to_bytes(self):
+        """Returns this sampler's tables in a compact binary form
+        that from_bytes can read back."""
+        out = _tablesheader(type(self).__name__)
+        fields = [f for f in self._STATEFIELDS if f in self.__dict__]
+        _encodevalue(out, len(fields))
+        for f in fields:
+            _encodevalue(out, f)
+            _encodevalue(out, self.__dict__[f])
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data, pdf=None, views=False):
+        """Creates a sampler from data returned by to_bytes.
+        - pdf: The PDF to use for samplers that evaluate it while sampling;
+          not stored by to_bytes.  Ignored by other samplers.
+        - views: If True, arrays in the data are used in place as
+          memoryviews rather than copied."""
+        pos = _readtablesheader(data, cls.__name__)
+        ret = cls.__new__(cls)
+        count, pos = _decodevalue(data, pos, views)
+        for i in range(count):
+            f, pos = _decodevalue(data, pos, views)
+            v, pos = _decodevalue(data, pos, views)
+            ret.__dict__[f] = v
+        if cls._KEEPSPDF:
+            ret.pdf = pdf
+        return ret
+
+    def save(self, path):
+        """Writes this sampler's tables to a file."""
+        _savetables(path, self.to_bytes())
+
+    @classmethod
+    def load(cls, path, pdf=None):
+        """Reads a sampler from a file written by 'save'.  The file is
+        mapped into memory, and the sampler's arrays refer to it
+        directly rather than being copied."""
+        return cls.from_bytes(_maptables(path), pdf=pdf, views=True)
+
+class SamplerTableCache:
+    """Keeps built samplers in a directory, under names derived from
+    the sampler's class and the parameters it was built with, so that
+    their tables are built only once and then loaded from there.
+    - directory: Directory holding the sampler files."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, cls, args, key=None):
+        """Gets the name of the file for a sampler of class 'cls' built
+        with the arguments 'args'.  'key', if given, is used instead of
+        'args' to name the file; it is required if the arguments
+        include a function, such as a PDF."""
+        out = bytearray()
+        _encodevalue(out, cls.__name__)
+        try:
+            _encodevalue(out, list(args) if key == None else key)
+        except ValueError:
+            raise ValueError("pass a 'key' for arguments that can't be stored")
+        return os.path.join(self.directory, hashlib.sha256(out).hexdigest() + ".smp")
+
+    def get(self, cls, *args, key=None):
+        """Gets a sampler of class 'cls' built with the arguments 'args',
+        loading it from the cache if it was built before, or building
+        and storing it otherwise.  See 'path' for 'key'.  If the first
+        argument is a function, it's taken as the sampler's PDF."""
+        path = self.path(cls, args, key)
+        pdf = args[0] if len(args) > 0 and callable(args[0]) else None
+        if os.path.exists(path):
+            return cls.load(path, pdf=pdf)
+        ret = cls(*args)
+        ret.save(path)
+        return ret
+
+class VoseAlias(_SavedTables):
     """
     Implements Vose's version of the alias sampler, which chooses a random variate in [0, n)
     where the probability that each number is chosen is weighted.  The 'weights' is the
@@ -85,6 +364,8 @@ class VoseAlias:
     distribution." IEEE Transactions on software engineering 17, no. 9 (1991): 972-975.
     """
 
+    _STATEFIELDS = ("total", "prob", "alias", "intprob")
+
     def __init__(self, weights):
         # Vose's alias method for large n and nonnegative
         # weights.  This method has a nontrivial setup,
@@ -122,6 +403,10 @@ class VoseAlias:
         self.total = ms
         self.prob = prob
         self.alias = alias
+        # Whether the total and all probabilities are integers, even if
+        # stored as floats or Fractions; only then can the probabilities
+        # be compared with random integers
+        self.intprob = int(ms) == ms and all(int(p) == p for p in prob)
 
     def next(self, randgen):
         d = randgen.rndintexc(len(self.prob))
@@ -129,12 +414,38 @@ class VoseAlias:
         if d == da:
             return d
         tsample = (
-            randgen.rndintexc(self.total)
-            if int(self.total) == self.total
-            else randgen.rndrangemaxexc(0, self.total)
+            randgen.rndintexc(int(self.total))
+            if self.intprob
+            else randgen.rndu01oneexc() * self.total
         )
         return d if tsample < self.prob[d] else da
 
+    def next_n(self, randgen, n):
+        """Returns an array of 'n' random variates from this sampler.
+        Uses NumPy, seeded from 'randgen', when it is available and the
+        total weight and all probabilities are integers and the total
+        fits in 63 bits.  The NumPy copies of the tables are made on
+        the first call and reused afterwards."""
+        if self.intprob and self.total < (1 << 63):
+            try:
+                import numpy
+
+                npg = numpy.random.Generator(
+                    numpy.random.PCG64(_randbitsfunc(randgen)(128))
+                )
+                if self.__dict__.get("_nptables") == None:
+                    self._nptables = (
+                        numpy.array([int(p) for p in self.prob], dtype=numpy.int64),
+                        numpy.array(self.alias, dtype=numpy.int64),
+                    )
+                prob, alias = self._nptables
+                d = npg.integers(0, len(self.prob), n)
+                t = npg.integers(0, int(self.total), n)
+                return numpy.where(t < prob[d], d, alias[d])
+            except ImportError:
+                pass
+        return array.array("q", [self.next(randgen) for _ in range(n)])
+
 class BringmannLarsen:
     """
     Implements Bringmann and Larsen's sampler, which chooses a random variate in [0, n)
@@ -209,7 +520,40 @@ class BringmannLarsen:
                 if randgen.zero_or_one(weight, self.maxWeight) == 1:
                     return v
 
-class FastLoadedDiceRoller:
+    def next_n(self, randgen, n):
+        """Returns an array of 'n' random variates from this sampler."""
+        return array.array("q", [self.next(randgen) for _ in range(n)])
+
+def _fldrLevels(weights, lasta, weightBits):
+    # Splits the bits of the weights (and of 'lasta', the weight of the
+    # rejection label) into levels, from the highest bit to the lowest.
+    # Level j lists, in order, the labels (starting at 1) of the weights
+    # whose bit (weightBits - 1 - j) is set.  This visits only the 1 bits
+    # of each weight; if NumPy is available and the weights fit in
+    # 63 bits, each level is instead found in one vectorized step.
+    n = len(weights)
+    if weightBits < 63 and n > 1000:
+        try:
+            import numpy
+
+            w = numpy.array(list(weights) + [lasta], dtype=numpy.int64)
+            return [
+                (numpy.nonzero((w >> (weightBits - 1 - j)) & 1)[0] + 1).tolist()
+                for j in range(weightBits)
+            ]
+        except ImportError:
+            pass
+    levels = [[] for j in range(weightBits)]
+    top = weightBits - 1
+    for i in range(n + 1):
+        ai = lasta if i == n else weights[i]
+        while ai > 0:
+            b = ai.bit_length() - 1
+            levels[top - b].append(i + 1)
+            ai ^= 1 << b
+    return levels
+
+class FastLoadedDiceRoller(_SavedTables):
     """
     Implements the Fast Loaded Dice Roller, which chooses a random variate in [0, n)
     where the probability that each number is chosen is weighted.  The 'weights' is the
@@ -223,38 +567,35 @@ class FastLoadedDiceRoller:
     Palermo, Sicily, Italy, 2020.
     """
 
+    _STATEFIELDS = ("n", "leaves", "offsets", "labels")
+
     def __init__(self, weights):
         self.n = len(weights)
         if self.n == 1:
             return
-        weightBits = 0
         totalWeights = sum(weights)
         if totalWeights < 0:
             raise ValueError("Sum of weights is negative")
         if totalWeights == 0:
             raise ValueError("Sum of weights is zero")
-        tmp = totalWeights - 1
-        while tmp > 0:
-            tmp >>= 1
-            weightBits += 1
+        if min(weights) < 0:
+            raise ValueError
+        weightBits = max(1, (totalWeights - 1).bit_length())
         lasta = (1 << weightBits) - totalWeights
-        self.leavesAndLabels = [
-            [0 for i in range(weightBits)] for j in range(self.n + 2)
-        ]
-        shift = weightBits - 1
+        # The tables are stored level by level: the labels of the
+        # leaves at level j are labels[offsets[j]:offsets[j]+leaves[j]].
+        # This takes space proportional to the number of 1 bits
+        # in the weights, rather than n times the number of bits.
+        levels = _fldrLevels(weights, lasta, weightBits)
+        self.leaves = array.array("q", [len(lv) for lv in levels])
+        self.offsets = array.array("q", [0] * weightBits)
+        pos = 0
         for j in range(weightBits):
-            level = 1
-            for i in range(self.n + 1):
-                ai = lasta if i == self.n else weights[i]
-                if ai < 0:
-                    raise ValueError
-                leaf = (ai >> shift) & 1
-                if leaf > 0:
-                    # NOTE: Labels start at 1
-                    self.leavesAndLabels[0][j] += leaf
-                    self.leavesAndLabels[level][j] = i + 1
-                    level += 1
-            shift -= 1
+            self.offsets[j] = pos
+            pos += len(levels[j])
+        self.labels = array.array("q")
+        for lv in levels:
+            self.labels.extend(lv)
 
     def codegen(self, name="sample_discrete"):
         """Generates standalone Python code that samples
@@ -264,42 +605,41 @@ class FastLoadedDiceRoller:
                 Nonuniform Random Variate Generation", 2001.
         - name: Method name. Default: 'sample_discrete'."""
         ret = "import random\n\n"
-        ret += "TABLE_" + name + " = ["
-        for i in range(len(self.leavesAndLabels)):
-            if i > 0:
-                ret += ", "
-            ret += "%s" % (str(self.leavesAndLabels[i]),)
-        ret += "]\n\n"
-        ret += "def " + name + "():\n"
         if self.n <= 1:
-            ret += "return 0\n\n"
-        else:
-            ret += "  x = 0\n"
-            ret += "  y = 0\n"
-            ret += "  while True:\n"
-            ret += "    x = random.randint(0, 1) | (x << 1)\n"
-            ret += "    leaves = TABLE_" + name + "[0][y]\n"
-            ret += "    if x < leaves:\n"
-            ret += "        label = TABLE_" + name + "[x + 1][y]\n"
-            ret += "        if label <= %d:\n" % (self.n)
-            ret += "            return label - 1\n"
-            ret += "        x = 0\n"
-            ret += "        y = 0\n"
-            ret += "    else:\n"
-            ret += "        x -= leaves\n"
-            ret += "        y += 1\n"
+            ret += "def " + name + "():\n"
+            ret += "  return 0\n\n"
             return ret
+        ret += "LEAVES_" + name + " = %s\n" % (str(list(self.leaves)),)
+        ret += "OFFSETS_" + name + " = %s\n" % (str(list(self.offsets)),)
+        ret += "LABELS_" + name + " = %s\n\n" % (str(list(self.labels)),)
+        ret += "def " + name + "():\n"
+        ret += "  x = 0\n"
+        ret += "  y = 0\n"
+        ret += "  while True:\n"
+        ret += "    x = random.randint(0, 1) | (x << 1)\n"
+        ret += "    leaves = LEAVES_" + name + "[y]\n"
+        ret += "    if x < leaves:\n"
+        ret += "        label = LABELS_" + name + "[OFFSETS_" + name + "[y] + x]\n"
+        ret += "        if label <= %d:\n" % (self.n)
+        ret += "            return label - 1\n"
+        ret += "        x = 0\n"
+        ret += "        y = 0\n"
+        ret += "    else:\n"
+        ret += "        x -= leaves\n"
+        ret += "        y += 1\n"
+        return ret
 
     def next(self, randgen):
         if self.n == 1:
             return 0
         x = 0
         y = 0
+        allleaves = self.leaves
         while True:
             x = randgen.randbit() | (x << 1)
-            leaves = self.leavesAndLabels[0][y]
+            leaves = allleaves[y]
             if x < leaves:
-                label = self.leavesAndLabels[x + 1][y]
+                label = self.labels[self.offsets[y] + x]
                 if label <= self.n:
                     # NOTE: The number of bits consumed
                     # by this call (A), as well as
@@ -320,6 +660,43 @@ class FastLoadedDiceRoller:
                 x -= leaves
                 y += 1
 
+    def next_n(self, randgen, n):
+        """Returns an array of 'n' random variates from this sampler.
+        Reads random bits 64 at a time; unused bits left over at the
+        end are discarded."""
+        ret = array.array("q", [0]) * n
+        if self.n == 1:
+            return ret
+        randbits = _randbitsfunc(randgen)
+        allleaves = self.leaves
+        labels = self.labels
+        offsets = self.offsets
+        maxlabel = self.n
+        word = 0
+        wordbits = 0
+        for i in range(n):
+            x = 0
+            y = 0
+            while True:
+                if wordbits == 0:
+                    word = randbits(64)
+                    wordbits = 64
+                x = (word & 1) | (x << 1)
+                word >>= 1
+                wordbits -= 1
+                leaves = allleaves[y]
+                if x < leaves:
+                    label = labels[offsets[y] + x]
+                    if label <= maxlabel:
+                        ret[i] = label - 1
+                        break
+                    x = 0
+                    y = 0
+                else:
+                    x -= leaves
+                    y += 1
+        return ret
+
 class SortedAliasMethod:
     """Implements a weighted sampling table
     where each weight must be in sorted
@@ -359,7 +736,7 @@ class SortedAliasMethod:
             qk *= Fraction(p[pIndex], ps)
             q.append(int(qk * ps))
             k += 1
-        self.alias = randomgen.FastLoadedDiceRoller(q)
+        self.alias = FastLoadedDiceRoller(q)
         self.p = [x for x in p]
 
     def next(self, rg):
@@ -375,7 +752,11 @@ class SortedAliasMethod:
             if rg.zero_or_one(self.p[ret], self.p[pIndex]) == 1:
                 return ret
 
-class OptimalSampler:
+    def next_n(self, rg, n):
+        """Returns an array of 'n' random variates from this sampler."""
+        return array.array("q", [self.next(rg) for _ in range(n)])
+
+class OptimalSampler(_SavedTables):
     """
     Implements a sampler which chooses a random variate in [0, n)
     where the probability that each number is chosen is weighted.  The 'weights' is the
@@ -388,6 +769,8 @@ class OptimalSampler:
     ACM Program. Lang. 4, POPL, Article 36 (January 2020), 33 pages.
     """
 
+    _STATEFIELDS = ("k", "l", "rej", "lin")
+
     def __init__(self, m):
         s = sum(m)
         if s <= 0:
@@ -423,9 +806,41 @@ class OptimalSampler:
                 # values in [0, n)
                 ret = (-self.lin[x]) - 1
                 if ret == self.rej:
+                    # Rejected, so start again at the root
+                    x = 0
                     continue
                 return ret
 
+    def next_n(self, rg, n):
+        """Returns an array of 'n' random variates from this sampler.
+        Reads random bits 64 at a time; unused bits left over at the
+        end are discarded."""
+        ret = array.array("q", [0]) * n
+        lin = self.lin
+        if len(lin) == 1:
+            return ret
+        randbits = _randbitsfunc(rg)
+        rej = self.rej
+        word = 0
+        wordbits = 0
+        i = 0
+        while i < n:
+            x = 0
+            while True:
+                if wordbits == 0:
+                    word = randbits(64)
+                    wordbits = 64
+                x = lin[x + (word & 1)]
+                word >>= 1
+                wordbits -= 1
+                if lin[x] < 0:
+                    v = (-lin[x]) - 1
+                    if v != rej:
+                        ret[i] = v
+                        i += 1
+                    break
+        return ret
+
     def nextFromMatrix(self, pm, rg):
         # Alternate sampler that samples directly
         # from the probability matrix,
@@ -594,13 +1009,205 @@ class OptimalSampler:
             b.append(xy)
         return [b, l, len(m) if rejectionEvent >= 0 else -1]
 
+class WeightedSampler:
+    """
+    A reusable sampler that chooses a random variate in [0, n)
+    where the probability that each number is chosen is weighted.  The 'weights' is the
+    list of weights each 0 or greater; the higher the weight, the greater
+    the probability.  This sampler supports integer, Fraction, and 'float' weights;
+    noninteger weights are converted exactly to integers with a common
+    denominator, so that sampling is exact in all cases.
+    - method: Structure to sample from: "table" (cumulative weight table
+      searched by bisection, O(log n) per sample), "alias" (VoseAlias),
+      "fldr" (FastLoadedDiceRoller, which uses close to the optimal
+      number of random bits), or "bl" (BringmannLarsen, a succinct
+      structure; the weights, once converted to integers, must each be
+      less than 2^32).  Default is None, which chooses by the number of
+      samples asked for and the size of the weights: single samples,
+      and batches from next_n of fewer than 64 samples, come from the
+      cumulative table, which is the fastest per sample in practice
+      for any number of weights; larger batches come from a VoseAlias,
+      built on first use, whose next_n draws a whole batch with NumPy,
+      if NumPy is available and the integer weights total less than
+      2^63, and otherwise from the table.  "fldr" and "bl" are never chosen by default, since
+      they were slower per sample than the table in every case tried.
+    """
+
+    def __init__(self, weights, method=None):
+        if len(weights) == 0:
+            raise ValueError
+        weights = WeightedSampler._intweights(weights)
+        if min(weights) < 0:
+            raise ValueError("Negative weight")
+        self.total = sum(weights)
+        if self.total == 0:
+            raise ValueError("Sum of weights is zero")
+        self.n = len(weights)
+        self.method = method
+        # VoseAlias for large batches, built on first use when
+        # 'method' is None
+        self.batchtable = None
+        self.weights = None
+        if method == None or method == "table":
+            self.table = list(itertools.accumulate(weights))
+            if method == None and self.total < (1 << 63):
+                try:
+                    import numpy
+
+                    self.weights = tuple(weights)
+                except ImportError:
+                    pass
+        elif method == "alias":
+            self.table = VoseAlias(weights)
+        elif method == "fldr":
+            self.table = FastLoadedDiceRoller(weights)
+        elif method == "bl":
+            self.table = BringmannLarsen(weights)
+        else:
+            raise ValueError("Unknown method")
+
+    @staticmethod
+    def _intweights(weights):
+        # Converts weights to integers with the same ratios
+        if all(isinstance(w, int) for w in weights):
+            return weights
+        fw = [Fraction(w) for w in weights]
+        denom = 1
+        for w in fw:
+            denom = math.lcm(denom, w.denominator)
+        return [int(w * denom) for w in fw]
+
+    def next(self, randgen):
+        if self.method == None or self.method == "table":
+            return bisect.bisect_right(self.table, randgen.rndintexc(self.total))
+        return self.table.next(randgen)
+
+    def next_n(self, randgen, n):
+        """Returns a list of 'n' random variates from this sampler."""
+        if self.method == None and self.weights != None and n >= 64:
+            if self.batchtable == None:
+                self.batchtable = VoseAlias(self.weights)
+            return self.batchtable.next_n(randgen, n).tolist()
+        if self.method == None or self.method == "table":
+            table = self.table
+            total = self.total
+            return [
+                bisect.bisect_right(table, randgen.rndintexc(total)) for _ in range(n)
+            ]
+        return self.table.next_n(randgen, n).tolist()
+
+class DynamicWeightedSampler:
+    """
+    A sampler that chooses a random variate in [0, n)
+    where the probability that each number is chosen is weighted, and
+    where weights can be changed, added, or removed in O(log n) time
+    without rebuilding the sampler.  Supports integer, Fraction, and 'float'
+    weights ('float' weights are converted exactly to Fractions), each 0 or
+    greater; sampling is exact in all cases.  Uses a complete binary tree
+    of partial sums: with integer weights, a sample takes one random integer
+    below the total and a walk down the tree; otherwise, each step down
+    the tree flips an exact coin with the probability of going left.
+    - weights: Initial list of weights.  Default is None, meaning
+      no items.
+    """
+
+    def __init__(self, weights=None):
+        if weights == None:
+            weights = []
+        self._rebuild([self._weight(w) for w in weights], len(weights))
+
+    def _weight(self, w):
+        if w < 0:
+            raise ValueError("Negative weight")
+        return Fraction(w) if isinstance(w, float) else w
+
+    def _rebuild(self, weights, n):
+        size = 1
+        while size < n:
+            size <<= 1
+        tree = [0] * (size * 2)
+        tree[size : size + n] = weights
+        for i in range(size - 1, 0, -1):
+            tree[i] = tree[i * 2] + tree[i * 2 + 1]
+        self.size = size
+        self.tree = tree
+        self.n = n
+
+    def __len__(self):
+        return self.n
+
+    def total(self):
+        """Gets the sum of all weights."""
+        return self.tree[1]
+
+    def weight(self, i):
+        """Gets the weight of item 'i'."""
+        if i < 0 or i >= self.n:
+            raise IndexError
+        return self.tree[self.size + i]
+
+    def update(self, i, w):
+        """Changes the weight of item 'i' to 'w'."""
+        if i < 0 or i >= self.n:
+            raise IndexError
+        w = self._weight(w)
+        tree = self.tree
+        j = self.size + i
+        tree[j] = w
+        j >>= 1
+        while j > 0:
+            tree[j] = tree[j * 2] + tree[j * 2 + 1]
+            j >>= 1
+
+    def insert(self, w):
+        """Adds an item with weight 'w' and returns its index, which is
+        the number of items before this call."""
+        w = self._weight(w)
+        if self.n >= self.size:
+            # Tree is full, so rebuild it with double the capacity
+            self._rebuild(self.tree[self.size : self.size + self.n] + [w], self.n + 1)
+        else:
+            self.n += 1
+            self.update(self.n - 1, w)
+        return self.n - 1
+
+    def delete(self, i):
+        """Removes item 'i' so that it is no longer sampled.  Its index
+        is not reused, so that the indices of other items don't change;
+        this is the same as setting its weight to 0."""
+        self.update(i, 0)
+
+    def next(self, randgen):
+        tree = self.tree
+        if tree[1] <= 0:
+            raise ValueError("Sum of weights is zero")
+        node = 1
+        size = self.size
+        if isinstance(tree[1], int):
+            v = randgen.rndintexc(tree[1])
+            while node < size:
+                node <<= 1
+                if v >= tree[node]:
+                    v -= tree[node]
+                    node += 1
+        else:
+            while node < size:
+                parent = tree[node]
+                node <<= 1
+                if randgen.zero_or_one(tree[node], parent) == 0:
+                    node += 1
+        return node - size
+
 class _BinomialAliasTable:
     def __init__(self, aliases, entries, n):
-        self.aliases = aliases
         if len(entries) != len(aliases):
             raise ValueError
         if aliases[len(aliases) - 1] != -1:
             raise ValueError
+        # Stored as arrays (or as views of a memory-mapped
+        # file, see _BinomialTableCache.load)
+        self.aliases = aliases if isinstance(aliases, memoryview) else array.array("q", aliases)
+        self.weights = entries if isinstance(entries, memoryview) else array.array("q", entries)
         self.failureEntry = entries[len(entries) - 1]
         self.failureCumul = []
         self.failureRaw = []
@@ -652,6 +1259,19 @@ class _BinomialAliasTable:
         s = max(16, self._bitcount(self.n))
         failurevalues = self.failureEntry << (self.n - s)
         cf = (1 << (self.n - s)) - 1
+        if self.n > _BINOMIAL_FAILURE_CACHE_TRIALS:
+            # Build the row anew without keeping it
+            failureRate = rg.rndint(failurevalues - 1)
+            totalcv = 1
+            c = 1
+            if failureRate < totalcv:
+                return 0
+            for i in range(1, self.n + 1):
+                c = c * (self.n - (i - 1)) // i
+                totalcv += c & cf
+                if failureRate < totalcv:
+                    return i
+            raise ValueError("should not happen")
         failureCumulLen = len(self.failureCumul)
         if failureCumulLen <= 0:
             self.failureCumul.append(1)
@@ -835,11 +1455,13 @@ class PascalTriangle:
         return _BinomialAliasTable(aliases, aliasentries, n)
 
     def aliasinfo(self, desiredRow):
-        r = self.getrow(desiredRow)
         if desiredRow <= 16:
             # Use simple alias table to avoid overhead
-            return FastLoadedDiceRoller(r)
-        return self._buildAliasTable2(r[desiredRow // 2], desiredRow)
+            return FastLoadedDiceRoller(self.getrow(desiredRow))
+        # Only the middle entry of the row is needed
+        return self._buildAliasTable2(
+            math.comb(desiredRow, desiredRow // 2), desiredRow
+        )
 
     def nextto(self, desiredRow):
         """Generates the row of Pascal's triangle with the specified row number,
@@ -866,6 +1488,95 @@ class PascalTriangle:
         self.rownumber += 1
         return [x for x in self.table]
 
+def _objectbytes(obj):
+    # Approximate number of bytes used by an object and the arrays,
+    # lists, and samplers it holds
+    ret = sys.getsizeof(obj)
+    for v in obj.__dict__.values():
+        if isinstance(v, array.array):
+            ret += v.itemsize * len(v)
+        elif isinstance(v, list):
+            ret += sys.getsizeof(v) + sum(sys.getsizeof(x) for x in v)
+        elif isinstance(v, FastLoadedDiceRoller):
+            ret += _objectbytes(v)
+    return ret
+
+class _BinomialTableCache:
+    """Cache of samplers for the binomial(n, 1/2) distribution, keyed
+    by n and holding at most about 'maxbytes' bytes of tables; the
+    least recently used tables are evicted first."""
+
+    def __init__(self, maxbytes=_BINOMIAL_TABLE_CACHE_BYTES):
+        self.maxbytes = maxbytes
+        self.tables = collections.OrderedDict()
+        self.sizes = {}
+        self.totalbytes = 0
+        self.pascal = PascalTriangle()
+
+    def get(self, n):
+        """Gets the sampler for binomial(n, 1/2), building it if needed."""
+        t = self.tables.get(n)
+        if t != None:
+            self.tables.move_to_end(n)
+            return t
+        t = self.pascal.aliasinfo(n)
+        self._add(n, t)
+        return t
+
+    def _add(self, n, t):
+        if n in self.tables:
+            self.totalbytes -= self.sizes[n]
+        self.tables[n] = t
+        self.tables.move_to_end(n)
+        self.sizes[n] = _objectbytes(t)
+        self.totalbytes += self.sizes[n]
+        self._evict()
+
+    def _evict(self):
+        if self.totalbytes > self.maxbytes:
+            # Account for failure tables built since the tables were added
+            for k in self.tables:
+                self.totalbytes += _objectbytes(self.tables[k]) - self.sizes[k]
+                self.sizes[k] = _objectbytes(self.tables[k])
+            while self.totalbytes > self.maxbytes and len(self.tables) > 1:
+                k, _ = self.tables.popitem(last=False)
+                self.totalbytes -= self.sizes.pop(k)
+
+    def clear(self):
+        self.tables.clear()
+        self.sizes.clear()
+        self.totalbytes = 0
+
+    def save(self, path):
+        """Writes the cached alias tables to a file that 'load' can
+        map into memory later.  The file has the same format as
+        those written by the samplers' 'save' method."""
+        out = _tablesheader(type(self).__name__)
+        tables = [
+            (n, t) for n, t in self.tables.items() if isinstance(t, _BinomialAliasTable)
+        ]
+        _encodevalue(out, len(tables))
+        for n, t in tables:
+            _encodevalue(out, n)
+            _encodevalue(out, t.aliases)
+            _encodevalue(out, t.weights)
+        _savetables(path, out)
+
+    def load(self, path):
+        """Adds the alias tables stored in a file written by 'save'.
+        The file is mapped into memory, and the tables' rows refer to
+        it directly rather than being copied."""
+        data = _maptables(path)
+        pos = _readtablesheader(data, type(self).__name__)
+        count, pos = _decodevalue(data, pos, True)
+        for i in range(count):
+            n, pos = _decodevalue(data, pos, True)
+            aliases, pos = _decodevalue(data, pos, True)
+            weights, pos = _decodevalue(data, pos, True)
+            self._add(n, _BinomialAliasTable(aliases, weights, n))
+
+_binomialTableCache = _BinomialTableCache()
+
 class _FractionBinaryExpansion:
     def __init__(self, frac):
         self.frac = frac
@@ -1046,43 +1757,234 @@ class BinaryExpansion:
         """Resets this object to the first bit in the binary expansion."""
         self.index = 0
 
+def _expminusseries(x, prec):
+    # Returns lower and upper bounds, as Fractions, on exp(-x), where
+    # 0 <= x <= 1, that differ by at most 2^-prec.  Uses the fact that
+    # the partial sums of an alternating series with decreasing terms
+    # lie alternately above and below its sum.
+    eps = Fraction(1, 1 << prec)
+    term = Fraction(1)
+    s = Fraction(1)
+    i = 1
+    while True:
+        term = term * x / i
+        nxt = s - term if i % 2 == 1 else s + term
+        if term <= eps:
+            return (min(s, nxt), max(s, nxt))
+        s = nxt
+        i += 1
+
+def _expminusbounds(y, prec):
+    # Returns integers lo and hi with lo <= 2^prec*exp(-y) <= hi,
+    # where y is a nonnegative Fraction
+    n = y.numerator // y.denominator
+    lo, hi = _expminusseries(y - n, prec + 4)
+    if n > 0:
+        elo, ehi = _expminusseries(Fraction(1), prec + 4 + n.bit_length())
+        lo *= elo**n
+        hi *= ehi**n
+    lo *= 1 << prec
+    hi *= 1 << prec
+    return (lo.numerator // lo.denominator, -((-hi.numerator) // hi.denominator))
+
+def _zigtables():
+    # Layer tables for RandomGen.exponential_psrn: lower and upper
+    # bounds on 2^64*exp(-j/2^_ZIG_LAYERBITS) for each j from 0 through
+    # 2^_ZIG_LAYERBITS; weights w[j], each an upper bound on
+    # 2^24*exp(-j/2^_ZIG_LAYERBITS), for each layer j except the last,
+    # so that the weights total less than 2^32; and a sampler choosing
+    # each of those layers with probability proportional to its weight
+    global _zigTables
+    if _zigTables == None:
+        layers = 1 << _ZIG_LAYERBITS
+        bounds = [_expminusbounds(Fraction(j, layers), 64) for j in range(layers + 1)]
+        lo = [b[0] for b in bounds]
+        hi = [b[1] for b in bounds]
+        w = [-((-h) >> 40) for h in hi[:layers]]
+        _zigTables = (lo, hi, w, WeightedSampler(w, "table"))
+    return _zigTables
+
+def _zigexpminus(ylo, yhi):
+    # Returns integers elo and ehi with elo <= 2^64*exp(-y) <= ehi for
+    # every y with ylo <= y*2^64 <= yhi, where 0 <= ylo <= yhi are
+    # integers.  Uses the layer tables of exponential_psrn, exp(-1)
+    # for the integer part of y, and 1-t <= exp(-t) <= 1-t+t^2/2 for
+    # the rest t of y past its layer; each product is rounded down for
+    # elo and up for ehi.
+    lo, hi = _zigtables()[:2]
+    nl = 1 << _ZIG_LAYERBITS
+    tbits = 64 - _ZIG_LAYERBITS
+    one = 1 << 64
+    n = yhi >> 64
+    j = (yhi >> tbits) & (nl - 1)
+    t = yhi & ((1 << tbits) - 1)
+    elo = (lo[j] * (one - t)) >> 64
+    while n > 0 and elo > 0:
+        elo = (elo * lo[nl]) >> 64
+        n -= 1
+    n = ylo >> 64
+    j = (ylo >> tbits) & (nl - 1)
+    t = ylo & ((1 << tbits) - 1)
+    ehi = -((-hi[j] * (one - t - ((-t * t) >> 65))) >> 64)
+    while n > 0 and ehi > 1:
+        ehi = -((-ehi * hi[nl]) >> 64)
+        n -= 1
+    return (elo, ehi)
+
+class RandomBitPool:
+    """A pool of random bits that fetches entropy from an underlying
+    source in large blocks, rather than one word at a time, and
+    serves single bits, k-bit chunks, and whole words from that pool.
+    - source: The source of random bits.  Can be an object with a
+      'getrandbits(k)' method (such as 'random.Random' or
+      'random.SystemRandom'), a function that takes a number of bytes
+      and returns that many random bytes (such as 'os.urandom'), or
+      an object with only a 'randint(a, b)' method.  In the last case,
+      only one word is fetched at a time, so that wrapped random
+      generators don't lose entropy they would otherwise not use.
+      Default is a new 'random.Random' object.
+    - wordbits: Number of bits in each word of the pool: 8, 16, 32,
+      or 64.  Default is 64.
+    - blockbits: Number of bits to fetch from the source at once.
+      Rounded up to a multiple of 'wordbits'.  Default is 65536."""
+
+    def __init__(self, source=None, wordbits=64, blockbits=65536):
+        if wordbits not in _WORDTYPECODES:
+            raise ValueError("unsupported word width")
+        if source == None:
+            source = random.Random()
+        self.source = source
+        self.wordbits = wordbits
+        self.typecode = _WORDTYPECODES[wordbits]
+        wordbytes = wordbits // 8
+        if hasattr(source, "getrandbits"):
+            self.blockbytes = max(1, -(-blockbits // wordbits)) * wordbytes
+            self._fetch = lambda nb: source.getrandbits(nb * 8).to_bytes(nb, "little")
+        elif hasattr(source, "randint"):
+            self.blockbytes = wordbytes
+            self._fetch = lambda nb: source.randint(0, (1 << (nb * 8)) - 1).to_bytes(
+                nb, "little"
+            )
+        elif callable(source):
+            self.blockbytes = max(1, -(-blockbits // wordbits)) * wordbytes
+            self._fetch = source
+        else:
+            raise ValueError("unsupported source of random bits")
+        self.words = array.array(self.typecode)
+        self.wordpos = 0
+        self.wordsdone = 0
+        self.curbit = 0
+        self.bitcount = 0
+
+    def _refill(self):
+        self.wordsdone += len(self.words)
+        self.words = array.array(self.typecode, self._fetch(self.blockbytes))
+        self.wordpos = 0
+
+    def bitsused(self):
+        """Returns the number of random bits this pool has served so far
+        (as opposed to fetched from the source).  Useful for checking how
+        close a sampler comes to using the optimal number of bits."""
+        return (self.wordsdone + self.wordpos) * self.wordbits - self.bitcount
+
+    def word(self):
+        """Returns a uniform random integer with 'wordbits' bits, taken
+        directly from the pool."""
+        if self.wordpos >= len(self.words):
+            self._refill()
+        ret = self.words[self.wordpos]
+        self.wordpos += 1
+        return ret
+
+    def randbit(self):
+        """Returns a uniform random bit (0 or 1)."""
+        if self.bitcount == 0:
+            if self.wordpos >= len(self.words):
+                self._refill()
+            self.curbit = self.words[self.wordpos]
+            self.wordpos += 1
+            self.bitcount = self.wordbits
+        ret = self.curbit & 1
+        self.curbit >>= 1
+        self.bitcount -= 1
+        return ret
+
+    def randbits(self, count):
+        """Returns a uniform random integer with 'count' bits (in
+        the interval [0, 2^count)).  Bits left over in the current
+        word are used first."""
+        if count <= self.bitcount:
+            ret = self.curbit & ((1 << count) - 1)
+            self.curbit >>= count
+            self.bitcount -= count
+            return ret
+        ret = self.curbit
+        shift = self.bitcount
+        count -= self.bitcount
+        self.curbit = 0
+        self.bitcount = 0
+        wordbits = self.wordbits
+        while count >= wordbits:
+            if self.wordpos >= len(self.words):
+                self._refill()
+            # Take as many whole words as possible at once
+            avail = min(count // wordbits, len(self.words) - self.wordpos)
+            if avail == 1:
+                chunk = self.words[self.wordpos]
+            else:
+                chunk = int.from_bytes(
+                    self.words[self.wordpos : self.wordpos + avail].tobytes(), "little"
+                )
+            self.wordpos += avail
+            ret |= chunk << shift
+            shift += avail * wordbits
+            count -= avail * wordbits
+        if count > 0:
+            w = self.word()
+            ret |= (w & ((1 << count) - 1)) << shift
+            self.curbit = w >> count
+            self.bitcount = wordbits - count
+        return ret
+
 class RandomGen:
     """A class that implements many methods for
     random variate generation and sampling.  It takes
     an underlying RNG as specified in the constructor."""
 
-    def __init__(self, rng=None):
+    def __init__(self, rng=None, wordbits=64, blockbits=65536):
         """Initializes a new RandomGen instance.
         NOTES:
 
         1. Assumes that 'rng' implements
-        a 'randint(a, b)' method that returns a random
-        integer in the interval [a, b].  Currently, this
-        class assumes 'a' is always 0.
-        2. 'rndint' (and functions that ultimately call it) may be
+        a 'getrandbits(k)' method or a 'randint(a, b)' method
+        that returns a random integer in the interval [a, b],
+        or is a function that takes a number of bytes and
+        returns that many random bytes (see RandomBitPool).
+        In the 'randint' case, this class assumes 'a' is always 0.
+        2. Random bits are drawn from a RandomBitPool, which fetches
+        'blockbits' bits at a time from 'rng' and serves them in
+        words of 'wordbits' bits.
+        3. 'rndint' (and functions that ultimately call it) may be
         slower than desirable if many random variates are
         needed at once.  Ways to improve the performance
         of generating many random variates at once include
         vectorization (which is often PRNG specific) and multithreading
-        (which is too complicated to show here)."""
+        (which is too complicated to show here).  Methods ending in
+        '_array', such as 'normal_array', generate many variates
+        at once using NumPy, seeded from this object's random bits."""
         if rng == None:
             self.rng = random.Random()
         else:
             self.rng = rng
-        self.bitcount = 63
-        self.curbit = 0
+        self.bitpool = RandomBitPool(self.rng, wordbits=wordbits, blockbits=blockbits)
+        self._binomialsampler = None
 
     def randbits(self, count):
-        return self.rndintexc(1 << count)
+        """Generates a 'count'-bit random integer."""
+        return self.bitpool.randbits(count)
 
     def randbit(self):
-        if self.bitcount >= 63:
-            self.bitcount = 0
-            self.curbit = self.rng.randint(0, (1 << 63) - 1)
-        ret = self.curbit & 1
-        self.curbit >>= 1
-        self.bitcount += 1
-        return ret
+        return self.bitpool.randbit()
 
     def rndint_fastdiceroller(self, maxInclusive):
         if maxInclusive < 0:
@@ -1092,17 +1994,44 @@ class RandomGen:
         if maxInclusive == 1:
             return self.randbit()
         # Lumbroso's fast dice roller method
+        randbit = self.bitpool.randbit
         x = 1
         y = 0
         while True:
             x = x * 2
-            y = y * 2 + self.randbit()
+            y = y * 2 + randbit()
             if x > maxInclusive:
                 if y <= maxInclusive:
                     return y
                 x = x - maxInclusive - 1
                 y = y - maxInclusive - 1
 
+    def rndint_fastdiceroller_words(self, maxInclusive):
+        """Same as 'rndint_fastdiceroller', but reads at once all the
+        bits that the fast dice roller would otherwise read one at a time
+        before its next comparison.  This gives the same distribution
+        and uses the same number of random bits, in fewer steps."""
+        if maxInclusive < 0:
+            raise ValueError("maxInclusive less than 0")
+        if maxInclusive == 0:
+            return 0
+        m = maxInclusive + 1
+        mbits = m.bit_length()
+        randbits = self.bitpool.randbits
+        x = 1
+        y = 0
+        while True:
+            k = mbits - x.bit_length()
+            if (x << k) < m:
+                k += 1
+            x <<= k
+            y = (y << k) | randbits(k)
+            if y < m:
+                return y
+            # Recycle the leftover range, as in the bitwise version
+            x -= m
+            y -= m
+
     def rndint(self, maxInclusive):
         if maxInclusive < 0:
             raise ValueError("maxInclusive less than 0")
@@ -1110,7 +2039,12 @@ class RandomGen:
             return 0
         if maxInclusive == 1:
             return self.randbit()
-        return self.rndint_fastdiceroller(maxInclusive)
+        if not isinstance(maxInclusive, int):
+            return self.rndint_fastdiceroller(maxInclusive)
+        if (maxInclusive & (maxInclusive + 1)) == 0:
+            # Range is a power of two, so take bits directly
+            return self.bitpool.randbits(maxInclusive.bit_length())
+        return self.rndint_fastdiceroller_words(maxInclusive)
 
     def rndintexc(self, maxExclusive):
         if maxExclusive <= 0:
@@ -1125,10 +2059,6 @@ class RandomGen:
     def rndintexcrange(self, minInclusive, maxExclusive):
         return minInclusive + self.rndint(maxExclusive - minInclusive - 1)
 
-    def randbits(self, n):
-        """Generates an n-bit random integer."""
-        return self.rndint((1 << n) - 1)
-
     def rndu01(self):
         e = -_SIGBITS
         while True:
@@ -1430,6 +2360,34 @@ class RandomGen:
                 return 0
         return 0
 
+    def weighted_sampler(self, weights, method=None, key=None):
+        """Returns a WeightedSampler for the given weights, reusing
+        a previously built sampler if one is cached.  The most recently
+        used samplers are kept in the cache.  See WeightedSampler for
+        the meaning of 'method'.
+        - key: Hashable value that identifies the weights, such as a
+          name chosen by the caller.  If given, the cache is keyed on
+          'key' and 'method'; otherwise, on the identity of the
+          'weights' object and 'method', so that a lookup takes
+          constant time rather than time proportional to the number of
+          weights.  Thus, a list of weights changed after a call to
+          this method must be passed with a new key (or as a new list),
+          and equal weights in different lists are cached separately.
+          Callers that sample often from the same weights can also
+          keep the returned WeightedSampler."""
+        ident = ("key", key) if key != None else ("id", id(weights))
+        ret = _weightedSamplerCache.get((ident, method))
+        # The cache entry holds a reference to the weights, so that
+        # their 'id' can't be reused by another object while cached
+        if ret != None and (key != None or ret[0] is weights):
+            _weightedSamplerCache.move_to_end((ident, method))
+            return ret[1]
+        ret = WeightedSampler(weights, method)
+        _weightedSamplerCache[(ident, method)] = (weights, ret)
+        if len(_weightedSamplerCache) > _WEIGHTED_SAMPLER_CACHE_SIZE:
+            _weightedSamplerCache.popitem(last=False)
+        return ret
+
     def weighted_choice(self, weights):
         return self._weighted_choice_n(weights, 1, 0)[0]
 
@@ -1439,44 +2397,9 @@ class RandomGen:
     def _weighted_choice_n(self, weights, n, addvalue):
         if len(weights) == 0:
             raise ValueError
-        msum = 0
-        i = 0
-        negweights = False
-        nonintweights = False
-        while i < len(weights):
-            negweights = negweights or weights[i] < 0
-            if int(weights[i]) != weights[i]:
-                nonintweights = True
-            msum += weights[i]
-            i += 1
-        if n > 100 and not negweights and not nonintweights:
-            aliasinfo = FastLoadedDiceRoller(weights)
-            return [aliasinfo.next(self) for k in range(n)]
-        ret = [0 for k in range(n)]
-        rv = [
-            (
-                randgen.rndintexc(msum)
-                if not nonintweights
-                else randgen.rndrangemaxexc(0, msum)
-            )
-            for k in range(n)
-        ]
-        k = 0
-        while k < n:
-            value = rv[k]
-            i = 0
-            lastItem = len(weights) - 1
-            runningValue = 0
-            while i < len(weights):
-                if weights[i] > 0:
-                    newValue = runningValue + weights[i]
-                    lastItem = i
-                    if value < newValue:
-                        break
-                    runningValue = newValue
-                i += 1
-            ret[k] = lastItem + addvalue
-            k += 1
+        ret = self.weighted_sampler(weights).next_n(self, n)
+        if addvalue != 0:
+            ret = [r + addvalue for r in ret]
         return ret
 
     def weighted_choice_inclusion(self, weights, n):
@@ -1580,28 +2503,57 @@ class RandomGen:
 
     def normal(self, mu=0.0, sigma=1.0):
         """Generates a normally-distributed random variate."""
-        bmp = 0.8577638849607068  # sqrt(2/exp(1))
-        if False and self.rndint(1) == 0:
-            while True:
-                a = self.rndu01zeroexc()
-                b = self.rndu01zeroexc()
-                if self.rndint(1) == 0:
-                    a = 0 - a
-                if self.rndint(1) == 0:
-                    b = 0 - b
-                c = a * a + b * b
-                if c != 0 and c <= 1:
-                    c = math.sqrt(-math.log(c) * 2 / c)
-                    if self.rndint(1) == 0:
-                        return a * sigma * c + mu
-                    else:
-                        return b * sigma * c + mu
-        else:
-            while True:
-                a = self.rndu01zeroexc()
-                b = self.rndrange(-bmp, bmp)
-                if b * b <= -4 * a * a * math.log(a):
-                    return (b * sigma / a) + mu
+        return (
+            psrn_fill_many(self, [self.normal_psrn()], significant=True)[0] * sigma
+            + mu
+        )
+
+    def normal_n(self, n, mu=0.0, sigma=1.0):
+        """Generates 'n' normally-distributed random variates, as a list."""
+        psrns = [self.normal_psrn() for i in range(n)]
+        return [v * sigma + mu for v in psrn_fill_many(self, psrns, significant=True)]
+
+    def normal_psrn(self):
+        """Generates a standard normal random variate, as a PSRN object
+        (see betadist.PSRN).  Exact; uses exponential_psrn for a
+        proposal, which is accepted with probability exp(-(x-1)^2/2)
+        to give a half-normal variate (Marsaglia's method)."""
+
+        def yrange(lo, hi):
+            if lo <= 1 and hi >= 1:
+                return (Fraction(0), max(1 - lo, hi - 1) ** 2 / 2)
+            a = (lo - 1) ** 2 / 2
+            b = (hi - 1) ** 2 / 2
+            return (min(a, b), max(a, b))
+
+        while True:
+            x = self.exponential_psrn()
+            # x is in [a, a+1]/2^k, so y = (x-1)^2/2 is between the
+            # lowest and highest of d^2/2^(2k+1) for d in [a-2^k, a+1-2^k]
+            k = x.length
+            d = ((x.intpart << k) | x.bits) - (1 << k)
+            smin = 0 if d <= 0 and d + 1 >= 0 else min(d * d, (d + 1) * (d + 1))
+            smax = max(d * d, (d + 1) * (d + 1))
+            shift = 63 - 2 * k
+            if shift >= 0:
+                ylo = smin << shift
+                yhi = smax << shift
+            else:
+                ylo = smin >> -shift
+                yhi = -((-smax) >> -shift)
+            elo, ehi = _zigexpminus(ylo, yhi)
+            v = self.randbits(32)
+            if (v + 1) << 32 <= elo:
+                accept = True
+            elif v << 32 >= ehi:
+                accept = False
+            else:
+                accept = self._zigaccept(v, 32, 1, 1, yrange, x) == 1
+            if accept:
+                x.sign = 1 if self.randbit() else -1
+                return x
+            if samplerstats.active != None:
+                samplerstats.active.add("RandomGen.normal_psrn", "rejections")
 
     def lognormal(self, mu=0.0, sigma=0.0):
         return math.exp(self.normal(mu, sigma))
@@ -1634,15 +2586,25 @@ class RandomGen:
         x = self.gamma(avar)
         return x / (x + self.gamma(b))
 
-    _aliastables = {}
-    _pascal = PascalTriangle()
-
     def _getaliastable(self, n):
-        if n in self._aliastables:
-            return self._aliastables[n]
-        p = self._pascal.aliasinfo(n)
-        self._aliastables[n] = p
-        return self._aliastables[n]
+        return _binomialTableCache.get(n)
+
+    def set_binomial_table_cache_bytes(self, maxbytes):
+        """Sets the maximum total size, in bytes, of the tables for
+        the binomial(n, 1/2) distribution that are kept in memory
+        (shared by all RandomGen objects).  Least recently used tables
+        are evicted first."""
+        _binomialTableCache.maxbytes = maxbytes
+        _binomialTableCache._evict()
+
+    def save_binomial_tables(self, path):
+        """Writes the cached binomial(n, 1/2) tables to a file."""
+        _binomialTableCache.save(path)
+
+    def load_binomial_tables(self, path):
+        """Loads binomial(n, 1/2) tables written by save_binomial_tables,
+        by mapping the file into memory."""
+        _binomialTableCache.load(path)
 
     def _ispoweroftwo(self, n):
         while n != 0 and (n & 1) == 0:
@@ -1660,24 +2622,22 @@ class RandomGen:
         # Always fails
         if px == 0:
             return 0
+        if trials >= _BINOMIAL_SAMPLER_TRIALS:
+            # For many trials, use a sampler whose running time
+            # grows only logarithmically in the number of trials
+            return self._getbinomialsampler().sample_rational(trials, Fraction(px, py))
         if px * 2 == py:
-            return binomial(self, trials, 0.5)
-        count = 0
-        # Based on proof of Theorem 2 in Farach-Colton and Tsai.
-        # Decompose prob into its binary expansion (assuming
-        # division by 2 is exact except on underflow)
-        pw = Fraction(px, py)
-        pt = Fraction(1, 2)
-        while trials > 0:
-            c = self.binomial(trials, 0.5)
-            if pw >= pt:
-                count = count + c
-                trials = trials - c
-                pw = pw - pt
-            else:
-                trials = c
-            pt /= 2
-        return count
+            return self.binomial(trials, 0.5)
+        return _binomialrational(
+            lambda m: self.binomial(m, 0.5), trials, Fraction(px, py)
+        )
+
+    def _getbinomialsampler(self):
+        if self._binomialsampler == None:
+            import binomial
+
+            self._binomialsampler = binomial.BinomialSampler(self, throughput=True)
+        return self._binomialsampler
 
     def binomial(self, trials, p, n=None):
         if n == None:
@@ -1711,6 +2671,10 @@ class RandomGen:
                         r >>= 1
                 elif tbl != None:
                     count = tbl.next(self)
+                elif trials >= _BINOMIAL_SAMPLER_TRIALS:
+                    # Avoid building (and caching) alias tables
+                    # for many trials
+                    count = self._getbinomialsampler().sample(trials)
                 elif not self._ispoweroftwo(trials):
                     # Decompose _trials_ into powers of two (taking idea
                     # from "simple reduction" in Farach-Colton and Tsai),
@@ -2329,17 +3293,106 @@ class RandomGen:
             count += 1
 
     def exponential(self, lamda=1.0):
-        if self.rndint(1) == 0:
-            return self._expovnbits(53)
-        # Flip-flopping idea taken from (Pederson 2018)
-        if self.rndint(1) == 0:
-            x = self.rndrangeminexc(0, 0.5)
-            # avoid bias
-            while x == 0.5 and self.rndint(1) == 0:
-                x = self.rndrangeminexc(0, 0.5)
-            return -math.log(x) / lamda
-        else:
-            return -math.log1p(self.rndrangeminmaxexc(-0.5, 0)) / lamda
+        return (
+            psrn_fill_many(self, [self.exponential_psrn()], significant=True)[0]
+            / lamda
+        )
+
+    def exponential_n(self, n, lamda=1.0):
+        """Generates 'n' exponential random variates with rate 'lamda',
+        as a list."""
+        psrns = [self.exponential_psrn() for i in range(n)]
+        return [v / lamda for v in psrn_fill_many(self, psrns, significant=True)]
+
+    def _zigaccept(self, v, vbits, num, den, yrange, x=None):
+        # Returns 1 if u*num/den < exp(-y), or 0 otherwise, where u is a
+        # uniform random variate in [0, 1) whose first 'vbits' bits are
+        # given in 'v', and where y depends on the PSRN object 'x' (or
+        # is a constant if 'x' is None): yrange(lo, hi) returns the
+        # lowest and highest value of y, as Fractions, for 'x' in
+        # [lo, hi].  Samples more bits of u and more digits of 'x' as
+        # needed.  This is the exact fallback for the table-based
+        # tests in exponential_psrn and normal_psrn.
+        while True:
+            if samplerstats.active != None:
+                samplerstats.active.add("RandomGen._zigaccept", "refinements")
+            k = max(32, vbits)
+            v = (v << k) | self.randbits(k)
+            vbits += k
+            if x == None:
+                ylo, yhi = yrange(None, None)
+            else:
+                x.fill(self, 16)
+                lo = Fraction((x.intpart << x.length) | x.prefix(self, x.length))
+                lo /= 1 << x.length
+                ylo, yhi = yrange(lo, lo + Fraction(1, 1 << x.length))
+            if (v + 1) * num <= _expminusbounds(yhi, vbits)[0] * den:
+                return 1
+            if v * num >= _expminusbounds(ylo, vbits)[1] * den:
+                return 0
+
+    def exponential_psrn(self):
+        """Generates an exponential random variate with rate 1, as a
+        PSRN object (see betadist.PSRN) whose unsampled digits can be
+        filled uniformly at random, for example with psrn_fill_many.
+        Exact; this is a ziggurat-style sampler over 2^8 equal-width
+        layers in [0, 1) whose tables hold 64-bit bounds on exp(-x)
+        at the layer edges.  The exact but slower comparisons are used
+        only in the rare cases where those bounds don't decide a test."""
+        lo, hi, w, layers = _zigtables()
+        nl = 1 << _ZIG_LAYERBITS
+        one = 1 << 32
+        # Integer part: each step taken with probability exp(-1)
+        g = 0
+        while True:
+            v = self.randbits(32)
+            if (v + 1) << 32 <= lo[nl]:
+                g += 1
+            elif v << 32 >= hi[nl]:
+                break
+            elif self._zigaccept(v, 32, 1, 1, lambda a, b: (Fraction(1), Fraction(1))):
+                g += 1
+            else:
+                break
+        # Next digits: the layer, chosen with probability proportional
+        # to exp(-j/2^8): layer j is proposed with probability
+        # proportional to w[j] and accepted with probability
+        # exp(-j/2^8)/(w[j]/2^24)
+        while True:
+            j = layers.next(self)
+            v = self.randbits(32)
+            if ((v + 1) * w[j]) << 8 <= lo[j]:
+                break
+            y = Fraction(j, nl)
+            if self._zigaccept(v, 32, w[j] << 40, 1 << 64, lambda a, b: (y, y)):
+                break
+            if samplerstats.active != None:
+                samplerstats.active.add("RandomGen.exponential_psrn", "rejections")
+        # Remaining digits: a variate t in [0, 1) with density
+        # proportional to exp(-t/2^8), of which 8 digits are
+        # sampled at first.  For those digits, exp(-t/2^8) is at least
+        # 1-(t+1)/2^16 and at most 1-t/2^16+(t/2^16)^2/2.
+        while True:
+            v = self.randbits(40)
+            t = v >> 32
+            v &= one - 1
+            if v + 1 <= one - ((t + 1) << 16):
+                ret = PSRN(1, g)
+                ret.appendbits((j << 8) | t, _ZIG_LAYERBITS + 8)
+                return ret
+            if v >= one - (t << 16) + (t * t + 1) // 2:
+                if samplerstats.active != None:
+                    samplerstats.active.add("RandomGen.exponential_psrn", "rejections")
+                continue
+            x = PSRN()
+            x.appendbits(t, 8)
+            if self._zigaccept(v, 32, 1, 1, lambda a, b: (a / nl, b / nl), x):
+                ret = PSRN(1, g)
+                ret.appendbits(j, _ZIG_LAYERBITS)
+                ret.appendbits(x.bits, x.length)
+                return ret
+            if samplerstats.active != None:
+                samplerstats.active.add("RandomGen.exponential_psrn", "rejections")
 
     def _logisticexp(self, ln, ld, prec):
         denom = ld * 2**prec
@@ -2956,6 +4009,75 @@ class RandomGen:
     def multinormal(self, mu, cov):
         return self.multinormal_n(mu, cov, 1)[0]
 
+    def _numpygen(self):
+        # Creates a NumPy random generator seeded with 128 bits
+        # from this object's bit pool, so that array variates
+        # follow the same seeding as the rest of this class.
+        import numpy
+
+        return numpy.random.Generator(numpy.random.PCG64(self.randbits(128)))
+
+    def normal_array(self, n, mu=0.0, sigma=1.0):
+        """Generates 'n' normally-distributed random variates as a NumPy
+        array.  Same parameters as 'normal'.  Requires NumPy."""
+        return self._numpygen().normal(mu, sigma, n)
+
+    def lognormal_array(self, n, mu=0.0, sigma=0.0):
+        """Generates 'n' variates distributed as in 'lognormal', as a NumPy
+        array.  Requires NumPy."""
+        return self._numpygen().lognormal(mu, sigma, n)
+
+    def exponential_array(self, n, lamda=1.0):
+        """Generates 'n' exponential random variates with rate 'lamda', as
+        a NumPy array.  Requires NumPy."""
+        return self._numpygen().exponential(1.0 / lamda, n)
+
+    def weibull_array(self, n, a, b):
+        """Generates 'n' variates distributed as in 'weibull', as a NumPy
+        array.  Requires NumPy."""
+        return self._numpygen().weibull(a, n) * b
+
+    def gumbel_array(self, n, a, b):
+        """Generates 'n' variates distributed as in 'gumbel', as a NumPy
+        array.  Requires NumPy."""
+        import numpy
+
+        return a + numpy.log(self._numpygen().standard_exponential(n)) * b
+
+    def pareto_array(self, n, minimum, alpha):
+        """Generates 'n' variates distributed as in 'pareto', as a NumPy
+        array.  Requires NumPy."""
+        # NumPy's 'pareto' is shifted to start at 0 (Lomax distribution)
+        return (self._numpygen().pareto(alpha, n) + 1) * minimum
+
+    def gamma_array(self, n, mean, b=1.0, c=1.0, d=0.0):
+        """Generates 'n' variates distributed as in 'gamma', as a NumPy
+        array.  Requires NumPy."""
+        if mean <= 0:
+            raise ValueError
+        ret = self._numpygen().standard_gamma(mean, n)
+        if c != 1.0:
+            ret = ret ** (1.0 / c)
+        return ret * b + d
+
+    def multinormal_array(self, mu, cov, n=1):
+        """Generates 'n' variates distributed as in 'multinormal', as
+        a NumPy array with 'n' rows.  Requires NumPy."""
+        import numpy
+
+        mulen = len(cov)
+        if mu != None:
+            mulen = len(mu)
+            if mulen != len(cov):
+                raise ValueError
+            if mulen != len(cov[0]):
+                raise ValueError
+        cho = numpy.array(self._decompose(cov), dtype=float)
+        ret = self._numpygen().standard_normal((n, mulen)) @ cho
+        if mu != None:
+            ret += numpy.array(mu, dtype=float)
+        return ret
+
     def upper_bound_copula(self, n=2):
         x = self.rndu01()  # Generate number once
         return [x for i in range(n)]
@@ -3940,52 +5062,32 @@ class RandomGen:
         ret.append([i, lastv])
         return ret
 
-    def _kthsmallest_internal(self, ret, index, n, k, compl=0):
-        # Generate a sorted list of uniform PSRNs in the portion
-        # of ret at the position range [index, n + index].
-        # compl=0 -> kth smallest; compl=1 -> kth largest
-        # Early exit if we go beyond the kth smallest index
-        if index >= k:
-            return
-        # Each uniform (0, 1) random variate is equally likely to
-        # be less than half or greater than half; thus, the number
-        # of uniform numbers that are less than half vs. greater
-        # than half follows a binomial(n, 1/2) distribution.
-        # The same applies to other digits in the number's
-        # binary expansion, such as 1/4, 1/8, 1/16, etc.
-        leftcount = self.binomial(n, 0.5)
-        rightcount = n - leftcount
-        clearbit = compl
-        setbit = 1 - compl
-        # Add clear bit to left-hand side
-        for i in range(index, index + leftcount):
-            ret[i][2].append(clearbit)
-        # Recurse for left-hand side
-        if leftcount > 1:
-            self._kthsmallest_internal(ret, index, leftcount, k, compl)
-        # Add set bit to right-hand side
-        if index + leftcount < k:
-            for i in range(index + leftcount, index + n):
-                ret[i][2].append(setbit)
-            # Recurse for right-hand side
-            if rightcount > 1:
-                self._kthsmallest_internal(ret, index + leftcount, rightcount, k, compl)
-
     def kthsmallest_psrn(self, n, k):
         """Generates the 'k'th smallest 'b'-bit uniform random
         number out of 'n' of them; returns the result in
         the form of a uniform partially-sampled random variate."""
         if k <= 0 or k > n:
             raise ValueError
-        ret = [psrn_new_01() for i in range(n)]
-        if k < n / 2:
-            # kth smallest
-            self._kthsmallest_internal(ret, 0, n, k, 0)
-            return ret[k - 1]
-        else:
-            # (n-k+1)th largest
-            self._kthsmallest_internal(ret, 0, n, n - k + 1, 1)
-            return ret[n - k]
+        # Each uniform (0, 1) random variate is equally likely to
+        # be less than half or greater than half; thus, the number
+        # of uniform numbers that are less than half vs. greater
+        # than half follows a binomial(n, 1/2) distribution.
+        # The same applies to other digits in the number's
+        # binary expansion, such as 1/4, 1/8, 1/16, etc.  Only the
+        # count of numbers sharing the kth smallest number's digits
+        # so far is tracked, and once that number is alone, its
+        # remaining digits are uniform.
+        digits = []
+        while n > 1:
+            leftcount = self.binomial_int(n, 1, 2)
+            if k <= leftcount:
+                digits.append(0)
+                n = leftcount
+            else:
+                digits.append(1)
+                k -= leftcount
+                n -= leftcount
+        return [1, 0, digits]
 
     def kthsmallest(self, n, k, b):
         """Generates the 'k'th smallest 'b'-bit uniform random
@@ -3994,6 +5096,17 @@ class RandomGen:
             raise ValueError
         return psrn_fill(self, self.kthsmallest_psrn(n, k), precision=b)
 
+    def kthsmallest_many(self, pairs, b):
+        """Generates, for each pair (n, k) in the list 'pairs', the 'k'th
+        smallest 'b'-bit uniform random number out of 'n' of them;
+        returns a list of the results."""
+        psrns = []
+        for n, k in pairs:
+            if k <= 0 or k > n:
+                raise ValueError
+            psrns.append(self.kthsmallest_psrn(n, k))
+        return psrn_fill_many(self, psrns, precision=b)
+
     def fromDyadicDecompCode(self, code, precision=53):
         """Generates a uniform random variate contained in a box described
             by the specified universal dyadic decomposition code.
@@ -4363,7 +5476,7 @@ def _gaussKronrod(func, mn, mx, direction=1, depth=0):
             func, bp, mx, direction, depth + 1
         )
 
-class RatioOfUniformsTiling:
+class RatioOfUniformsTiling(_SavedTables):
     """Produces a tiling for the purposes
          of fast sampling from a probability distribution via the
          ratio of uniforms method.
@@ -4397,6 +5510,9 @@ class RatioOfUniformsTiling:
      Philipps-Universität Marburg, 2009.
     """
 
+    _STATEFIELDS = ("tiles",)
+    _KEEPSPDF = True
+
     def __init__(self, pdf, mode=0, y0=-10, y1=10, cycles=8):
         self.pdf = pdf
         x0 = math.sqrt(self.pdf(mode))
@@ -4565,7 +5681,7 @@ class RatioOfUniformsTiling:
             if tile[2] or x <= math.sqrt(self.pdf(ret)):
                 return ret
 
-class DensityTiling:
+class DensityTiling(_SavedTables):
     """Produces a tiling of a probability density function (PDF)
          for the purposes of random variate generation.  The PDF is
          decomposed into tiles; these tiles will either cross the PDF
@@ -4600,6 +5716,9 @@ class DensityTiling:
      arXiv:0902.3088v1  [cs.MS], 2009.
     """
 
+    _STATEFIELDS = ("tiles", "poles")
+    _KEEPSPDF = True
+
     def __init__(self, pdf, bl, br, cycles=8):
         self.pdf = pdf
         self.poles = []
@@ -4760,7 +5879,7 @@ class DensityTiling:
             if y < self._evalpdf(x):
                 return x
 
-class DensityInversionSampler:
+class DensityInversionSampler(_SavedTables):
     """A sampler that generates random samples from
       a continuous distribution for which
       only the probability density function (PDF) is known,
@@ -4794,6 +5913,8 @@ class DensityInversionSampler:
       and Computer Simulation 20(4) article 18, October 2010.
     """
 
+    _STATEFIELDS = ("integral", "table")
+
     def __init__(self, pdf, bl, br, ures=1e-8):
         if bl > br:
             raise ValueError
@@ -5044,6 +6165,37 @@ class AlmostRandom:
         self.index += 1
         return item
 
+# Samplers timed and counted while a samplerstats.SamplerStats is active.
+# The methods that only fetch random bits or integers are left out.
+samplerstats.register(
+    RandomGen,
+    exclude=(
+        "randbits",
+        "randbit",
+        "rndint",
+        "rndint_fastdiceroller",
+        "rndint_fastdiceroller_words",
+        "rndintexc",
+        "rndintrange",
+        "rndintexcrange",
+    ),
+)
+for _cls in (
+    VoseAlias,
+    BringmannLarsen,
+    FastLoadedDiceRoller,
+    SortedAliasMethod,
+    OptimalSampler,
+    WeightedSampler,
+    DynamicWeightedSampler,
+    ConvexPolygonSampler,
+    RatioOfUniformsTiling,
+    DensityTiling,
+    DensityInversionSampler,
+    PrefixDistributionSampler,
+):
+    samplerstats.register(_cls, exclude=("codegen",))
+
 # Examples of use
 if __name__ == "__main__":
     # Initialize random generator
@@ -0,0 +1,198 @@
+#
+#  Instrumentation for the samplers in randomgen.py, betadist.py,
+#  bernoulli.py and moore.py: counts of calls, random bits drawn,
+#  loop iterations, rejections and precision refinements, and
+#  wall-clock time per sampler.
+#
+#  Written by Peter O. Any copyright to this file is released to the Public Domain.
+#  In case this is not possible, this file is also licensed under Creative Commons Zero
+#  (https://creativecommons.org/publicdomain/zero/1.0/).
+#
+#  Example:
+#
+#      import samplerstats
+#      with samplerstats.SamplerStats() as stats:
+#          for i in range(1000):
+#              rg.gamma(2)
+#      print(stats.report())
+#
+#  While a SamplerStats is active (inside its 'with' block), the
+#  public methods of the classes given to 'register', and the
+#  functions decorated with 'function', are wrapped so
+#  that each call adds to the "calls", "seconds" and "bits" counts
+#  of that method; these counts include any nested sampler calls.
+#  Samplers also report events of their own, such as "rejections",
+#  "iterations" and "refinements", through 'active'.  When no
+#  SamplerStats is active, the methods are left unwrapped and
+#  reporting an event costs only a test of 'samplerstats.active',
+#  so disabled instrumentation has next to no overhead.
+#
+#  The instrumentation is global, not per thread.
+#
+
+import time
+import types
+
+# The SamplerStats now collecting counts, or None.  Samplers that
+# report events do so as follows:
+#     if samplerstats.active != None:
+#         samplerstats.active.add("Class.method", "rejections")
+active = None
+
+_registry = []
+_installed = False
+
+def bitsused(rg):
+    """Returns the number of random bits drawn from the random
+    generator 'rg' so far, or None if 'rg' doesn't keep track of that.
+    Supports RandomGen (randomgen.py), Bernoulli (bernoulli.py),
+    any object with a 'totalbits' or 'totalfetchedbits' attribute,
+    and any object that keeps one of these in an 'rg' attribute (such
+    as MooreSampler)."""
+    if hasattr(rg, "bitpool"):
+        return rg.bitpool.bitsused()
+    if hasattr(rg, "totalbits"):
+        return rg.totalbits
+    if hasattr(rg, "totalfetchedbits"):
+        return rg.totalfetchedbits
+    if hasattr(rg, "rg"):
+        return bitsused(rg.rg)
+    return None
+
+def register(cls, exclude=()):
+    """Registers the public methods of the class 'cls', other than
+    those named in 'exclude', to be timed and counted while a
+    SamplerStats is active.  Methods that only fetch random bits or
+    integers should be excluded, since wrapping them would mostly
+    measure the wrapper."""
+    for name, func in list(cls.__dict__.items()):
+        if (
+            name.startswith("_")
+            or name in exclude
+            or not isinstance(func, types.FunctionType)
+        ):
+            continue
+        _registry.append((cls, name, func))
+        if _installed:
+            setattr(cls, name, _wrap(cls.__name__ + "." + name, func))
+
+def function(key):
+    """Decorator for a module-level sampler function whose first
+    argument is the random generator, such as the PSRN functions
+    of betadist.py.  While a SamplerStats is active, each call adds
+    to the "calls", "seconds" and "bits" counts of the sampler named
+    'key'.  Unlike the methods given to 'register', the function
+    stays wrapped (other modules may hold a reference to it), so
+    each call costs one more test of 'active' when none is active."""
+    return lambda func: _wrap(key, func)
+
+def _wrap(key, func):
+    def wrapper(self, *args, **kwargs):
+        stats = active
+        if stats == None:
+            return func(self, *args, **kwargs)
+        # Count bits drawn from the object itself, or else from a
+        # random generator passed as the first argument, as in
+        # the 'next(rg)' methods of the weighted samplers
+        rg = self
+        bits = bitsused(self)
+        if bits == None and len(args) > 0:
+            rg = args[0]
+            bits = bitsused(rg)
+        t = time.perf_counter()
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            stats.add(key, "seconds", time.perf_counter() - t)
+            stats.add(key, "calls")
+            if bits != None:
+                stats.add(key, "bits", bitsused(rg) - bits)
+
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    wrapper.__wrapped__ = func
+    return wrapper
+
+def _install():
+    global _installed
+    if not _installed:
+        for cls, name, func in _registry:
+            setattr(cls, name, _wrap(cls.__name__ + "." + name, func))
+        _installed = True
+
+def _uninstall():
+    global _installed
+    if _installed:
+        for cls, name, func in _registry:
+            setattr(cls, name, func)
+        _installed = False
+
+class SamplerStats:
+    """Collects counts reported by samplers while active.  Use it
+    as a context manager ('with SamplerStats() as stats: ...');
+    instances can be nested, in which case only the innermost one
+    collects counts.
+    - callback: Optional function called as callback(sampler, event, count)
+      for each count added, for example to forward counts to a
+      monitoring system.  Default is None."""
+
+    def __init__(self, callback=None):
+        self.counts = {}
+        self.callback = callback
+        self._previous = None
+
+    def add(self, sampler, event, count=1):
+        """Adds 'count' to the count of 'event' (such as "rejections")
+        for the sampler named 'sampler' (such as "RandomGen.gamma")."""
+        key = (sampler, event)
+        self.counts[key] = self.counts.get(key, 0) + count
+        if self.callback != None:
+            self.callback(sampler, event, count)
+
+    def get(self, sampler, event):
+        """Returns the count of 'event' for the sampler named 'sampler',
+        or 0 if there is none."""
+        return self.counts.get((sampler, event), 0)
+
+    def samplers(self):
+        """Returns the counts collected so far as a dictionary that maps
+        each sampler's name to a dictionary of its event counts."""
+        ret = {}
+        for (sampler, event), count in self.counts.items():
+            ret.setdefault(sampler, {})[event] = count
+        return ret
+
+    def report(self):
+        """Returns a text table of the counts collected so far, one
+        line per sampler, with per-call averages where calls were
+        counted."""
+        lines = []
+        for sampler, events in sorted(self.samplers().items()):
+            calls = events.get("calls", 0)
+            parts = []
+            for event in sorted(events):
+                count = events[event]
+                if event == "seconds":
+                    part = "seconds=%.6f" % count
+                else:
+                    part = "%s=%d" % (event, count)
+                if calls > 0 and event != "calls":
+                    part += " (%.4g/call)" % (count / calls)
+                parts.append(part)
+            lines.append("%s: %s" % (sampler, ", ".join(parts)))
+        return "\n".join(lines)
+
+    def __enter__(self):
+        global active
+        self._previous = active
+        active = self
+        _install()
+        return self
+
+    def __exit__(self, *exc):
+        global active
+        active = self._previous
+        self._previous = None
+        if active == None:
+            _uninstall()
+        return False
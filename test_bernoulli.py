@@ -0,0 +1,181 @@
+import bisect
+import math
+import random
+from fractions import Fraction
+
+import bernoulli
+
+# Lower and upper Bernstein coefficients for f(x) = 1/4 + x*(1-x):
+# the degree-n coefficients of f, minus and plus 1/(8*n)
+def _fbelow(n, k):
+    if n < 2:
+        return Fraction(0)
+    return Fraction(1, 4) + Fraction(k * (n - k), n * (n - 1)) - Fraction(1, 8 * n)
+
+def _fabove(n, k):
+    if n < 2:
+        return Fraction(1)
+    return Fraction(1, 4) + Fraction(k * (n - k), n * (n - 1)) + Fraction(1, 8 * n)
+
+def _fbound(n):
+    return (0, 1)
+
+def _halflow(f, n, k, v):
+    return int(Fraction(f(n, k)) * v) // 2
+
+def test_simulatecache_keyed_on_rounding():
+    a = bernoulli._simulatecache(
+        _fbelow, _fabove, bernoulli._fractionlow, bernoulli._fractionhigh
+    )
+    b = bernoulli._simulatecache(
+        _fbelow, _fabove, bernoulli._fractionlow, bernoulli._fractionhigh
+    )
+    c = bernoulli._simulatecache(_fbelow, _fabove, _halflow, bernoulli._fractionhigh)
+    assert a is b
+    assert a is not c
+    assert a.coeff(4, 2) != c.coeff(4, 2)
+
+def _coin(p=0.6):
+    return 1 if random.random() < p else 0
+
+def _assertfreq(count, n, p):
+    assert abs(count - n * p) <= 5 * math.sqrt(n * p * (1 - p)) + 1
+
+def _enterprises():
+    coins = bernoulli.DiceEnterprise()
+    coins.append_poly(1, [[1, 2, 0]]).append_poly(0, [[2, 1, 1], [1, 0, 2]])
+    dice = bernoulli.DiceEnterprise()
+    dice.append_poly(0, [[1, 2, 0, 0]]).append_poly(1, [[1, 0, 2, 0]])
+    dice.append_poly(2, [[1, 0, 0, 2]])
+    return coins, dice
+
+def _die():
+    u = random.random()
+    return 0 if u < 0.2 else 1 if u < 0.5 else 2
+
+def test_dice_enterprise_next_n():
+    coins, dice = _enterprises()
+    coins.bern.r.seed(1)
+    random.seed(2)
+    n = 10000
+    _assertfreq(sum(coins.next_n(_coin, n)), n, coins._calcprob(0.6))
+    _assertfreq(sum(coins.next(_coin) for _ in range(2000)), 2000, coins._calcprob(0.6))
+    assert coins.next_n(_coin, 0) == []
+    x = dice.next_n(_die, n)
+    for r in range(3):
+        _assertfreq(x.count(r), n, dice._calcprob([0.2, 0.3, 0.5], r))
+    assert bernoulli.DiceEnterprise().next_n(_coin, 3) == [0, 0, 0]
+
+def test_dice_enterprise_next_n_processes():
+    coins, _ = _enterprises()
+    coins.bern.r.seed(3)
+    x = coins.next_n(_coin, 4001, processes=2)
+    assert len(x) == 4001
+    _assertfreq(sum(x), 4001, coins._calcprob(0.6))
+
+def test_dice_enterprise_codegen():
+    for ent, coin, ps, results in zip(
+        _enterprises(), (_coin, _die), (0.6, [0.2, 0.3, 0.5]), (2, 3)
+    ):
+        ns = {}
+        exec(ent.codegen("f"), ns)
+        random.seed(4)
+        n = 10000
+        x = [ns["f"](coin) for _ in range(n)]
+        for r in range(results):
+            _assertfreq(x.count(r), n, ent._calcprob(ps, r))
+
+def _simulate_n(n, scaled, cache=True):
+    b = bernoulli.Bernoulli()
+    b.r.seed(7)
+    r = random.Random(8)
+    coin = lambda: 1 if r.random() < 0.3 else 0
+    return [
+        b.simulate(coin, _fbelow, _fabove, _fbound, cache=cache, scaled=scaled)
+        for _ in range(n)
+    ]
+
+def test_simulate_scaled():
+    # f(0.3) = 1/4 + 0.3*0.7 = 0.46
+    x = _simulate_n(4000, True)
+    _assertfreq(sum(x), len(x), 0.46)
+    # Same results as with Fractions, given the same random bits
+    assert x == _simulate_n(4000, False)
+    assert x[:500] == _simulate_n(500, True, cache=False)
+
+def _fldrfreqs(weights, n, seed):
+    b = bernoulli.Bernoulli()
+    b.r.seed(seed)
+    fldr = bernoulli._FastLoadedDiceRoller(weights)
+    freqs = [0] * len(weights)
+    for i in range(n):
+        freqs[fldr.next(b)] += 1
+    return fldr, freqs
+
+def test_fast_loaded_dice_roller_distribution():
+    n = 20000
+    for weights in (
+        [1, 2, 3, 0, 4],
+        [Fraction(1, 3), Fraction(1, 6), 0.5],
+        [5],
+    ):
+        fldr, freqs = _fldrfreqs(weights, n, 3)
+        total = sum(Fraction(w) for w in weights)
+        for f, w in zip(freqs, weights):
+            _assertfreq(f, n, float(Fraction(w) / total))
+
+def test_fast_loaded_dice_roller_many_weights():
+    # More than 1000 weights: the levels are found with NumPy if
+    # it's available, and must match those of randomgen's roller
+    import randomgen
+
+    weights = [(i * 7) % 11 for i in range(1500)]
+    n = 20000
+    fldr, freqs = _fldrfreqs(weights, n, 4)
+    other = randomgen.FastLoadedDiceRoller(weights)
+    assert fldr.labels == other.labels and fldr.leaves == other.leaves
+    total = sum(weights)
+    for r in range(11):
+        # Outcomes grouped by weight
+        count = sum(f for f, w in zip(freqs, weights) if w == r)
+        _assertfreq(count, n, r * weights.count(r) / total)
+
+def _cftpresults(ent, cftp, coin, n):
+    # Results of 'n' runs of one of the coupling-from-the-past
+    # methods, mapped to results as 'next' does
+    ent.next(coin)  # Compiles the ladder
+    ret = []
+    for i in range(n):
+        s = cftp(coin)
+        ret.append(s[1][0] if s[0] == None else s[1][s[0].next(ent.bern)])
+    return ret
+
+def test_dice_enterprise_cftp_univariate():
+    coins, _ = _enterprises()
+    skewed = bernoulli.DiceEnterprise()
+    skewed.append_poly(1, [[3, 4, 0], [1, 1, 3]]).append_poly(0, [[1, 0, 4]])
+    coins.bern.r.seed(5)
+    skewed.bern.r.seed(6)
+    random.seed(7)
+    n = 10000
+    for ent, p in ((coins, 0.6), (skewed, 0.9), (skewed, 0.1)):
+        coin = lambda: 1 if random.random() < p else 0
+        assert ent._is_univariate()
+        # Both the monotone and the general method must give the
+        # ladder's distribution, including when the horizon must
+        # double many times (p near 0 or 1)
+        for cftp in (ent._monotoniccftp, ent._cftp):
+            x = _cftpresults(ent, cftp, coin, n)
+            _assertfreq(sum(x), n, ent._calcprob(p))
+
+def test_dice_enterprise_cftp_multivariate():
+    _, dice = _enterprises()
+    dice.bern.r.seed(8)
+    random.seed(9)
+    n = 10000
+    for ps in ([0.2, 0.3, 0.5], [0.7, 0.2, 0.1]):
+        die = lambda: bisect.bisect_right([ps[0], ps[0] + ps[1]], random.random())
+        assert not dice._is_univariate()
+        x = _cftpresults(dice, dice._cftp, die, n)
+        for r in range(3):
+            _assertfreq(x.count(r), n, dice._calcprob(ps, r))
@@ -0,0 +1,370 @@
+import decimal
+import math
+import random
+from fractions import Fraction
+
+import betadist
+import randomgen
+import samplerstats
+from betadist import (
+    PSRN,
+    RandUniform,
+    RealAdd,
+    RealDivide,
+    RealExp,
+    RealFraction,
+    RealLn,
+    RealMultiply,
+    RealPi,
+    RealPow,
+    RealSubtract,
+    _sharedReal,
+    logbinco,
+    psrn_add,
+    psrn_add_fraction,
+    psrn_fill_many,
+    psrn_less,
+    psrn_less_than_fraction,
+    psrn_multiply,
+    psrn_multiply_by_fraction,
+    realIsLess,
+)
+
+def _rg(seed=1):
+    return randomgen.RandomGen(random.Random(seed))
+
+def test_psrn_fromlist_round_trip():
+    for lst in (
+        [1, 0, []],
+        [-1, 3, [0, 1, None, 1]],
+        [1, 2, [None, None, 0, 1, 1, 0, 1, 0, 0, 1]],
+    ):
+        p = PSRN.fromlist(lst)
+        assert p.tolist() == lst
+        # Also callable on an instance
+        assert p.fromlist(lst).tolist() == lst
+        assert PSRN.fromlist(p.tolist()).tolist() == lst
+
+def test_psrn_prefix_fills_unsampled():
+    p = PSRN.fromlist([1, 0, [1, None, 0]])
+    v = p.prefix(_rg(), 8)
+    assert p.isfullysampled()
+    assert p.length == 8
+    assert v >> 7 == 1
+    assert (v >> 5) & 1 == 0
+
+def test_psrn_fill_many_outputs():
+    lists = [[1, 0, []], [-1, 2, [1, 0]], [1, 0, [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1]]]
+    for output in ("float", "fraction", "pair"):
+        for significant in (False, True):
+            # PSRN objects and the list form take the same random digits
+            a = psrn_fill_many(
+                _rg(), [PSRN.fromlist(x) for x in lists], 20, output, 16, significant
+            )
+            psrns = [[x[0], x[1], list(x[2])] for x in lists]
+            b = psrn_fill_many(_rg(), psrns, 20, output, 16, significant)
+            assert a == b
+            if output == "pair":
+                a = [Fraction(n) * Fraction(2) ** e for n, e in a]
+            for v, psrn in zip(a, psrns):
+                # Each result is the PSRN's digits rounded to the precision
+                prec = len(psrn[2]) - 1
+                digits = int("".join(str(d) for d in psrn[2]), 2)
+                exact = psrn[1] + Fraction(digits, 1 << len(psrn[2]))
+                if significant:
+                    assert exact * (1 << prec) >= 1 << 19
+                else:
+                    assert prec == 20
+                assert abs(abs(Fraction(v)) - exact) <= Fraction(1, 1 << (prec + 1))
+                assert (v < 0) == (psrn[0] < 0)
+
+def test_psrn_fill_many_uniform():
+    v = psrn_fill_many(_rg(), [[1, 0, []] for _ in range(20000)])
+    assert all(0 <= x <= 1 for x in v)
+    assert abs(sum(v) / len(v) - 0.5) < 0.01
+    assert len(set(v)) == len(v)
+
+def _randompsrnlist(r, sign=1):
+    return [
+        sign,
+        r.randrange(2),
+        [r.choice([0, 1, 1, None]) for _ in range(r.randrange(12))],
+    ]
+
+def _copylist(psrn):
+    return [psrn[0], psrn[1], list(psrn[2])]
+
+def test_psrn_less_list_and_packed_agree():
+    r = random.Random(5)
+    for i in range(2000):
+        a = _randompsrnlist(r)
+        b = _copylist(a) if r.randrange(4) == 0 else _randompsrnlist(r)
+        if r.randrange(3) == 0:
+            # Same digits except for an unsampled or extra tail
+            b = [a[0], a[1], [d if r.randrange(3) else None for d in a[2]]]
+            b[2] += [r.randrange(2) for _ in range(r.randrange(40))]
+        la, lb = _copylist(a), _copylist(b)
+        pa, pb = PSRN.fromlist(a), PSRN.fromlist(b)
+        ret = psrn_less(_rg(i), la, lb)
+        assert psrn_less(_rg(i), pa, pb) == ret
+        assert pa.tolist() == la and pb.tolist() == lb
+        # Mixed forms
+        la2 = _copylist(a)
+        pb2 = PSRN.fromlist(b)
+        assert psrn_less(_rg(i), la2, pb2) == ret
+        assert la2 == la and pb2.tolist() == lb
+
+def test_psrn_less_than_fraction_list_and_packed_agree():
+    r = random.Random(6)
+    for i in range(2000):
+        a = _randompsrnlist(r, r.choice([-1, 1]))
+        den = r.choice([3, 8, 10, 1 << 20, (1 << 61) - 1])
+        frac = Fraction(r.randrange(den * 2), den) * a[0]
+        la = _copylist(a)
+        pa = PSRN.fromlist(a)
+        ret = psrn_less_than_fraction(_rg(i), la, frac)
+        assert psrn_less_than_fraction(_rg(i), pa, frac) == ret
+        assert pa.tolist() == la
+
+def test_psrn_less_probabilities():
+    rg = _rg()
+    n = 20000
+    tests = [
+        (lambda: psrn_less(rg, [1, 0, []], [1, 0, []]), 0.5),
+        (lambda: psrn_less(rg, PSRN(), [1, 0, [1, None]]), 0.75),
+        (lambda: psrn_less_than_fraction(rg, [1, 0, []], Fraction(1, 3)), 1 / 3),
+        (lambda: psrn_less_than_fraction(rg, PSRN(), Fraction(5, 8)), 0.625),
+        (lambda: psrn_less_than_fraction(rg, [-1, 0, [0]], Fraction(-1, 3)), 1 / 3),
+    ]
+    for f, p in tests:
+        count = sum(f() for _ in range(n))
+        assert abs(count - n * p) <= 5 * (n * p * (1 - p)) ** 0.5
+
+def _randfrac(r, lo=-60, hi=60):
+    f = Fraction(r.randint(1, 1 << 60), r.randint(1, 1 << 60))
+    f *= Fraction(2) ** r.randint(lo, hi)
+    return f if r.randint(0, 1) == 0 else -f
+
+def _neartie(r, x):
+    # A Fraction just above or below x, by a relative distance
+    # from well within to well beyond double precision
+    d = abs(x) * Fraction(1, 1 << r.choice([10, 45, 52, 53, 60, 120]))
+    if d == 0:
+        d = Fraction(1, 1 << 200)
+    return x + d if r.randint(0, 1) == 0 else x - d
+
+def test_realisless_rational_operations():
+    r = random.Random(5)
+    ops = [
+        (RealAdd, lambda a, b: a + b),
+        (RealSubtract, lambda a, b: a - b),
+        (RealMultiply, lambda a, b: a * b),
+        (RealDivide, lambda a, b: a / b),
+    ]
+    for i in range(400):
+        # Exponents beyond the range of floats, too
+        lo, hi = r.choice([(-60, 60), (-1100, -900), (900, 1100)])
+        a = _randfrac(r, lo, hi)
+        b = _randfrac(r, lo, hi)
+        cls, op = ops[i % len(ops)]
+        exact = op(a, b)
+        c = _neartie(r, exact)
+        x = cls(RealFraction(a), RealFraction(b))
+        assert realIsLess(x, c) == (exact < c)
+        assert realIsLess(c, x) == (c < exact)
+        assert realIsLess(x, RealFraction(c)) == (exact < c)
+
+def test_realisless_powers():
+    r = random.Random(6)
+    for i in range(200):
+        a = _randfrac(r, -8, 8)
+        k = r.randint(2, 9)
+        exact = a**k
+        c = _neartie(r, exact)
+        assert realIsLess(RealPow(RealFraction(a), k), c) == (exact < c)
+
+_PI = Fraction("3.14159265358979323846264338327950288419716939937510582097494")
+
+def _decimalfraction(r, f):
+    # A Fraction just above or below a Decimal or Fraction
+    # approximation, by far more than that approximation's error
+    c = Fraction(f)
+    d = abs(c) * Fraction(1, 1 << r.choice([20, 52, 53, 70, 100]))
+    return c + d if r.randint(0, 1) == 0 else c - d
+
+def test_realisless_transcendental():
+    ctx = decimal.Context(prec=80)
+    r = random.Random(7)
+    for i in range(60):
+        a = Fraction(r.randint(-(1 << 60), 1 << 60), 1 << r.randint(55, 70))
+        c = _decimalfraction(r, ctx.exp(ctx.divide(a.numerator, a.denominator)))
+        exact = Fraction(ctx.exp(ctx.divide(a.numerator, a.denominator)))
+        assert realIsLess(RealExp(RealFraction(a)), c) == (exact < c)
+        a = abs(_randfrac(r, -300, 300))
+        la = ctx.ln(ctx.divide(a.numerator, a.denominator))
+        c = _decimalfraction(r, la)
+        assert realIsLess(RealLn(RealFraction(a)), c) == (Fraction(la) < c)
+        f = abs(_randfrac(r, -10, 10))
+        c = _decimalfraction(r, _PI * f)
+        assert realIsLess(RealPi(f), c) == (_PI * f < c)
+
+def _psrninterval(psrn, digits=2):
+    # The interval that a list-form PSRN or a PSRN covers
+    if isinstance(psrn, PSRN):
+        psrn = psrn.tolist()
+    v = Fraction(psrn[1])
+    for i, d in enumerate(psrn[2]):
+        v += Fraction(d, digits ** (i + 1))
+    w = Fraction(1, digits ** len(psrn[2]))
+    return (v, v + w) if psrn[0] > 0 else (-v - w, -v)
+
+def test_psrn_kernels_distributions():
+    # Compares each kernel's output with the exact distribution of
+    # its result, computed with Fractions: every output must lie in
+    # the result's support, and the probability of being less than
+    # a given Fraction must match.
+    rg = _rg(3)
+    n = 4000
+    tests = [
+        # X + Y, X, Y uniform on [0, 1]: triangular
+        (lambda: psrn_add(rg, [1, 0, []], [1, 0, []]), (0, 2), Fraction(1, 2), 1 / 8),
+        (lambda: psrn_add(rg, PSRN(), PSRN()), (0, 2), Fraction(3, 2), 7 / 8),
+        # X on [1/2, 1] plus Y on [1/4, 1/2]
+        (
+            lambda: psrn_add(rg, [1, 0, [1]], [1, 0, [0, 1]]),
+            (Fraction(3, 4), Fraction(3, 2)),
+            Fraction(1),
+            1 / 4,
+        ),
+        # -X + Y
+        (lambda: psrn_add(rg, [-1, 0, []], [1, 0, []]), (-1, 1), Fraction(-1, 2), 1 / 8),
+        (
+            lambda: psrn_add_fraction(rg, [1, 0, []], Fraction(1, 3)),
+            (Fraction(1, 3), Fraction(4, 3)),
+            Fraction(1, 2),
+            1 / 6,
+        ),
+        (
+            lambda: psrn_add_fraction(rg, [1, 0, []], Fraction(-5, 4)),
+            (Fraction(-5, 4), Fraction(-1, 4)),
+            Fraction(-1),
+            1 / 4,
+        ),
+        # X * Y: P(X*Y < t) = t - t*ln(t)
+        (
+            lambda: psrn_multiply(rg, [1, 0, []], [1, 0, []]),
+            (0, 1),
+            Fraction(1, 4),
+            0.25 * (1 + math.log(4)),
+        ),
+        (
+            lambda: psrn_multiply_by_fraction(rg, [1, 0, []], Fraction(3, 7)),
+            (0, Fraction(3, 7)),
+            Fraction(1, 7),
+            1 / 3,
+        ),
+        (
+            lambda: psrn_multiply_by_fraction(rg, [1, 0, [1]], Fraction(-2, 3)),
+            (Fraction(-2, 3), Fraction(-1, 3)),
+            Fraction(-1, 2),
+            1 / 2,
+        ),
+    ]
+    for f, (lo, hi), t, p in tests:
+        count = 0
+        for i in range(n):
+            ret = f()
+            while ret == None:
+                # psrn_multiply gives up after too many rejections
+                ret = f()
+            rlo, rhi = _psrninterval(ret)
+            assert lo <= rlo and rhi <= hi
+            count += psrn_less_than_fraction(rg, ret, t)
+        assert abs(count - n * p) <= 5 * (n * p * (1 - p)) ** 0.5
+
+def test_psrn_kernels_base10():
+    rg = _rg(4)
+    n = 4000
+    count = 0
+    for i in range(n):
+        ret = psrn_add_fraction(rg, [1, 0, [3]], Fraction(1, 3), digits=10)
+        rlo, rhi = _psrninterval(ret, 10)
+        assert Fraction(19, 30) <= rlo and rhi <= Fraction(22, 30)
+        count += psrn_less_than_fraction(rg, ret, Fraction(2, 3), digits=10)
+    assert abs(count - n / 3) <= 5 * (n * 2 / 9) ** 0.5
+
+def test_psrn_kernels_samplerstats():
+    rg = _rg(5)
+    with samplerstats.SamplerStats() as stats:
+        for i in range(10):
+            psrn_add(rg, [1, 0, []], [1, 0, []])
+            psrn_multiply_by_fraction(rg, [1, 0, []], Fraction(1, 3))
+    assert stats.get("psrn_add", "calls") == 10
+    assert stats.get("psrn_add", "bits") > 0
+    assert stats.get("psrn_multiply_by_fraction", "calls") == 10
+    psrn_add(rg, [1, 0, []], [1, 0, []])
+    assert stats.get("psrn_add", "calls") == 10
+
+def _evexpressions():
+    # Pairs of a function making a constructive real and a function
+    # returning its value as a Fraction, far more accurate than
+    # the 300 bits tested
+    ctx = decimal.Context(prec=120)
+    a, b = Fraction(7, 3), Fraction(-5, 11)
+    return [
+        (lambda: RealAdd(RealFraction(a), RealFraction(b)), lambda: a + b),
+        (lambda: RealMultiply(RealFraction(a), RealFraction(b)), lambda: a * b),
+        (lambda: RealDivide(RealFraction(b), RealFraction(a)), lambda: b / a),
+        (lambda: RealPow(RealFraction(a), 5), lambda: a**5),
+        (
+            lambda: RealExp(RealFraction(b)),
+            lambda: Fraction(ctx.exp(ctx.divide(b.numerator, b.denominator))),
+        ),
+        (
+            lambda: RealLn(RealFraction(a)) * 3 - 1,
+            lambda: Fraction(ctx.ln(ctx.divide(7, 3))) * 3 - 1,
+        ),
+    ]
+
+def test_ev_cache_mixed_precision():
+    # Cached ev(n) must stay strictly within 1 ulp of the exact value
+    # whatever order the precisions are requested in, as must ev(n)
+    # of a fresh (uncached) object
+    r = random.Random(8)
+    for make, exact in _evexpressions():
+        x = make()
+        for i in range(60):
+            n = r.randint(1, 300)
+            v = exact() * (1 << n)
+            assert abs(x.ev(n) - v) < 1
+            assert abs(make().ev(n) - v) < 1
+
+def test_ev_randuniform_truncates():
+    # Lazily sampled reals are not cached: a lower-precision request
+    # truncates the sampled digits instead of rounding them
+    r = random.Random(9)
+    for i in range(200):
+        u = RandUniform(_rg(i))
+        hi = u.ev(r.randint(2, 80))
+        n = r.randint(1, u.count - 2)
+        assert u.ev(n) == u.bits >> (u.count - n)
+    assert "_evcache_n" not in u.__dict__
+
+def test_shared_real_dag():
+    a = _sharedReal(RealLn, 12345)
+    assert _sharedReal(RealLn, 12345) is a
+    assert _sharedReal(RealLn, 12346) is not a
+    # Terms of logbinco(n, k) for different k share their
+    # common subexpression and its cached approximations
+    x = logbinco(100, 30)
+    y = logbinco(100, 40)
+    x.ev(60)
+    shared = _sharedReal(betadist.RealLogGammaInt, 101)
+    assert shared._evcache_n >= 60
+    refinements = shared._evcache_n
+    y.ev(60)
+    assert shared._evcache_n == refinements
+    # Least recently used entries are evicted
+    for i in range(betadist._SHARED_REALS_MAX):
+        _sharedReal(RealLn, 10**6 + i)
+    assert _sharedReal(RealLn, 12345) is not a
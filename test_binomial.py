@@ -0,0 +1,100 @@
+import decimal
+import math
+import random
+from fractions import Fraction
+
+import binomial
+import randomgen
+
+_SCALE = 1 << binomial._LNBITS
+
+def _sampler(seed, throughput=True):
+    return binomial.BinomialSampler(
+        randomgen.RandomGen(random.Random(seed)), throughput=throughput
+    )
+
+def test_lnfixed_bounds():
+    decimal.getcontext().prec = 80
+    r = random.Random(1)
+    for x in [1, 2, 3, 31, 32, 33, 10**35, 2**64 - 1] + [
+        r.randrange(1, 1 << r.randrange(1, 100)) for _ in range(500)
+    ]:
+        lo, hi = binomial._lnfixed(x)
+        assert lo <= decimal.Decimal(x).ln() * _SCALE <= hi
+
+def test_lnfactfixed_bounds():
+    decimal.getcontext().prec = 80
+    for n in [0, 1, 2, 10, 255, 256, 1000, 5000]:
+        lo, hi = binomial._lnfactfixed(n)
+        assert lo <= decimal.Decimal(math.factorial(n)).ln() * _SCALE <= hi
+
+def test_expfixed_bounds():
+    decimal.getcontext().prec = 80
+    r = random.Random(2)
+    for i in range(500):
+        lo = int(r.uniform(-40, 5) * _SCALE)
+        hi = lo + r.randrange(1 << 20)
+        elo, ehi = binomial._expfixed(lo, hi)
+        assert elo <= (decimal.Decimal(lo) / _SCALE).exp() * _SCALE
+        assert (decimal.Decimal(hi) / _SCALE).exp() * _SCALE <= ehi
+
+def test_throughput_reproducible():
+    a = _sampler(5)
+    b = _sampler(5)
+    assert [a.sample(1000) for _ in range(100)] == [b.sample(1000) for _ in range(100)]
+    a = _sampler(6, False)
+    b = _sampler(6, False)
+    random.seed(1)
+    x = [a.sample(100) for _ in range(30)]
+    random.seed(2)
+    assert x == [b.sample(100) for _ in range(30)]
+
+def test_throughput_distribution():
+    n = 20
+    count = 20000
+    freqs = [0] * (n + 1)
+    for v in _sampler(8).sample_n(n, count):
+        freqs[v] += 1
+    for k in range(n + 1):
+        p = math.comb(n, k) / 2**n
+        assert abs(freqs[k] - count * p) <= 5 * math.sqrt(count * p * (1 - p)) + 1
+
+def _assertbinomial(samples, n, p):
+    # Checks the frequency of each outcome against the binomial(n, p)
+    # distribution, to within five standard deviations
+    count = len(samples)
+    freqs = [0] * (n + 1)
+    for v in samples:
+        freqs[v] += 1
+    for k in range(n + 1):
+        q = float(math.comb(n, k) * Fraction(p) ** k * (1 - Fraction(p)) ** (n - k))
+        assert abs(freqs[k] - count * q) <= 5 * math.sqrt(count * q * (1 - q)) + 1
+
+def _assertmoments(samples, n, p):
+    # Checks the sample mean and variance against those of the
+    # binomial(n, p) distribution
+    count = len(samples)
+    mean = sum(samples) / count
+    var = sum((v - mean) ** 2 for v in samples) / (count - 1)
+    p = float(p)
+    assert abs(mean - n * p) <= 5 * math.sqrt(n * p * (1 - p) / count) + 1e-9
+    assert abs(var - n * p * (1 - p)) <= 0.3 * n * p * (1 - p) + 1e-9
+
+_PROBS = [0, 1, Fraction(1, 3), Fraction(5, 8), Fraction(1, 1000), 0.3, 0.1]
+
+def test_sample_rational_distribution():
+    s = _sampler(9)
+    for p in _PROBS:
+        _assertbinomial([s.sample_rational(10, p) for _ in range(2000)], 10, p)
+        _assertmoments([s.sample_rational(5000, p) for _ in range(500)], 5000, p)
+    assert s.sample_rational(0, Fraction(1, 3)) == 0
+
+def test_binomial_int_distribution():
+    rg = randomgen.RandomGen(random.Random(10))
+    for px, py in [(0, 1), (1, 1), (1, 3), (5, 8), (1, 1000), (7, 10)]:
+        # Trials below and above the point where binomial_int
+        # switches to BinomialSampler share one implementation
+        p = Fraction(px, py)
+        _assertbinomial([rg.binomial_int(10, px, py) for _ in range(2000)], 10, p)
+        for n in (1000, 5000):
+            _assertmoments([rg.binomial_int(n, px, py) for _ in range(500)], n, p)
@@ -0,0 +1,530 @@
+import array
+import decimal
+import math
+import random
+from fractions import Fraction
+
+import randomgen
+
+from randomgen import (
+    BringmannLarsen,
+    FastLoadedDiceRoller,
+    OptimalSampler,
+    RandomGen,
+    SortedAliasMethod,
+    VoseAlias,
+    WeightedSampler,
+)
+
+def _rg(seed=1):
+    return RandomGen(random.Random(seed))
+
+def _assertfreqs(samples, weights):
+    # Checks that each index appears about as often as its weight
+    # says, to within five standard deviations
+    n = len(samples)
+    total = sum(weights)
+    counts = [0 for _ in weights]
+    for s in samples:
+        counts[int(s)] += 1
+    for count, w in zip(counts, weights):
+        p = float(w) / float(total)
+        sd = (n * p * (1 - p)) ** 0.5
+        assert abs(count - n * p) <= 5 * sd + 1, (counts, weights)
+
+def test_vosealias_next_n_float_weights():
+    for weights in ([0.3, 0.7], [0.1, 0.2, 0.3, 0.4]):
+        v = VoseAlias(weights)
+        _assertfreqs(v.next_n(_rg(), 20000), weights)
+        rg = _rg(2)
+        _assertfreqs([v.next(rg) for _ in range(20000)], weights)
+
+def test_vosealias_next_n_int_weights():
+    for weights in ([3, 7], [3.0, 7.0], [Fraction(1, 3), Fraction(2, 3)]):
+        v = VoseAlias(weights)
+        _assertfreqs(v.next_n(_rg(), 20000), weights)
+
+def test_exponential_normal_significant_bits():
+    # Variates less than 2^-8 have 53 significant bits, so few of
+    # them are multiples of 2^-53
+    rg = _rg(4)
+    small = [
+        v
+        for v in rg.exponential_n(20000) + [abs(x) for x in rg.normal_n(20000)]
+        if v < 2.0**-8
+    ]
+    assert len(small) > 50
+    assert sum(1 for v in small if v * 2**53 == int(v * 2**53)) < len(small) // 10
+    e = rg.exponential_n(20000)
+    assert abs(sum(e) / len(e) - 1) < 0.05
+    n = rg.normal_n(20000)
+    assert abs(sum(n) / len(n)) < 0.05
+    assert abs(sum(x * x for x in n) / len(n) - 1) < 0.05
+
+def test_vosealias_next_n_reuses_tables():
+    weights = [5, 1, 0, 3, 7]
+    v = VoseAlias(weights)
+    a = v.next_n(_rg(), 20000)
+    _assertfreqs(v.next_n(_rg(3), 20000), weights)
+    assert list(v.next_n(_rg(), 20000)) == list(a)
+    v2 = VoseAlias.from_bytes(v.to_bytes())
+    assert "_nptables" not in v2.__dict__
+    assert list(v2.next_n(_rg(), 20000)) == list(a)
+
+def test_samplers_next_n():
+    weights = [1, 2, 3, 4, 5, 6, 7, 8]
+    for sampler in (
+        VoseAlias(weights),
+        BringmannLarsen(weights),
+        FastLoadedDiceRoller(weights),
+        OptimalSampler(weights),
+        SortedAliasMethod(weights),
+    ):
+        _assertfreqs(sampler.next_n(_rg(), 20000), weights)
+        assert len(sampler.next_n(_rg(), 0)) == 0
+    for sampler in (FastLoadedDiceRoller([5]), OptimalSampler([5])):
+        assert list(sampler.next_n(_rg(), 10)) == [0] * 10
+
+def test_weightedsampler_methods():
+    weights = [1, 2, 3, 4, 5, 6, 7, 8]
+    for method in (None, "table", "alias", "fldr", "bl"):
+        ws = WeightedSampler(weights, method)
+        rg = _rg()
+        _assertfreqs([ws.next(rg) for _ in range(20000)], weights)
+        _assertfreqs(ws.next_n(_rg(2), 20000), weights)
+        assert all(isinstance(x, int) for x in ws.next_n(rg, 100))
+    assert WeightedSampler._intweights([0.25, Fraction(1, 3), 2]) == [3, 4, 24]
+
+def test_weightedsampler_default_choice():
+    weights = [3, 0, 1, 4]
+    ws = WeightedSampler(weights)
+    ws.next_n(_rg(), 63)
+    assert ws.batchtable == None
+    _assertfreqs(ws.next_n(_rg(), 20000), weights)
+    assert isinstance(ws.batchtable, VoseAlias)
+    # Weights whose common denominator makes the total at least 2^63
+    # are always sampled from the table
+    weights = [0.25, 2.0**-70, 0.75]
+    ws = WeightedSampler(weights)
+    _assertfreqs(ws.next_n(_rg(), 20000), weights)
+    assert ws.batchtable == None
+
+def test_weighted_choice_n_cached():
+    rg = _rg()
+    weights = [5, 1, 2]
+    # Keyed on the identity of the weights, or on a caller's key
+    ws = rg.weighted_sampler(weights)
+    assert rg.weighted_sampler(weights) is ws
+    assert rg.weighted_sampler(list(weights)) is not ws
+    assert rg.weighted_sampler(weights, "alias") is not ws
+    wk = rg.weighted_sampler(weights, key="w")
+    assert rg.weighted_sampler(list(weights), key="w") is wk
+    _assertfreqs(rg.weighted_choice_n(weights, 20000), weights)
+    _assertfreqs([rg.weighted_choice(weights) for _ in range(5000)], weights)
+
+def test_zigexpminus_bounds():
+    decimal.getcontext().prec = 60
+    r = random.Random(3)
+    one = decimal.Decimal(1 << 64)
+    for _ in range(1000):
+        ylo = r.randrange(r.choice([1 << 56, 1 << 64, 1 << 70]))
+        yhi = ylo + r.randrange(r.choice([1, 1 << 20, 1 << 56]))
+        elo, ehi = randomgen._zigexpminus(ylo, yhi)
+        assert elo <= (-decimal.Decimal(yhi) / one).exp() * one
+        assert (-decimal.Decimal(ylo) / one).exp() * one <= ehi
+
+def test_exponential_normal_psrn_distribution():
+    # Frequencies of the variates in ten intervals of equal probability
+    rg = _rg(5)
+    n = 20000
+    exps = [rg.exponential_psrn() for _ in range(n)]
+    norms = [rg.normal_psrn() for _ in range(n)]
+    for psrns, cdf in (
+        (exps, lambda x: 1 - math.exp(-x)),
+        (norms, lambda x: 0.5 * (1 + math.erf(x / math.sqrt(2)))),
+    ):
+        values = [x.sign * (x.intpart + (x.bits + 0.5) / (1 << x.length)) for x in psrns]
+        _assertfreqs([min(9, int(cdf(v) * 10)) for v in values], [1] * 10)
+
+def test_binomial_table_cache_evicts_by_bytes():
+    cache = randomgen._BinomialTableCache(maxbytes=1 << 30)
+    for n in (40, 60, 80):
+        cache.get(n)
+    sizes = dict(cache.sizes)
+    assert cache.totalbytes == sum(sizes.values())
+    # Room for the two most recently used tables only; using 40
+    # again makes 60 the least recently used
+    cache.get(40)
+    cache.maxbytes = sizes[40] + sizes[80]
+    cache._evict()
+    assert list(cache.tables) == [80, 40]
+    assert cache.totalbytes <= cache.maxbytes
+    cache.get(100)
+    assert 80 not in cache.tables and 100 in cache.tables
+    assert cache.totalbytes == sum(cache.sizes.values())
+
+def test_binomial_table_cache_save_load(tmp_path):
+    ns = (40, 64, 100)
+    cache = randomgen._BinomialTableCache()
+    for n in ns:
+        cache.get(n)
+    path = str(tmp_path / "binomial.smp")
+    cache.save(path)
+    with open(path, "rb") as f:
+        assert f.read(8) == randomgen._SAMPLER_MAGIC
+    loaded = randomgen._BinomialTableCache()
+    loaded.load(path)
+    fresh = randomgen._BinomialTableCache()
+    for n in ns:
+        t = loaded.tables[n]
+        # The rows refer to the mapped file
+        assert isinstance(t.aliases, memoryview)
+        assert list(t.aliases) == list(cache.tables[n].aliases)
+        assert list(t.weights) == list(cache.tables[n].weights)
+        rg1, rg2 = _rg(n), _rg(n)
+        f = fresh.get(n)
+        assert [t.next(rg1) for i in range(300)] == [f.next(rg2) for i in range(300)]
+    try:
+        VoseAlias.load(path)
+        assert False
+    except ValueError:
+        pass
+
+def _normalpdf(x):
+    return math.exp(-x * x / 2)
+
+def _savedsamplers():
+    # Pairs of a sampler and a function drawing samples from it,
+    # for each class that can save its tables
+    nxt = lambda s, rg: [s.next(rg) for i in range(200)]
+    smp = lambda s, rg: s.sample(rg, 200)
+    return [
+        (VoseAlias([1, 2, 3, 0, 5]), nxt),
+        (VoseAlias([0.5, 0.25, 1.5]), nxt),
+        (FastLoadedDiceRoller([1, 2, 3, 4]), nxt),
+        (FastLoadedDiceRoller([5, 0, 1 << 70, 3]), nxt),
+        (OptimalSampler([1, 2, 3]), nxt),
+        # The tilings' 'sample' relies on RandomGen.rndrange for
+        # floats, which doesn't work yet, so only their tables
+        # are compared
+        (randomgen.RatioOfUniformsTiling(_normalpdf), None),
+        (randomgen.DensityTiling(_normalpdf, -3, 3), None),
+        (randomgen.DensityInversionSampler(_normalpdf, -3, 3), smp),
+    ]
+
+def test_saved_tables_round_trip(tmp_path):
+    for i, (s, draw) in enumerate(_savedsamplers()):
+        cls = type(s)
+        path = str(tmp_path / ("%d.smp" % i))
+        s.save(path)
+        for t in (cls.from_bytes(s.to_bytes(), pdf=_normalpdf), cls.load(path, _normalpdf)):
+            # Exactly the attributes set by __init__, with the same values
+            assert sorted(t.__dict__) == sorted(s.__dict__)
+            for k in s.__dict__:
+                v, w = t.__dict__[k], s.__dict__[k]
+                if isinstance(v, (memoryview, array.array)):
+                    v, w = v.tolist(), w.tolist()
+                assert v == w
+            if draw != None:
+                assert draw(t, _rg(i)) == draw(s, _rg(i))
+
+def test_sampler_table_cache(tmp_path):
+    cache = randomgen.SamplerTableCache(str(tmp_path))
+    a = cache.get(VoseAlias, [1, 2, 3])
+    path = cache.path(VoseAlias, [[1, 2, 3]])
+    assert isinstance(a, VoseAlias)
+    # Hit: loaded from the file, not built again
+    mtime = (tmp_path / path).stat().st_mtime_ns
+    b = cache.get(VoseAlias, [1, 2, 3])
+    assert b is not a
+    assert (tmp_path / path).stat().st_mtime_ns == mtime
+    assert [b.next(_rg(2)) for i in range(50)] == [a.next(_rg(2)) for i in range(50)]
+    # Miss: different weights, class or key give different files
+    assert cache.path(VoseAlias, [[1, 2, 4]]) != path
+    assert cache.path(FastLoadedDiceRoller, [[1, 2, 3]]) != path
+    assert cache.path(VoseAlias, [[1, 2, 3]], key="k") != path
+    cache.get(FastLoadedDiceRoller, [1, 2, 3])
+    assert len(list(tmp_path.glob("*.smp"))) == 2
+    # Samplers with a PDF need a key
+    d = cache.get(randomgen.DensityInversionSampler, _normalpdf, -3, 3, key="normal")
+    e = cache.get(randomgen.DensityInversionSampler, _normalpdf, -3, 3, key="normal")
+    assert e.sample(_rg(3), 20) == d.sample(_rg(3), 20)
+    try:
+        cache.path(randomgen.DensityInversionSampler, [_normalpdf, -3, 3])
+        assert False
+    except ValueError:
+        pass
+
+def test_dynamic_weighted_sampler_operations():
+    # Random updates, inserts and deletes, checked against a list
+    r = random.Random(11)
+    ds = randomgen.DynamicWeightedSampler([3, 1])
+    model = [3, 1]
+    for i in range(500):
+        op = r.randrange(3)
+        if op == 0:
+            w = r.choice([r.randrange(100), Fraction(r.randrange(1, 50), 7), 0.375])
+            assert ds.insert(w) == len(model)
+            model.append(Fraction(w))
+        elif op == 1:
+            k = r.randrange(len(model))
+            w = r.randrange(100)
+            ds.update(k, w)
+            model[k] = w
+        else:
+            k = r.randrange(len(model))
+            ds.delete(k)
+            model[k] = 0
+        assert len(ds) == len(model)
+        assert ds.total() == sum(model)
+        k = r.randrange(len(model))
+        assert ds.weight(k) == model[k]
+    for bad in (-1, len(model)):
+        try:
+            ds.update(bad, 1)
+            assert False
+        except IndexError:
+            pass
+    try:
+        ds.insert(-1)
+        assert False
+    except ValueError:
+        pass
+
+def test_dynamic_weighted_sampler_frequencies():
+    rg = _rg(12)
+    ds = randomgen.DynamicWeightedSampler([5, 1, 2])
+    _assertfreqs([ds.next(rg) for _ in range(10000)], [5, 1, 2])
+    # Inserting past the tree's capacity rebuilds it
+    ds.insert(4)
+    ds.insert(0)
+    ds.update(0, 1)
+    ds.delete(2)
+    weights = [1, 1, 0, 4, 0]
+    x = [ds.next(rg) for _ in range(10000)]
+    assert x.count(2) == 0 and x.count(4) == 0
+    _assertfreqs(x, weights)
+    # Fraction and float weights take the exact-coin path
+    ds.update(1, Fraction(1, 3))
+    ds.insert(0.25)
+    weights = [1, Fraction(1, 3), 0, 4, 0, Fraction(1, 4)]
+    _assertfreqs([ds.next(rg) for _ in range(10000)], weights)
+    empty = randomgen.DynamicWeightedSampler()
+    empty.insert(0)
+    try:
+        empty.next(rg)
+        assert False
+    except ValueError:
+        pass
+
+def _assertmean(values, n, k):
+    # The kth smallest of n uniform numbers has a beta(k, n-k+1)
+    # distribution, with mean k/(n+1)
+    count = len(values)
+    mean = k / (n + 1)
+    sd = math.sqrt(k * (n - k + 1) / ((n + 1) ** 2 * (n + 2)) / count)
+    assert abs(sum(values) / count - mean) <= 5 * sd
+
+def test_kthsmallest_psrn():
+    from betadist import psrn_fill, psrn_less_than_fraction
+
+    rg = _rg(13)
+    for n, k in ((1, 1), (5, 1), (5, 3), (10, 10), (1000, 250), (10**6, 999999)):
+        values = []
+        below = 0
+        count = 2000 if n <= 1000 else 200
+        for i in range(count):
+            p = rg.kthsmallest_psrn(n, k)
+            assert p[0] == 1 and p[1] == 0
+            assert all(d == 0 or d == 1 for d in p[2])
+            below += psrn_less_than_fraction(rg, [1, 0, list(p[2])], Fraction(1, 2))
+            values.append(psrn_fill(rg, p, precision=53))
+        _assertmean(values, n, k)
+        # P(X < 1/2) is the chance that at least k of the n numbers are
+        # less than 1/2
+        if n <= 1000:
+            q = sum(math.comb(n, j) for j in range(k, n + 1)) / 2**n
+            assert abs(below - count * q) <= 5 * math.sqrt(count * q * (1 - q)) + 1
+    for n, k in ((5, 0), (5, 6)):
+        try:
+            rg.kthsmallest_psrn(n, k)
+            assert False
+        except ValueError:
+            pass
+
+def test_kthsmallest_many():
+    rg = _rg(14)
+    pairs = [(7, 2), (7, 6), (100, 50)]
+    values = rg.kthsmallest_many(pairs * 2000, 53)
+    assert len(values) == 6000
+    assert all(0 <= v <= 1 for v in values)
+    for i, (n, k) in enumerate(pairs):
+        _assertmean(values[i::3], n, k)
+    assert all(0 <= rg.kthsmallest(9, 4, 20) <= 1 for i in range(100))
+
+class _ByteSource:
+    # Source of random bytes that remembers every byte it served
+    def __init__(self, seed):
+        self.r = random.Random(seed)
+        self.served = bytearray()
+
+    def __call__(self, count):
+        ret = self.r.randbytes(count)
+        self.served += ret
+        return ret
+
+def test_bitpool_serves_every_bit_once():
+    # The bits served by randbit and randbits, in order, must be the
+    # bits fetched from the source, with none lost or repeated at
+    # word or block boundaries
+    r = random.Random(15)
+    for wordbits in (8, 16, 32, 64):
+        for blockbits in (wordbits, 200, 65536):
+            source = _ByteSource(wordbits + blockbits)
+            pool = randomgen.RandomBitPool(source, wordbits=wordbits, blockbits=blockbits)
+            value = 0
+            total = 0
+            for i in range(400):
+                k = r.choice([0, 1, 1, 3, wordbits - 1, wordbits, wordbits + 1, 150, 700])
+                if k == 1 and r.randrange(2) == 0:
+                    x = pool.randbit()
+                else:
+                    x = pool.randbits(k)
+                assert 0 <= x < (1 << k)
+                value |= x << total
+                total += k
+                assert pool.bitsused() == total
+            stream = int.from_bytes(source.served, "little")
+            assert stream & ((1 << total) - 1) == value
+
+def test_bitpool_words_and_sources():
+    source = _ByteSource(16)
+    pool = randomgen.RandomBitPool(source, wordbits=32, blockbits=64)
+    words = [pool.word() for i in range(10)]
+    assert pool.bitsused() == 320
+    data = bytes(source.served)
+    assert words == [int.from_bytes(data[i * 4 : i * 4 + 4], "little") for i in range(10)]
+    # Sources with 'getrandbits' or only 'randint' give the same
+    # kind of stream; with 'randint', one word is fetched at a time
+    class RandintOnly:
+        def __init__(self):
+            self.r = random.Random(17)
+            self.calls = 0
+
+        def randint(self, a, b):
+            self.calls += 1
+            return self.r.randint(a, b)
+
+    src = RandintOnly()
+    pool = randomgen.RandomBitPool(src, wordbits=16)
+    pool.randbits(40)
+    assert src.calls == 3 and pool.bitsused() == 40
+    a = randomgen.RandomBitPool(random.Random(18))
+    b = randomgen.RandomBitPool(random.Random(18))
+    assert [a.randbits(37) for i in range(50)] == [b.randbits(37) for i in range(50)]
+    try:
+        randomgen.RandomBitPool(random.Random(), wordbits=12)
+        assert False
+    except ValueError:
+        pass
+
+def test_randomgen_bitsused():
+    # Sampling an integer in a power-of-two range uses exactly
+    # that many bits
+    rg = _rg(19)
+    rg.randbits(5)
+    rg.randbit()
+    rg.rndint((1 << 20) - 1)
+    assert rg.bitpool.bitsused() == 26
+
+def _arraycalls():
+    # Pairs of an '_array' method call and the matching scalar call
+    return [
+        (lambda rg, n: rg.normal_array(n, 1.0, 2.0), lambda rg: rg.normal(1.0, 2.0)),
+        (lambda rg, n: rg.lognormal_array(n, 0.1, 0.5), lambda rg: rg.lognormal(0.1, 0.5)),
+        (lambda rg, n: rg.exponential_array(n, 3.0), lambda rg: rg.exponential(3.0)),
+        (lambda rg, n: rg.weibull_array(n, 2.0, 1.5), lambda rg: rg.weibull(2.0, 1.5)),
+        (lambda rg, n: rg.gumbel_array(n, 1.0, 2.0), lambda rg: rg.gumbel(1.0, 2.0)),
+        (lambda rg, n: rg.pareto_array(n, 2.0, 5.0), lambda rg: rg.pareto(2.0, 5.0)),
+        (lambda rg, n: rg.gamma_array(n, 2.5, 1.5), lambda rg: rg.gamma(2.5, 1.5)),
+        (
+            lambda rg, n: rg.gamma_array(n, 0.5, 2.0, 2.0, 1.0),
+            lambda rg: rg.gamma(0.5, 2.0, 2.0, 1.0),
+        ),
+    ]
+
+def test_array_methods_seeding():
+    for i, (arr, scalar) in enumerate(_arraycalls()):
+        a, b = _rg(20 + i), _rg(20 + i)
+        x = arr(a, 100)
+        assert len(x) == 100
+        # Same seed, same arrays, and each call takes 128 bits from
+        # the bit pool, which the scalar methods then continue from
+        assert x.tolist() == arr(b, 100).tolist()
+        assert a.bitpool.bitsused() == 128
+        assert arr(a, 50).tolist() == arr(b, 50).tolist()
+        assert scalar(a) == scalar(b)
+        # Later calls and other seeds give other arrays
+        assert arr(a, 100).tolist() != x.tolist()
+        assert arr(_rg(99), 100).tolist() != x.tolist()
+    a, b = _rg(30), _rg(30)
+    cov = [[1.0, 0.5], [0.5, 2.0]]
+    x = a.multinormal_array([1.0, -1.0], cov, 100)
+    assert x.shape == (100, 2)
+    assert x.tolist() == b.multinormal_array([1.0, -1.0], cov, 100).tolist()
+
+def test_array_methods_match_scalar():
+    # Each '_array' method has the same parameterization as its scalar
+    # method: compare their means with a two-sample test
+    for i, (arr, scalar) in enumerate(_arraycalls()):
+        rg = _rg(40 + i)
+        x = arr(rg, 20000).tolist()
+        y = [scalar(rg) for _ in range(2000)]
+        mx, my = sum(x) / len(x), sum(y) / len(y)
+        vx = sum((v - mx) ** 2 for v in x) / (len(x) - 1)
+        vy = sum((v - my) ** 2 for v in y) / (len(y) - 1)
+        assert abs(mx - my) <= 5 * math.sqrt(vx / len(x) + vy / len(y)), i
+    rg = _rg(50)
+    cov = [[1.0, 0.5], [0.5, 2.0]]
+    x = rg.multinormal_array([1.0, -1.0], cov, 20000)
+    assert abs(x[:, 0].mean() - 1.0) < 0.05 and abs(x[:, 1].mean() + 1.0) < 0.05
+    c = x.T @ x / 20000 - x.mean(axis=0)[:, None] * x.mean(axis=0)[None, :]
+    assert abs(c[0][0] - 1.0) < 0.1 and abs(c[0][1] - 0.5) < 0.1
+    assert abs(c[1][1] - 2.0) < 0.15
+
+def test_fastdiceroller_words_uniform():
+    rg = _rg(60)
+    # Range sizes that are and are not powers of two
+    for m in (2, 3, 4, 5, 6, 7, 8, 10, 16, 100, 1000):
+        x = [rg.rndint_fastdiceroller_words(m - 1) for _ in range(20000)]
+        _assertfreqs(x, [1] * m)
+        y = [rg.rndint_fastdiceroller(m - 1) for _ in range(20000)]
+        _assertfreqs(y, [1] * m)
+    # Large ranges, checked in 8 equal bins plus a split of the
+    # lowest bits
+    for m in (1 << 64, (1 << 61) - 1, 10**18 + 9, (1 << 100) + 3):
+        x = [rg.rndint_fastdiceroller_words(m - 1) for _ in range(8000)]
+        assert all(0 <= v < m for v in x)
+        _assertfreqs([v * 8 // m for v in x], [1] * 8)
+        _assertfreqs([v & 1 for v in x], [m // 2, m - m // 2])
+    assert rg.rndint_fastdiceroller_words(0) == 0
+    try:
+        rg.rndint_fastdiceroller_words(-1)
+        assert False
+    except ValueError:
+        pass
+
+def test_fastdiceroller_words_entropy():
+    # The fast dice roller uses at most log2(m) + 2 bits on average;
+    # powers of two use exactly log2(m) bits through 'rndint'
+    rg = _rg(61)
+    for m in (3, 5, 7, 100, 1000, 10**9 + 7, (1 << 62) + 1):
+        before = rg.bitpool.bitsused()
+        n = 4000
+        for i in range(n):
+            rg.rndint_fastdiceroller_words(m - 1)
+        assert (rg.bitpool.bitsused() - before) / n <= math.log2(m) + 2
+    for k in (2, 10, 63, 64, 200):
+        before = rg.bitpool.bitsused()
+        rg.rndint((1 << k) - 1)
+        assert rg.bitpool.bitsused() - before == k
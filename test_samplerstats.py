@@ -0,0 +1,93 @@
+import random
+
+import samplerstats
+from randomgen import RandomGen, VoseAlias
+
+def _rg(seed=1):
+    return RandomGen(random.Random(seed))
+
+def _wrapped(cls, name):
+    return hasattr(cls.__dict__[name], "__wrapped__")
+
+def test_wraps_only_while_active():
+    original = RandomGen.__dict__["exponential"]
+    assert not _wrapped(RandomGen, "exponential")
+    with samplerstats.SamplerStats() as outer:
+        assert samplerstats.active is outer
+        assert _wrapped(RandomGen, "exponential")
+        assert _wrapped(VoseAlias, "next")
+        # Excluded methods are never wrapped
+        assert not _wrapped(RandomGen, "rndint")
+        with samplerstats.SamplerStats() as inner:
+            assert samplerstats.active is inner
+        # Still wrapped for the outer SamplerStats
+        assert samplerstats.active is outer
+        assert _wrapped(RandomGen, "exponential")
+    assert samplerstats.active == None
+    assert RandomGen.__dict__["exponential"] is original
+    assert not _wrapped(VoseAlias, "next")
+    try:
+        with samplerstats.SamplerStats():
+            raise KeyError
+    except KeyError:
+        pass
+    assert samplerstats.active == None
+    assert RandomGen.__dict__["exponential"] is original
+
+def test_counts_calls_and_bits():
+    rg = _rg()
+    before = rg.bitpool.bitsused()
+    with samplerstats.SamplerStats() as stats:
+        for i in range(100):
+            rg.exponential()
+    assert stats.get("RandomGen.exponential", "calls") == 100
+    assert stats.get("RandomGen.exponential", "bits") == rg.bitpool.bitsused() - before
+    assert stats.get("RandomGen.exponential", "seconds") > 0
+    # Nothing is counted once no SamplerStats is active
+    rg.exponential()
+    assert stats.get("RandomGen.exponential", "calls") == 100
+    assert stats.get("RandomGen.gamma", "calls") == 0
+
+def test_counts_nested_and_innermost():
+    rg = _rg(2)
+    with samplerstats.SamplerStats() as outer:
+        rg.gamma(2)
+        with samplerstats.SamplerStats() as inner:
+            rg.gamma(2)
+            rg.gamma(2)
+    # Only the innermost SamplerStats collects counts
+    assert outer.get("RandomGen.gamma", "calls") == 1
+    assert inner.get("RandomGen.gamma", "calls") == 2
+    # A sampler's counts include the samplers it calls
+    assert inner.get("RandomGen.gamma", "bits") >= inner.get(
+        "RandomGen.rndu01", "bits"
+    )
+
+def test_counts_bits_from_generator_argument():
+    # Weighted samplers draw their bits from the generator passed
+    # to 'next', which is counted instead of the sampler itself
+    rg = _rg(3)
+    va = VoseAlias([1, 2, 3])
+    before = rg.bitpool.bitsused()
+    with samplerstats.SamplerStats() as stats:
+        for i in range(50):
+            va.next(rg)
+    assert stats.get("VoseAlias.next", "calls") == 50
+    assert stats.get("VoseAlias.next", "bits") == rg.bitpool.bitsused() - before
+
+def test_events_callback_and_report():
+    events = []
+    with samplerstats.SamplerStats(
+        callback=lambda s, e, c: events.append((s, e, c))
+    ) as stats:
+        samplerstats.active.add("Test.sampler", "rejections", 3)
+        samplerstats.active.add("Test.sampler", "calls")
+    assert events == [("Test.sampler", "rejections", 3), ("Test.sampler", "calls", 1)]
+    assert stats.samplers() == {"Test.sampler": {"rejections": 3, "calls": 1}}
+    assert stats.report() == "Test.sampler: calls=1, rejections=3 (3/call)"
+
+def test_bitsused():
+    rg = _rg(4)
+    rg.randbits(10)
+    assert samplerstats.bitsused(rg) == rg.bitpool.bitsused()
+    assert samplerstats.bitsused(random.Random()) == None